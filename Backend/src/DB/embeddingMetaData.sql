@@ -7,4 +7,16 @@ CREATE TABLE employee_face_embedding (
 
     created_at TIMESTAMP NOT NULL DEFAULT NOW(),
     updated_at TIMESTAMP NOT NULL DEFAULT NOW()
-);
\ No newline at end of file
+);
+
+-- Recognizers poll for roster changes by updated_at (see GET /api/embeddings/changes).
+CREATE INDEX idx_employee_face_embedding_employee ON employee_face_embedding (employee_id);
+CREATE INDEX idx_employee_face_embedding_updated_at ON employee_face_embedding (updated_at);
+
+-- Embeddings of deleted employees, kept so the change feed can report removals.
+CREATE TABLE employee_face_embedding_deleted (
+    embedding_id UUID PRIMARY KEY,
+    employee_id INT NOT NULL,
+    deleted_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+CREATE INDEX idx_employee_face_embedding_deleted_at ON employee_face_embedding_deleted (deleted_at);
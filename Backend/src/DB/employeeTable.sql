@@ -14,8 +14,23 @@ CREATE TABLE employee (
     job_title VARCHAR(100),
     salary NUMERIC(12,2),
 
+    -- Site/contractor the employee works at; selects their face gallery shard
+    -- (NULL goes to the "default" shard)
+    site_id VARCHAR(50),
+
     is_active BOOLEAN NOT NULL DEFAULT TRUE,
 
     created_at TIMESTAMP NOT NULL DEFAULT NOW(),
     updated_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
+
+-- Indexes backing the filtered, keyset-paginated employee listing.
+CREATE INDEX idx_employee_is_active ON employee (is_active, employee_id);
+CREATE INDEX idx_employee_job_title ON employee (job_title, employee_id);
+CREATE INDEX idx_employee_hire_date ON employee (hire_date, employee_id);
+CREATE INDEX idx_employee_site_id ON employee (site_id, employee_id);
+CREATE INDEX idx_employee_updated_at ON employee (updated_at);
+
+-- Existing databases:
+-- ALTER TABLE employee ADD COLUMN site_id VARCHAR(50);
+-- CREATE INDEX idx_employee_site_id ON employee (site_id, employee_id);
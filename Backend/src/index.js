@@ -4,14 +4,16 @@ const cors = require('cors');
 const dotenv = require('dotenv');
 dotenv.config();
 const employeeRoutes = require('./routes/employeeRoutes');
+const embeddingRoutes = require('./routes/embeddingRoutes');
 
 const app = express();
 const port = process.env.PORT || 3000;
-app.use(cors());
+app.use(cors({ exposedHeaders: ['ETag', 'X-Next-Cursor'] }));
 app.use(bodyParser.json());
 
 //routes
 app.use('/api', employeeRoutes);
+app.use('/api', embeddingRoutes);
 
 //connection
 app.listen(port, () => {
@@ -0,0 +1,91 @@
+const pool = require('../DB/config');
+
+const MODEL_NAME = 'buffalo_l';
+const EMBEDDING_DIM = 512;
+
+/**
+ * Insert employee_face_embedding rows with one multi-row INSERT.
+ * @param {object} client - pg client (inside the caller's transaction)
+ * @param {{ embedding_id: string, employee_id: number }[]} embeddings
+ */
+const insertEmbeddings = async (client, embeddings) => {
+	if (!embeddings.length) return;
+
+	const values = [];
+	const tuples = embeddings.map(({ embedding_id, employee_id }) => {
+		values.push(embedding_id, employee_id);
+		return `($${values.length - 1}, $${values.length}, '${MODEL_NAME}', ${EMBEDDING_DIM})`;
+	});
+
+	await client.query(
+		`INSERT INTO employee_face_embedding (embedding_id, employee_id, model_name, embedding_dim)
+		VALUES ${tuples.join(', ')};`,
+		values
+	);
+};
+
+/**
+ * Move an employee's embeddings to the tombstone table so recognizers
+ * following the change feed drop them, then delete them.
+ * @param {object} client - pg client (inside the caller's transaction)
+ * @param {number} employeeId
+ */
+const retireEmbeddings = async (client, employeeId) => {
+	await client.query(
+		`INSERT INTO employee_face_embedding_deleted (embedding_id, employee_id)
+		SELECT embedding_id, employee_id FROM employee_face_embedding WHERE employee_id = $1
+		ON CONFLICT (embedding_id) DO NOTHING;`,
+		[employeeId]
+	);
+	await client.query('DELETE FROM employee_face_embedding WHERE employee_id = $1;', [employeeId]);
+};
+
+/**
+ * Change feed for recognizers.
+ *
+ * Returns every embedding whose row or owning employee changed after
+ * `since` (all embeddings when `since` is omitted), plus deleted embeddings
+ * as inactive rows. Each row carries the employee's site_id, which picks
+ * the gallery shard the embedding belongs in. `cursor` is the newest change
+ * time to pass back as `since` on the next poll.
+ */
+const getEmbeddingChanges = async (req, res) => {
+	try {
+		const { since } = req.query;
+		if (since !== undefined && Number.isNaN(Date.parse(since))) {
+			return res.status(400).json({ message: 'since must be a timestamp' });
+		}
+
+		const { rows } = await pool.query(
+			`SELECT embedding_id, employee_id, name, site_id, is_active, changed_at::text AS changed_at
+			FROM (
+				SELECT e.embedding_id, e.employee_id,
+					emp.first_name || ' ' || emp.last_name AS name,
+					emp.site_id,
+					(e.is_active AND emp.is_active) AS is_active,
+					GREATEST(e.updated_at, emp.updated_at) AS changed_at
+				FROM employee_face_embedding e
+				JOIN employee emp ON emp.employee_id = e.employee_id
+				WHERE $1::timestamp IS NULL OR e.updated_at > $1 OR emp.updated_at > $1
+				UNION ALL
+				SELECT embedding_id, employee_id, NULL, NULL, FALSE, deleted_at
+				FROM employee_face_embedding_deleted
+				WHERE $1::timestamp IS NULL OR deleted_at > $1
+			) changes
+			ORDER BY changes.changed_at;`,
+			[since ?? null]
+		);
+
+		const cursor = rows.length ? rows[rows.length - 1].changed_at : since ?? null;
+		return res.status(200).json({ changes: rows, cursor });
+	} catch (error) {
+		console.error('Error fetching embedding changes:', error);
+		return res.status(500).json({ message: 'Internal server error' });
+	}
+};
+
+module.exports = {
+	insertEmbeddings,
+	retireEmbeddings,
+	getEmbeddingChanges,
+};
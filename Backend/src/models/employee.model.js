@@ -1,6 +1,10 @@
 const pool = require('../DB/config');
+const { insertEmbeddings, retireEmbeddings } = require('./embedding.model');
+const crypto = require('crypto');
 const fs = require('fs');
+const os = require('os');
 const path = require('path');
+const { execFile } = require('child_process');
 
 const REQUIRED_FIELDS = ['first_name', 'last_name', 'email'];
 const UPDATABLE_FIELDS = [
@@ -14,21 +18,79 @@ const UPDATABLE_FIELDS = [
 	'job_title',
 	'salary',
 	'is_active',
+	'site_id',
 ];
+const LISTABLE_FIELDS = ['employee_id', ...UPDATABLE_FIELDS, 'created_at', 'updated_at'];
+const DATE_PATTERN = /^\d{4}-\d{2}-\d{2}$/;
+// YYYY-MM-DD that names a real calendar day (rejects 2024-13-45, 2023-02-29).
+const isValidDate = (value) => {
+	if (!DATE_PATTERN.test(value)) return false;
+	const [year, month, day] = value.split('-').map(Number);
+	const date = new Date(Date.UTC(year, month - 1, day));
+	return date.getUTCFullYear() === year && date.getUTCMonth() === month - 1 && date.getUTCDate() === day;
+};
+// Site ids name gallery shard directories and go on the enrollment command line.
+const SITE_ID_PATTERN = /^[A-Za-z0-9_.-]{1,50}$/;
+const isValidSiteId = (value) => value === undefined || value === null || value === '' || SITE_ID_PATTERN.test(value);
+
+const DEFAULT_PAGE_SIZE = 100;
+const MAX_PAGE_SIZE = 1000;
+const LIST_CACHE_TTL_MS = Number(process.env.EMPLOYEE_LIST_CACHE_TTL_MS || 5000);
+const LIST_CACHE_MAX_ENTRIES = 500;
+
+const INSERT_COLUMNS = [
+	'first_name',
+	'last_name',
+	'email',
+	'phone',
+	'date_of_birth',
+	'gender',
+	'hire_date',
+	'job_title',
+	'salary',
+	'is_active',
+	'site_id',
+];
+// Keeps each multi-row INSERT well under Postgres' 65535 bind parameter limit.
+const BULK_INSERT_CHUNK = 1000;
+const ENROLL_BATCH_SCRIPT = path.join(__dirname, '../../../modelling/arc_face/arcface_enroll_batch.py');
+
+// Short-lived cache of serialized listing pages, keyed by the normalized query.
+const listCache = new Map();
+const invalidateListCache = () => listCache.clear();
+
+/**
+ * Reserve employee ids from the SERIAL sequence ahead of the INSERT, so the
+ * face store can be keyed by employee_id before the row is written.
+ * @param {number} count
+ * @returns {Promise<number[]>}
+ */
+const reserveEmployeeIds = async (count) => {
+	const { rows } = await pool.query(
+		`SELECT nextval(pg_get_serial_sequence('employee', 'employee_id'))::int AS employee_id
+		FROM generate_series(1, $1);`,
+		[count]
+	);
+	return rows.map((row) => row.employee_id);
+};
 
 /**
  * Register face encoding with the Python face recognition system.
  * @param {string} name - Employee name (first_name + last_name)
+ * @param {number} employeeId - Reserved employee_id
+ * @param {string} embeddingId - employee_face_embedding UUID to store the face under
+ * @param {string} [siteId] - Site whose gallery shard the face goes into
  * @returns {Promise<number>} - Returns 0 for success, 1 for failure
  */
-const registerFaceEncoding = async (name) => {
+const registerFaceEncoding = async (name, employeeId, embeddingId, siteId) => {
 	try {
 		// Call enroll script to enroll a new face
 		const registerFace = path.join(__dirname, '../../../modelling/arc_face/arcface_enroll.py');
 		const { exec } = require('child_process');
 
 		const exitCode = await new Promise((resolve, reject) => {
-			exec(`python "${registerFace}" "${name}"`, (error, stdout, stderr) => {
+			const site = siteId ? ` "${siteId}"` : '';
+			exec(`python "${registerFace}" "${name}" ${employeeId} ${embeddingId}${site}`, (error, stdout, stderr) => {
 				// Log the output
 				if (stdout) console.log('[INFO] Face encoding response:', stdout);
 				if (stderr) console.log('[INFO] Python stderr:', stderr);
@@ -61,6 +123,9 @@ const createEmployee = async (req, res) => {
 		if (missing.length) {
 			return res.status(400).json({ message: `Missing required fields: ${missing.join(', ')}` });
 		}
+		if (!isValidSiteId(req.body.site_id)) {
+			return res.status(400).json({ message: 'site_id may only contain letters, digits, ".", "_" and "-"' });
+		}
 		const {
 			first_name,
 			last_name,
@@ -72,13 +137,16 @@ const createEmployee = async (req, res) => {
 			job_title,
 			salary,
 			is_active,
+			site_id,
 		} = req.body;
 
-		// First, attempt face enrollment
+		// First, attempt face enrollment under a reserved employee id
 		const fullName = `${first_name} ${last_name}`;
+		const [employeeId] = await reserveEmployeeIds(1);
+		const embeddingId = crypto.randomUUID();
 		console.log(`[INFO] Starting face enrollment for ${fullName}`);
 		
-		const enrollmentStatus = await registerFaceEncoding(fullName);
+		const enrollmentStatus = await registerFaceEncoding(fullName, employeeId, embeddingId, site_id);
 		
 		if (enrollmentStatus !== 0) {
 			console.error(`[ERROR] Face enrollment failed for ${fullName}`);
@@ -94,9 +162,9 @@ const createEmployee = async (req, res) => {
 		const insertQuery = `
 			INSERT INTO employee (
 				first_name, last_name, email, phone, date_of_birth, gender,
-				hire_date, job_title, salary, is_active
+				hire_date, job_title, salary, is_active, site_id, employee_id
 			)
-			VALUES ($1, $2, $3, $4, $5, $6, COALESCE($7, CURRENT_DATE), $8, $9, COALESCE($10, TRUE))
+			VALUES ($1, $2, $3, $4, $5, $6, COALESCE($7, CURRENT_DATE), $8, $9, COALESCE($10, TRUE), $11, $12)
 			RETURNING *;
 		`;
 
@@ -111,10 +179,28 @@ const createEmployee = async (req, res) => {
 			job_title || null,
 			salary || null,
 			is_active,
+			site_id || null,
+			employeeId,
 		];
-		
-		const { rows } = await pool.query(insertQuery, values);
-		const employee = rows[0];
+
+		const client = await pool.connect();
+		let employee;
+		try {
+			await client.query('BEGIN');
+			const { rows } = await client.query(insertQuery, values);
+			employee = rows[0];
+			await insertEmbeddings(client, [{ embedding_id: embeddingId, employee_id: employeeId }]);
+			await client.query('COMMIT');
+		} catch (error) {
+			await client.query('ROLLBACK');
+			// The face is already in the store; without its row it would keep
+			// matching and the change feed could never retire it.
+			await removeFaceEncodingBatch([{ embedding_id: embeddingId, site_id: site_id || null }]);
+			throw error;
+		} finally {
+			client.release();
+		}
+		invalidateListCache();
 
 		return res.status(201).json(employee);
 	} catch (error) {
@@ -124,12 +210,507 @@ const createEmployee = async (req, res) => {
 };
 
 /**
- * Get all employees.
+ * Build the WHERE clause for the employee listing from query filters.
+ * @param {object} query - Express query object
+ * @returns {{ clauses: string[], values: any[], error?: string }}
+ */
+const buildListFilters = (query) => {
+	const clauses = [];
+	const values = [];
+
+	if (query.after !== undefined) {
+		const after = Number(query.after);
+		if (!Number.isInteger(after)) {
+			return { clauses, values, error: 'after must be an integer employee id' };
+		}
+		values.push(after);
+		clauses.push(`employee_id > $${values.length}`);
+	}
+
+	if (query.is_active !== undefined) {
+		if (!['true', 'false'].includes(query.is_active)) {
+			return { clauses, values, error: 'is_active must be true or false' };
+		}
+		values.push(query.is_active === 'true');
+		clauses.push(`is_active = $${values.length}`);
+	}
+
+	if (query.job_title !== undefined) {
+		values.push(query.job_title);
+		clauses.push(`job_title = $${values.length}`);
+	}
+
+	if (query.site_id !== undefined) {
+		values.push(query.site_id);
+		clauses.push(`site_id = $${values.length}`);
+	}
+
+	for (const [param, operator] of [['hire_date_from', '>='], ['hire_date_to', '<=']]) {
+		if (query[param] === undefined) continue;
+		if (!isValidDate(query[param])) {
+			return { clauses, values, error: `${param} must be a YYYY-MM-DD date` };
+		}
+		values.push(query[param]);
+		clauses.push(`hire_date ${operator} $${values.length}`);
+	}
+
+	return { clauses, values };
+};
+
+/**
+ * Parse a CSV document with a header row into objects.
+ * Supports quoted fields with embedded commas, newlines and doubled quotes.
+ * @param {string} text - CSV text
+ * @returns {object[]}
  */
-const getAllEmployees = async (_req, res) => {
+const parseCsv = (text) => {
+	const records = [];
+	let record = [];
+	let field = '';
+	let quoted = false;
+
+	for (let i = 0; i < text.length; i += 1) {
+		const char = text[i];
+		if (quoted) {
+			if (char === '"' && text[i + 1] === '"') {
+				field += '"';
+				i += 1;
+			} else if (char === '"') {
+				quoted = false;
+			} else {
+				field += char;
+			}
+		} else if (char === '"') {
+			quoted = true;
+		} else if (char === ',') {
+			record.push(field);
+			field = '';
+		} else if (char === '\n' || char === '\r') {
+			if (char === '\r' && text[i + 1] === '\n') i += 1;
+			record.push(field);
+			records.push(record);
+			record = [];
+			field = '';
+		} else {
+			field += char;
+		}
+	}
+	if (field || record.length) {
+		record.push(field);
+		records.push(record);
+	}
+
+	const [header = [], ...rows] = records.filter((r) => r.some((value) => value.trim() !== ''));
+	const keys = header.map((key) => key.trim());
+	return rows.map((r) => Object.fromEntries(keys.map((key, index) => [key, (r[index] ?? '').trim()])));
+};
+
+/**
+ * Read the import rows from a multipart request: either an uploaded `rows`
+ * file (.csv or .json) or a `rows` text field holding a JSON array.
+ * @returns {Promise<object[]>}
+ */
+const readImportRows = async (req) => {
+	const rowsFile = req.files && req.files.rows && req.files.rows[0];
+	if (rowsFile) {
+		const text = await fs.promises.readFile(rowsFile.path, 'utf8');
+		const isCsv = rowsFile.originalname.toLowerCase().endsWith('.csv') || rowsFile.mimetype === 'text/csv';
+		return isCsv ? parseCsv(text) : JSON.parse(text);
+	}
+	if (typeof req.body.rows === 'string') {
+		return JSON.parse(req.body.rows);
+	}
+	return Array.isArray(req.body.rows) ? req.body.rows : [];
+};
+
+// Limits from employeeTable.sql, checked up front so one bad row cannot fail
+// the chunked INSERT it shares with valid rows.
+const COLUMN_MAX_LENGTHS = {
+	first_name: 50,
+	last_name: 50,
+	email: 100,
+	phone: 20,
+	job_title: 100,
+};
+const GENDER_VALUES = ['Male', 'Female', 'Other'];
+// NUMERIC(12,2): at most 10 digits before the decimal point.
+const MAX_SALARY_CENTS = 1e12;
+
+const BOOLEAN_VALUES = new Map([
+	['true', true], ['t', true], ['yes', true], ['y', true], ['1', true],
+	['false', false], ['f', false], ['no', false], ['n', false], ['0', false],
+]);
+
+/**
+ * Validate one import row and coerce its values to what the INSERT expects,
+ * so a bad value is reported on its row instead of failing the whole import.
+ * @param {object} row - Raw CSV/JSON row
+ * @returns {{ values?: object, error?: string }}
+ */
+const coerceImportRow = (row) => {
+	const missing = REQUIRED_FIELDS.filter((field) => !row[field]);
+	if (missing.length) {
+		return { error: `Missing required fields: ${missing.join(', ')}` };
+	}
+	if (!isValidSiteId(row.site_id)) {
+		return { error: 'Invalid site_id' };
+	}
+
+	const values = {};
+	for (const column of INSERT_COLUMNS) {
+		const raw = row[column];
+		const value = typeof raw === 'string' ? raw.trim() : raw;
+		values[column] = value === '' || value === undefined ? null : value;
+	}
+
+	for (const [column, maxLength] of Object.entries(COLUMN_MAX_LENGTHS)) {
+		if (values[column] !== null && String(values[column]).length > maxLength) {
+			return { error: `${column} must be at most ${maxLength} characters` };
+		}
+	}
+	if (values.gender !== null && !GENDER_VALUES.includes(values.gender)) {
+		return { error: `gender must be one of ${GENDER_VALUES.join(', ')}` };
+	}
+
+	for (const column of ['date_of_birth', 'hire_date']) {
+		if (values[column] !== null && !isValidDate(String(values[column]))) {
+			return { error: `${column} must be a YYYY-MM-DD date` };
+		}
+	}
+	if (values.is_active !== null && typeof values.is_active !== 'boolean') {
+		const flag = BOOLEAN_VALUES.get(String(values.is_active).toLowerCase());
+		if (flag === undefined) {
+			return { error: 'is_active must be true or false' };
+		}
+		values.is_active = flag;
+	}
+	if (values.salary !== null) {
+		const salary = Number(values.salary);
+		if (!Number.isFinite(salary)) {
+			return { error: 'salary must be a number' };
+		}
+		if (Math.abs(Math.round(salary * 100)) >= MAX_SALARY_CENTS) {
+			return { error: 'salary must be less than 10000000000' };
+		}
+		values.salary = salary;
+	}
+	return { values };
+};
+
+/**
+ * Run arcface_enroll_batch.py over a manifest and read back its results.
+ * @param {string[]} flags - Extra leading arguments (e.g. --remove)
+ * @param {object[]} items - Manifest entries
+ * @returns {Promise<object[]>}
+ */
+const runEnrollBatch = async (flags, items) => {
+	const workDir = await fs.promises.mkdtemp(path.join(os.tmpdir(), 'enroll-'));
+	const manifestPath = path.join(workDir, 'manifest.json');
+	const resultsPath = path.join(workDir, 'results.json');
+
 	try {
-		const { rows } = await pool.query('SELECT * FROM employee ORDER BY employee_id;');
-		return res.status(200).json(rows);
+		await fs.promises.writeFile(manifestPath, JSON.stringify(items));
+		await new Promise((resolve, reject) => {
+			execFile('python', [ENROLL_BATCH_SCRIPT, ...flags, manifestPath, resultsPath], (error, stdout, stderr) => {
+				if (stdout) console.log('[INFO] Batch enrollment response:', stdout);
+				if (stderr) console.log('[INFO] Python stderr:', stderr);
+				return error ? reject(error) : resolve();
+			});
+		});
+
+		return JSON.parse(await fs.promises.readFile(resultsPath, 'utf8'));
+	} finally {
+		await fs.promises.rm(workDir, { recursive: true, force: true });
+	}
+};
+
+/**
+ * Enroll a batch of faces with one Python process and one model load.
+ * @param {{ key: number, name: string, image_path: string, site_id?: string }[]} items
+ * @returns {Promise<Map<number, object>>} - Enrollment result per item key
+ */
+const registerFaceEncodingBatch = async (items) => {
+	const results = await runEnrollBatch([], items);
+	return new Map(results.map((result) => [result.key, result]));
+};
+
+/**
+ * Take enrolled faces back out of the face store, for rows whose INSERT
+ * was rolled back. Failures are logged, not thrown: the caller is already
+ * handling the error that caused the rollback.
+ * @param {{ embedding_id: string, site_id?: string }[]} items
+ */
+const removeFaceEncodingBatch = async (items) => {
+	try {
+		const results = await runEnrollBatch(['--remove'], items);
+		const removed = results.filter((result) => result.status === 'REMOVED').length;
+		console.log(`[INFO] Removed ${removed}/${results.length} rolled back embeddings from the face store`);
+	} catch (error) {
+		console.error('[ERROR] Could not remove rolled back embeddings:', error.message);
+	}
+};
+
+/**
+ * Bulk import employees with photos.
+ *
+ * Expects multipart/form-data with `rows` (a CSV/JSON file or a JSON text
+ * field) and `photos` files. Each row names its photo by file name in a
+ * `photo` column. Rows are validated first; the valid ones are inserted with
+ * multi-row INSERTs inside a single transaction, and only the rows actually
+ * created go through one batch enrollment. Rows whose face could not be
+ * enrolled are deleted again before COMMIT, and if the transaction rolls
+ * back the faces it enrolled are removed from the face store, so FAISS never
+ * holds embeddings of employees that do not exist.
+ * Responds with a per-row status.
+ */
+const bulkImportEmployees = async (req, res) => {
+	const uploads = Object.values(req.files || {}).flat();
+
+	try {
+		let rows;
+		try {
+			rows = await readImportRows(req);
+		} catch (error) {
+			return res.status(400).json({ message: `Could not parse rows: ${error.message}` });
+		}
+		if (!Array.isArray(rows) || !rows.length) {
+			return res.status(400).json({ message: 'No rows provided for import' });
+		}
+
+		const photos = new Map(((req.files && req.files.photos) || []).map((file) => [file.originalname, file.path]));
+		const results = rows.map((row, index) => ({ row: index, email: row.email || null, status: 'PENDING' }));
+		const coerced = [];
+		const seenEmails = new Set();
+
+		rows.forEach((row, index) => {
+			const { values, error } = coerceImportRow(row);
+			coerced[index] = values;
+			if (error) {
+				// An invalid row does not claim its email for later rows.
+				Object.assign(results[index], { status: 'INVALID', message: error });
+				return;
+			}
+			if (seenEmails.has(values.email)) {
+				Object.assign(results[index], { status: 'DUPLICATE_EMAIL', message: 'Email repeated in this import' });
+			} else if (!photos.has(row.photo)) {
+				Object.assign(results[index], { status: 'MISSING_PHOTO', message: `No uploaded photo named ${row.photo}` });
+			}
+			seenEmails.add(values.email);
+		});
+
+		const toInsert = results.filter((result) => result.status === 'PENDING');
+		if (toInsert.length) {
+			const employeeIds = await reserveEmployeeIds(toInsert.length);
+			toInsert.forEach((result, index) => {
+				result.employee_id = employeeIds[index];
+				result.embedding_id = crypto.randomUUID();
+			});
+
+			const client = await pool.connect();
+			let enrolled = [];
+			try {
+				// The new rows stay invisible until COMMIT, and their unique emails
+				// keep a concurrent import from claiming the same people meanwhile.
+				await client.query('BEGIN');
+				for (let start = 0; start < toInsert.length; start += BULK_INSERT_CHUNK) {
+					const chunk = toInsert.slice(start, start + BULK_INSERT_CHUNK);
+					const values = [];
+					const tuples = chunk.map((result) => {
+						const row = coerced[result.row];
+						const params = INSERT_COLUMNS.map((column) => {
+							values.push(row[column]);
+							return `$${values.length}`;
+						});
+						// hire_date and is_active fall back to their column defaults.
+						params[6] = `COALESCE(${params[6]}::date, CURRENT_DATE)`;
+						params[9] = `COALESCE(${params[9]}::boolean, TRUE)`;
+						values.push(result.employee_id);
+						params.push(`$${values.length}`);
+						return `(${params.join(', ')})`;
+					});
+
+					const { rows: inserted } = await client.query(
+						`INSERT INTO employee (${INSERT_COLUMNS.join(', ')}, employee_id)
+						VALUES ${tuples.join(', ')}
+						ON CONFLICT (email) DO NOTHING
+						RETURNING employee_id;`,
+						values
+					);
+					const insertedIds = new Set(inserted.map((row) => row.employee_id));
+					chunk
+						.filter((result) => !insertedIds.has(result.employee_id))
+						.forEach((result) => Object.assign(result, {
+							status: 'DUPLICATE_EMAIL',
+							message: 'Email already exists',
+							employee_id: undefined,
+							embedding_id: undefined,
+						}));
+				}
+
+				const toEnroll = toInsert.filter((result) => result.status === 'PENDING');
+				if (toEnroll.length) {
+					// Until the results are read back, any of these may be in the store.
+					enrolled = toEnroll;
+					console.log(`[INFO] Starting batch face enrollment for ${toEnroll.length} employees`);
+					const enrollments = await registerFaceEncodingBatch(
+						toEnroll.map((result) => ({
+							key: result.row,
+							name: `${coerced[result.row].first_name} ${coerced[result.row].last_name}`,
+							image_path: photos.get(rows[result.row].photo),
+							employee_id: result.employee_id,
+							embedding_id: result.embedding_id,
+							site_id: coerced[result.row].site_id,
+						}))
+					);
+
+					const failed = toEnroll.filter((result) => {
+						const enrollment = enrollments.get(result.row);
+						return !enrollment || enrollment.status !== 'ENROLLED';
+					});
+					enrolled = toEnroll.filter((result) => !failed.includes(result));
+					if (failed.length) {
+						await client.query('DELETE FROM employee WHERE employee_id = ANY($1);', [
+							failed.map((result) => result.employee_id),
+						]);
+					}
+					failed.forEach((result) => {
+						const enrollment = enrollments.get(result.row);
+						Object.assign(result, {
+							status: 'FACE_ENROLLMENT_FAILED',
+							message: enrollment ? enrollment.status : 'No enrollment result',
+							employee_id: undefined,
+							embedding_id: undefined,
+						});
+					});
+					await insertEmbeddings(client, enrolled);
+
+					// NOW() is the transaction start, which can be minutes ago after
+					// enrollment; recognizers' change-feed cursors have moved past it
+					// by COMMIT. Stamp the rows with the wall clock so the feed sees them.
+					const enrolledIds = enrolled.map((result) => result.employee_id);
+					await client.query(
+						'UPDATE employee SET updated_at = clock_timestamp() WHERE employee_id = ANY($1);',
+						[enrolledIds]
+					);
+					await client.query(
+						'UPDATE employee_face_embedding SET updated_at = clock_timestamp() WHERE employee_id = ANY($1);',
+						[enrolledIds]
+					);
+				}
+				await client.query('COMMIT');
+			} catch (error) {
+				await client.query('ROLLBACK');
+				if (enrolled.length) {
+					await removeFaceEncodingBatch(
+						enrolled.map((result) => ({
+							embedding_id: result.embedding_id,
+							site_id: coerced[result.row].site_id,
+						}))
+					);
+				}
+				throw error;
+			} finally {
+				client.release();
+			}
+			enrolled.forEach((result) => {
+				result.status = 'CREATED';
+			});
+			invalidateListCache();
+		}
+
+		const created = results.filter((result) => result.status === 'CREATED').length;
+		console.log(`[INFO] Bulk import finished: ${created}/${results.length} employees created`);
+		return res.status(200).json({ created, failed: results.length - created, results });
+	} catch (error) {
+		console.error('Error importing employees:', error);
+		return res.status(500).json({ message: 'Internal server error' });
+	} finally {
+		await Promise.all(uploads.map((file) => fs.promises.rm(file.path, { force: true })));
+	}
+};
+
+/**
+ * Get employees, optionally one keyset page at a time.
+ *
+ * Without `limit` or `after` the whole filtered list is returned, as before
+ * pagination existed; passing either one switches to pages.
+ *
+ * Query parameters:
+ *   limit           - page size (default 100 once paginating, max 1000)
+ *   after           - employee_id cursor from the previous page's X-Next-Cursor header
+ *   fields          - comma separated column list; employee_id is always included
+ *   is_active       - true | false
+ *   job_title       - exact match
+ *   site_id         - exact match
+ *   hire_date_from  - inclusive YYYY-MM-DD
+ *   hire_date_to    - inclusive YYYY-MM-DD
+ *
+ * Responses carry an ETag and honour If-None-Match, and are served from a
+ * short-lived in-process cache that create/update/delete invalidate.
+ */
+const getAllEmployees = async (req, res) => {
+	try {
+		const query = req.query || {};
+
+		const paginate = query.limit !== undefined || query.after !== undefined;
+		const limit = query.limit === undefined ? DEFAULT_PAGE_SIZE : Number(query.limit);
+		if (paginate && (!Number.isInteger(limit) || limit < 1 || limit > MAX_PAGE_SIZE)) {
+			return res.status(400).json({ message: `limit must be an integer between 1 and ${MAX_PAGE_SIZE}` });
+		}
+
+		let columns = ['*'];
+		if (query.fields) {
+			const requested = String(query.fields).split(',').map((field) => field.trim()).filter(Boolean);
+			const unknown = requested.filter((field) => !LISTABLE_FIELDS.includes(field));
+			if (unknown.length) {
+				return res.status(400).json({ message: `Unknown fields: ${unknown.join(', ')}` });
+			}
+			columns = ['employee_id', ...requested.filter((field) => field !== 'employee_id')];
+		}
+
+		const { clauses, values, error } = buildListFilters(query);
+		if (error) {
+			return res.status(400).json({ message: error });
+		}
+
+		const cacheKey = JSON.stringify([paginate && limit, columns, clauses, values]);
+		let entry = listCache.get(cacheKey);
+		if (!entry || entry.expiresAt <= Date.now()) {
+			// Fetch one extra row to learn whether another page exists.
+			const where = clauses.length ? `WHERE ${clauses.join(' AND ')}` : '';
+			const limitClause = paginate ? ` LIMIT ${limit + 1}` : '';
+			const { rows } = await pool.query(
+				`SELECT ${columns.join(', ')} FROM employee ${where} ORDER BY employee_id${limitClause};`,
+				values
+			);
+			const hasMore = paginate && rows.length > limit;
+			const page = hasMore ? rows.slice(0, limit) : rows;
+			const body = JSON.stringify(page);
+
+			entry = {
+				body,
+				etag: `W/"${crypto.createHash('sha1').update(body).digest('base64url')}"`,
+				nextCursor: hasMore ? String(page[page.length - 1].employee_id) : null,
+				expiresAt: Date.now() + LIST_CACHE_TTL_MS,
+			};
+			if (listCache.size >= LIST_CACHE_MAX_ENTRIES) {
+				// Maps iterate in insertion order, so this evicts the oldest page.
+				listCache.delete(listCache.keys().next().value);
+			}
+			listCache.set(cacheKey, entry);
+		}
+
+		res.set('ETag', entry.etag);
+		if (entry.nextCursor) {
+			res.set('X-Next-Cursor', entry.nextCursor);
+		}
+
+		const ifNoneMatch = req.get('If-None-Match');
+		if (ifNoneMatch && ifNoneMatch.split(',').map((tag) => tag.trim()).includes(entry.etag)) {
+			return res.status(304).end();
+		}
+
+		return res.status(200).type('application/json').send(entry.body);
 	} catch (error) {
 		console.error('Error fetching employees:', error);
 		return res.status(500).json({ message: 'Internal server error' });
@@ -180,6 +761,9 @@ const updateEmployee = async (req, res) => {
 		if (!entries.length) {
 			return res.status(400).json({ message: 'No valid fields provided for update' });
 		}
+		if (!isValidSiteId(req.body.site_id)) {
+			return res.status(400).json({ message: 'site_id may only contain letters, digits, ".", "_" and "-"' });
+		}
 
 		const setClauses = entries.map(([key], index) => `${key} = $${index + 1}`);
 		const values = entries.map(([, value]) => value);
@@ -192,6 +776,7 @@ const updateEmployee = async (req, res) => {
 		`;
 
 		const { rows } = await pool.query(updateQuery, [...values, employeeId]);
+		invalidateListCache();
 
 		if (!rows.length) {
 			return res.status(404).json({ message: 'Employee not found' });
@@ -216,9 +801,22 @@ const deleteEmployee = async (req, res) => {
 			return res.status(400).json({ message: 'Employee id must be an integer' });
 		}
 
-		const { rowCount } = await pool.query('DELETE FROM employee WHERE employee_id = $1;', [
-			employeeId,
-		]);
+		const client = await pool.connect();
+		let rowCount;
+		try {
+			await client.query('BEGIN');
+			await retireEmbeddings(client, employeeId);
+			({ rowCount } = await client.query('DELETE FROM employee WHERE employee_id = $1;', [
+				employeeId,
+			]));
+			await client.query('COMMIT');
+		} catch (error) {
+			await client.query('ROLLBACK');
+			throw error;
+		} finally {
+			client.release();
+		}
+		invalidateListCache();
 
 		if (rowCount === 0) {
 			return res.status(404).json({ message: 'Employee not found' });
@@ -235,6 +833,7 @@ const deleteEmployee = async (req, res) => {
 
 module.exports = {
 	createEmployee,
+	bulkImportEmployees,
 	getAllEmployees,
 	getEmployeeById,
 	updateEmployee,
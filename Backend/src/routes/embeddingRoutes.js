@@ -0,0 +1,10 @@
+const express = require('express');
+const { getEmbeddingChanges } = require('../models/embedding.model');
+
+const router = express.Router();
+
+
+// Embedding routes
+router.get('/embeddings/changes', getEmbeddingChanges);
+
+module.exports = router;
@@ -1,6 +1,9 @@
 const express = require('express');
+const multer = require('multer');
+const os = require('os');
 const {
 	createEmployee,
+	bulkImportEmployees,
 	getAllEmployees,
 	getEmployeeById,
 	updateEmployee,
@@ -8,10 +11,16 @@ const {
 } = require('../models/employee.model');
 
 const router = express.Router();
+const upload = multer({ dest: os.tmpdir() });
+const bulkUpload = upload.fields([
+	{ name: 'rows', maxCount: 1 },
+	{ name: 'photos', maxCount: 5000 },
+]);
 
 
 // Employee routes
 router.post('/employee', createEmployee);
+router.post('/employee/bulk', bulkUpload, bulkImportEmployees);
 router.get('/employee', getAllEmployees);
 router.get('/employee/:id', getEmployeeById);
 router.put('/employee/:id', updateEmployee);
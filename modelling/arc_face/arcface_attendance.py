@@ -2,71 +2,96 @@ import cv2
 import pickle
 import numpy as np
 
-from arcface_model import load_arcface_model
+from arcface_model import get_faces, start_model_loader
 from attendance import AttendanceLogger
+from capture import open_stream, parse_camera_source
+from metrics import METRICS, STARTUP, setup_logging
+from motion_gate import MotionGate
+from site_config import get_match_threshold
+from track_voting import TrackVoter
 
 ENCODINGS_FILE = "arcface_encodings.pkl"
-MATCH_THRESHOLD = 0.50
+MATCH_THRESHOLD = get_match_threshold(0.50)
 CAMERA_SOURCE = "http://192.168.1.3:8080/video"
 
-def parse_camera_source(arg: str):
-    """Return int for webcam indices, otherwise assume IP/RTSP/HTTP URL."""
-    return int(arg) if arg.isdigit() else arg
 
-def cosine_similarity(a, b):
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+def normalize_rows(m):
+    m = np.asarray(m, dtype=np.float32)
+    return m / np.linalg.norm(m, axis=1, keepdims=True).clip(min=1e-12)
 
 
 def main():
+    setup_logging()
+    METRICS.serve()
+
+    # Loads and warms up on its own thread while the gallery and camera open
     print("[INFO] Loading ArcFace model...")
-    model = load_arcface_model()
+    model_future = start_model_loader()
 
     print("[INFO] Loading enrolled identities...")
-    with open(ENCODINGS_FILE, "rb") as f:
+    with STARTUP.phase("gallery_load"), open(ENCODINGS_FILE, "rb") as f:
         data = pickle.load(f)
 
     names = data["names"]
-    embeddings = data["embeddings"]
-
-    attendance = AttendanceLogger()
+    # Normalized once, so cosine similarity against every face is one matmul
+    known = normalize_rows(data["embeddings"]) if names else None
+
+    with STARTUP.phase("attendance_init"):
+        attendance = AttendanceLogger()
+    gate = MotionGate()
+    # Attendance is marked when a track's votes agree, not on a single frame
+    voter = TrackVoter()
     camera_source = parse_camera_source(CAMERA_SOURCE)
-    cap = cv2.VideoCapture(camera_source)
+    with STARTUP.phase("camera_connect"):
+        cap = open_stream(camera_source)
     if not cap.isOpened():
         print("[ERROR] Camera not accessible")
         return
+    with STARTUP.phase("model_wait"):
+        model = model_future.result()
 
     while True:
-        ret, frame = cap.read()
+        with METRICS.stage("capture"):
+            ret, frame = cap.read()
         if not ret:
             break
-
-        faces = model.get(frame)
-
-        for face in faces:
+        METRICS.inc("frames")
+
+        # Skip detection while nobody is in front of the camera
+        with METRICS.stage("gate"):
+            active = gate.check(frame)
+        faces = get_faces(model, frame, METRICS) if active else []
+        METRICS.inc("faces", len(faces))
+        STARTUP.report()
+
+        tracks = voter.update([face.bbox for face in faces], [face.embedding for face in faces])
+        pending = [t for t in tracks if voter.need_search(t)] if names else []
+        if pending:
+            with METRICS.stage("search"):
+                # Track EMAs are already unit length
+                scores = np.stack([t.ema for t in pending]) @ known.T
+                best_idx = scores.argmax(axis=1)
+                best_scores = scores[np.arange(len(pending)), best_idx]
+
+            for track, idx, best_score in zip(pending, best_idx, best_scores):
+                best_score = float(best_score)
+                METRICS.observe("match_score", max(best_score, 0.0))
+                matched = best_score >= MATCH_THRESHOLD
+                METRICS.inc("matched" if matched else "unknown")
+                if voter.vote(track, names[idx] if matched else None, best_score) is not None:
+                    attendance.mark(track.committed)
+
+        for face, track in zip(faces, tracks):
             x1, y1, x2, y2 = map(int, face.bbox)
-            emb = face.embedding
-            landmarks = face.landmark_2d_106
-
-            best_name = "Unknown"
-            best_score = 0.0
-
-            for name, known_emb in zip(names, embeddings):
-                score = cosine_similarity(emb, known_emb)
-                if score > best_score:
-                    best_score = score
-                    best_name = name
-
-            if best_score < MATCH_THRESHOLD:
-                best_name = "Unknown"
 
             # Draw UI
-            if best_name == "Unknown":
-                label = "Unknown"
-                color = (0, 0, 255)
-            else:
-                label = best_name
+            if track.committed is not None:
+                label = track.committed
                 color = (0, 255, 0)
-                attendance.mark(best_name)
+            else:
+                leader, votes = voter.leading(track)
+                label = f"{leader}? {votes}/{voter.min_votes}" if leader else "Unknown"
+                color = (0, 200, 255) if leader else (0, 0, 255)
 
             cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
             cv2.putText(
@@ -2,20 +2,15 @@ import cv2
 import sys
 import numpy as np
 from arcface_model import load_arcface_model
-from faiss_utils import init_faiss, save_faiss, add_embedding
+from faiss_utils import init_faiss, save_faiss, add_embedding, next_legacy_id, store_lock, store_paths, store_site
 from webcam_conn import openCam
 
 
 
-def enroll(name,frame):
+def enroll(name, frame, employee_id=None, embedding_id=None, site_id=None):
     print("[INFO] Loading ArcFace model...")
     model = load_arcface_model()
 
-    index, metadata = init_faiss()
-    
-    # Start ID from the next available
-    next_id = max(metadata.keys()) + 1 if metadata else 0
-
     print(f"[INFO] Enrolling {name}")
     faces = model.get(frame)
 
@@ -26,18 +21,27 @@ def enroll(name,frame):
     # Take the most confident face
     face = max(faces, key=lambda f: f.det_score)
 
-    # Add embedding and show index size change
-    before = index.ntotal
-    add_embedding(index, metadata, next_id, face.embedding, name)
-    next_id += 1
+    # Other enrollments, removals and reshards may write the store concurrently
+    with store_lock():
+        # A sharded store keeps each face in its employee's site shard
+        site = store_site(site_id)
+        index, metadata = init_faiss(site)
+
+        # Without an employee_face_embedding UUID, fall back to the next free integer ID
+        if embedding_id is None:
+            embedding_id = next_legacy_id(metadata)
+
+        # Add embedding and show index size change
+        before = index.ntotal
+        add_embedding(index, metadata, embedding_id, face.embedding, name, employee_id=employee_id, site_id=site_id)
 
-    print(f" -> embedding shape: {face.embedding.shape}")
-    print(f"[INFO] Index size: {before} -> {index.ntotal}")
+        print(f" -> embedding shape: {face.embedding.shape}")
+        print(f"[INFO] Index size: {before} -> {index.ntotal}")
 
-    save_faiss(index, metadata)
-    from faiss_utils import INDEX_PATH, META_PATH
-    print(f"[INFO] FAISS index saved: {INDEX_PATH}")
-    print(f"[INFO] Metadata saved: {META_PATH}")
+        save_faiss(index, metadata, site)
+    index_path, meta_path = store_paths(site)
+    print(f"[INFO] FAISS index saved: {index_path}")
+    print(f"[INFO] Metadata saved: {meta_path}")
 
     print(f"\n[INFO] Enrollment complete")
     print(f"[INFO] Saved {len(metadata)} identities to FAISS vector DB")
@@ -46,7 +50,11 @@ def enroll(name,frame):
 if __name__ == "__main__":
     cap = openCam()
 
+    # Usage: python arcface_enroll.py "<name>" [employee_id] [embedding_id] [site_id]
     name = sys.argv[1] if len(sys.argv) > 1 else "Unknown"
+    employee_id = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    embedding_id = sys.argv[3] if len(sys.argv) > 3 else None
+    site_id = sys.argv[4] if len(sys.argv) > 4 else None
 
     if cap is None or not hasattr(cap, "isOpened"):
         print("Camera capture failed")
@@ -79,7 +87,7 @@ if __name__ == "__main__":
             pass
 
     if captured_frame is not None:
-        enroll(name, captured_frame)
+        enroll(name, captured_frame, employee_id=employee_id, embedding_id=embedding_id, site_id=site_id)
         print(f"Face enrolled successfully for {name}")
         sys.exit(0)
     else:
@@ -0,0 +1,128 @@
+import json
+import sys
+
+import cv2
+from arcface_model import load_arcface_model
+from faiss_utils import (
+    init_faiss, save_faiss, add_embedding, next_legacy_id, store_site, faiss_id_for, remove_embeddings,
+    store_lock,
+)
+
+
+def enroll_batch(items):
+    """
+    Enroll many faces with a single model load and a single index write.
+
+    items: list of dicts with "key", "name", "image_path" and optionally
+           "employee_id" / "embedding_id" (employee_face_embedding UUID) /
+           "site_id" (selects the shard of a sharded store)
+    returns: list of {"key", "status", "embedding_id"} in input order
+    """
+    print(f"[INFO] Loading ArcFace model for {len(items)} enrollments...")
+    model = load_arcface_model()
+
+    results = []
+    embeddings = []
+    for item in items:
+        result = {"key": item["key"], "status": "ENROLLED", "embedding_id": None}
+        frame = cv2.imread(item["image_path"])
+
+        if frame is None:
+            print(f"[WARN] Could not read image for {item['name']}: {item['image_path']}")
+            result["status"] = "BAD_IMAGE"
+        else:
+            faces = model.get(frame)
+            if len(faces) == 0:
+                print(f"[WARN] No face found for {item['name']}, skipping enrollment.")
+                result["status"] = "NO_FACE"
+            else:
+                # Take the most confident face
+                face = max(faces, key=lambda f: f.det_score)
+                embeddings.append((item, result, face.embedding))
+
+        results.append(result)
+
+    # Inference runs unlocked; the store is only locked for load -> add -> save
+    with store_lock():
+        # One load and one write per shard touched, not per item
+        stores = {}
+        for item, result, embedding in embeddings:
+            site = store_site(item.get("site_id"))
+            if site not in stores:
+                index, metadata = init_faiss(site)
+                stores[site] = {"index": index, "metadata": metadata,
+                                "before": index.ntotal, "next_id": next_legacy_id(metadata)}
+            store = stores[site]
+            embedding_id = item.get("embedding_id")
+            if embedding_id is None:
+                embedding_id = store["next_id"]
+                store["next_id"] += 1
+            add_embedding(
+                store["index"], store["metadata"], embedding_id, embedding, item["name"],
+                employee_id=item.get("employee_id"), site_id=item.get("site_id"),
+            )
+            result["embedding_id"] = embedding_id
+
+        for site, store in stores.items():
+            save_faiss(store["index"], store["metadata"], site)
+            label = f"Shard {site}" if site is not None else "Index"
+            print(f"[INFO] {label} size: {store['before']} -> {store['index'].ntotal}")
+
+    return results
+
+
+def remove_batch(items):
+    """
+    Undo enrollments whose employee rows were never committed.
+
+    items: list of dicts with "embedding_id" and optionally "site_id"
+    returns: list of {"embedding_id", "status"} in input order
+    """
+    removed = set()
+    with store_lock():
+        by_site = {}
+        for item in items:
+            by_site.setdefault(store_site(item.get("site_id")), set()).add(faiss_id_for(item["embedding_id"]))
+
+        for site, fids in by_site.items():
+            index, metadata = init_faiss(site)
+            present = {fid for fid in fids if fid in metadata}
+            if present:
+                remove_embeddings(index, metadata, present)
+                save_faiss(index, metadata, site)
+                removed |= present
+
+    return [
+        {"embedding_id": item["embedding_id"],
+         "status": "REMOVED" if faiss_id_for(item["embedding_id"]) in removed else "NOT_FOUND"}
+        for item in items
+    ]
+
+
+if __name__ == "__main__":
+    # Usage: python arcface_enroll_batch.py [--remove] <manifest.json> <results.json>
+    remove = len(sys.argv) > 1 and sys.argv[1] == "--remove"
+    args = sys.argv[2:] if remove else sys.argv[1:]
+    if len(args) != 2:
+        print("Usage: python arcface_enroll_batch.py [--remove] <manifest.json> <results.json>")
+        sys.exit(1)
+
+    with open(args[0], "r") as f:
+        manifest = json.load(f)
+
+    if remove:
+        results = remove_batch(manifest)
+        with open(args[1], "w") as f:
+            json.dump(results, f)
+        removed = sum(1 for r in results if r["status"] == "REMOVED")
+        print(f"[INFO] Batch removal complete: {removed}/{len(results)} removed")
+        sys.exit(0)
+
+    results = enroll_batch(manifest)
+
+    with open(args[1], "w") as f:
+        json.dump(results, f)
+
+    enrolled = sum(1 for r in results if r["status"] == "ENROLLED")
+    print(f"[INFO] Batch enrollment complete: {enrolled}/{len(results)} enrolled")
+    sys.exit(0)
@@ -1,17 +1,207 @@
-from insightface.app import FaceAnalysis
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 
-def load_arcface_model():
+from metrics import STARTUP
+from site_config import FAST_START
+
+MODEL_NAME = "buffalo_l"
+PROVIDERS = ["CPUExecutionProvider"]
+DET_SIZE = (640, 640)
+# ONNX Runtime graphs optimized once and reused, laid out as an insightface
+# root (<cache>/models/buffalo_l/*.onnx); empty disables the cache
+ORT_CACHE_DIR = os.environ.get(
+    "ARCFACE_ORT_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ort_cache")
+)
+ORT_CACHE_MANIFEST = "ort_cache.json"
+
+
+def _ort_cache_dir():
+    return os.path.join(ORT_CACHE_DIR, "models", MODEL_NAME)
+
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime}
+
+
+def _load_ort_cache():
+    """The cache manifest if every cached graph still matches its source and this ORT build."""
+    import onnxruntime
+
+    try:
+        with open(os.path.join(_ort_cache_dir(), ORT_CACHE_MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest["onnxruntime"] != onnxruntime.__version__:
+            return None
+        for name, entry in manifest["models"].items():
+            if _file_stamp(entry["source"]) != entry["stamp"] \
+                    or not os.path.exists(os.path.join(_ort_cache_dir(), name)):
+                return None
+    except (OSError, ValueError, KeyError):
+        return None
+    return manifest
+
+
+def build_ort_cache(app):
+    """
+    Save an optimized copy of every model `app` loaded. The optimized graphs
+    already have constant folding and node fusions applied, so sessions
+    created from them skip that part of ONNX Runtime's load-time work.
+
+    insightface still opens them at the default ORT_ENABLE_ALL level, and
+    that is deliberate: the remaining layout pass is most of what is left of
+    session creation, but it is also what makes CPU inference fast. On a
+    130 MB ResNet-style Conv+BN+ReLU stand-in, session creation went from
+    about 330 ms to 265 ms; at BASIC it would be 135 ms, but every inference
+    about 25% slower. buffalo_l itself has not been timed; compare the
+    model_load and model_load_cached phases STARTUP reports on the target box.
+    """
+    import onnxruntime
+
+    cache_dir = _ort_cache_dir()
+    tmp = f"{cache_dir}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    models = {}
+    for model in app.models.values():
+        name = os.path.basename(model.model_file)
+        options = onnxruntime.SessionOptions()
+        # EXTENDED rather than ALL: ALL adds layout changes tied to this CPU
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+        options.optimized_model_filepath = os.path.join(tmp, name)
+        onnxruntime.InferenceSession(model.model_file, options, providers=PROVIDERS)
+        models[name] = {
+            "source": os.path.abspath(model.model_file),
+            "stamp": _file_stamp(model.model_file),
+            # insightface guesses these from the first graph nodes, which
+            # optimization may rename; keep the values from the original
+            "input_mean": getattr(model, "input_mean", None),
+            "input_std": getattr(model, "input_std", None),
+        }
+    with open(os.path.join(tmp, ORT_CACHE_MANIFEST), "w") as f:
+        json.dump({"onnxruntime": onnxruntime.__version__, "models": models}, f, indent=2)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.rename(tmp, cache_dir)
+
+
+def load_arcface_model(fast_start=FAST_START):
     """
     Loads ArcFace (InsightFace) model for CPU inference.
     Includes face detection + alignment + embedding.
+    With fast_start, sessions are created from the ORT-optimized graph
+    cache, which is built on the first run.
     """
-    app = FaceAnalysis(
-        name="buffalo_l",
-        providers=["CPUExecutionProvider"]
-    )
+    with STARTUP.phase("import_insightface"):
+        from insightface.app import FaceAnalysis
 
-    # ctx_id = -1 → CPU
-    app.prepare(ctx_id=-1, det_size=(640, 640))
+    manifest = _load_ort_cache() if fast_start and ORT_CACHE_DIR else None
+    with STARTUP.phase("model_load_cached" if manifest else "model_load"):
+        if manifest:
+            app = FaceAnalysis(name=MODEL_NAME, root=ORT_CACHE_DIR, providers=PROVIDERS)
+            for model in app.models.values():
+                entry = manifest["models"].get(os.path.basename(model.model_file), {})
+                if entry.get("input_mean") is not None:
+                    model.input_mean, model.input_std = entry["input_mean"], entry["input_std"]
+        else:
+            app = FaceAnalysis(name=MODEL_NAME, providers=PROVIDERS)
+
+        # ctx_id = -1 → CPU
+        app.prepare(ctx_id=-1, det_size=DET_SIZE)
+
+    if fast_start and ORT_CACHE_DIR and not manifest:
+        try:
+            with STARTUP.phase("ort_cache_build"):
+                build_ort_cache(app)
+            print(f"[INFO] Optimized ONNX graphs cached in {_ort_cache_dir()}")
+        except Exception as e:
+            print(f"[WARN] Could not build the ONNX Runtime cache: {e}")
 
     return app
+
+
+def warmup_model(app):
+    """
+    Run detection and embedding once on blank input, so first-call costs
+    (memory arenas, kernel selection) are paid before the first real frame.
+    """
+    with STARTUP.phase("model_warmup"):
+        app.det_model.detect(np.zeros(DET_SIZE[::-1] + (3,), dtype=np.uint8), max_num=0, metric="default")
+        rec = app.models.get("recognition")
+        if rec is not None:
+            rec.get_feat([np.zeros((112, 112, 3), dtype=np.uint8)])
+
+
+def start_model_loader(fast_start=FAST_START):
+    """
+    Import, load and warm the model on a background thread, so it overlaps
+    with camera connect and gallery load. Returns a Future of the app.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+
+    def load():
+        app = load_arcface_model(fast_start)
+        warmup_model(app)
+        return app
+
+    future = executor.submit(load)
+    executor.shutdown(wait=False)
+    return future
+
+
+def get_faces(app, frame, metrics):
+    """
+    Same as app.get(frame), with detection and embedding timed as separate
+    stages on `metrics` (anything with a stage(name) context manager).
+    """
+    from insightface.app.common import Face
+
+    with metrics.stage("detect"):
+        bboxes, kpss = app.det_model.detect(frame, max_num=0, metric="default")
+
+    faces = []
+    with metrics.stage("embed"):
+        for i in range(bboxes.shape[0]):
+            face = Face(
+                bbox=bboxes[i, 0:4],
+                kps=kpss[i] if kpss is not None else None,
+                det_score=bboxes[i, 4],
+            )
+            for taskname, model in app.models.items():
+                if taskname != "detection":
+                    model.get(frame, face)
+            faces.append(face)
+
+    return faces
+
+
+def get_face_embeddings(app, images, metrics):
+    """
+    Normalized embedding of the most prominent face in each image, with the
+    recognition model run once for the whole batch.
+    returns: list of (embedding, bbox), (None, None) where no face was found
+    """
+    from insightface.utils import face_align
+
+    crops, found = [], []
+    with metrics.stage("detect"):
+        for i, img in enumerate(images):
+            if img is None:
+                continue
+            bboxes, kpss = app.det_model.detect(img, max_num=1, metric="default")
+            if bboxes.shape[0] == 0 or kpss is None:
+                continue
+            crops.append(face_align.norm_crop(img, landmark=kpss[0]))
+            found.append((i, bboxes[0, 0:4]))
+
+    results = [(None, None)] * len(images)
+    if crops:
+        with metrics.stage("embed"):
+            feats = app.models["recognition"].get_feat(crops)
+            feats /= np.linalg.norm(feats, axis=1, keepdims=True).clip(min=1e-12)
+        for (i, bbox), feat in zip(found, feats):
+            results[i] = (feat.astype(np.float32), bbox)
+    return results
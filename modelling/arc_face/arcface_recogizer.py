@@ -1,12 +1,14 @@
 import numpy as np
-from faiss_utils import init_faiss
+from faiss_utils import init_faiss, get_name, store_site
+from site_config import SITE_ID, get_match_threshold
 
-MATCH_THRESHOLD = 0.50  # conservative for ArcFace + IP
+MATCH_THRESHOLD = get_match_threshold(0.50)  # conservative for ArcFace + IP
 
 
 class ArcFaceRecognizer:
     def __init__(self):
-        self.index, self.metadata = init_faiss()
+        # Own site's shard only; see arcface_recognizer.py for the cross-site fallback
+        self.index, self.metadata = init_faiss(store_site(SITE_ID))
 
     @staticmethod
     def _normalize(vec):
@@ -43,7 +45,8 @@ class ArcFaceRecognizer:
 
         return {
             "status": "MATCH",
-            "name": self.metadata.get(embedding_id),
+            "name": get_name(self.metadata, embedding_id),
             "confidence": score,
             "embedding_id": embedding_id,
+            "employee_id": self.metadata[embedding_id]["employee_id"],
         }
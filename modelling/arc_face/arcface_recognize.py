@@ -1,16 +1,15 @@
 import cv2
 import cv2
 import numpy as np
-from arcface_model import load_arcface_model
+from arcface_model import get_faces, start_model_loader
+from capture import open_stream
+from metrics import METRICS, STARTUP, RateLimitedLog, setup_logging
+from motion_gate import MotionGate
+from site_config import get_match_threshold
+from track_voting import TrackVoter
 from webcam_conn import openCam
 
-MATCH_THRESHOLD = 0.60
-
-
-def _normalize(v):
-    v = np.asarray(v, dtype=np.float32)
-    n = np.linalg.norm(v)
-    return v / n if n > 0 else v
+MATCH_THRESHOLD = get_match_threshold(0.60)
 
 
 def open_camera_with_fallback():
@@ -18,56 +17,73 @@ def open_camera_with_fallback():
     if cap is not None and cap.isOpened():
         return cap
     for idx in [0, 1, 2]:
-        c = cv2.VideoCapture(idx)
+        c = open_stream(idx)
         if c.isOpened():
             print(f"[INFO] Fallback to local camera index {idx}")
             return c
     return None
 
 
-def make_faiss_searcher():
-    from faiss_utils import init_faiss, INDEX_PATH
-    import os
-    index, metadata = init_faiss()
-    if not os.path.exists(INDEX_PATH) or index.ntotal == 0 or len(metadata) == 0:
-        raise RuntimeError("No enrollments found. Run arcface_enroll.py first.")
-    return index, metadata
+def identity_key(result):
+    # Same-name employees must not pool votes; legacy records have no employee_id
+    return result["employee_id"] if result["employee_id"] is not None else result["name"]
 
 
-def search_faiss(index, metadata, query_embedding, top_k=1):
-    q = _normalize(query_embedding).reshape(1, -1).astype(np.float32)
-    scores, ids = index.search(q, top_k)
-    best_id = int(ids[0][0])
-    best_score = float(scores[0][0])
-    name = metadata.get(best_id, "Unknown")
-    return name, best_score
+def make_faiss_searcher():
+    from arcface_recognizer import ArcFaceRecognizer
+    # Own site's shard as the hot set, other sites' shards as fallback
+    recognizer = ArcFaceRecognizer(roster_feed=True, threshold=MATCH_THRESHOLD)
+    if recognizer.ntotal == 0 and not (recognizer.cold and recognizer.cold.sites()):
+        raise RuntimeError("No enrollments found. Run arcface_enroll.py first.")
+    return recognizer
 
 
 def main():
+    setup_logging()
+    METRICS.serve()
+    recognized_log = RateLimitedLog(interval=5.0)
+
+    # Loads and warms up on its own thread while the gallery and camera open
     print("[INFO] Loading ArcFace model...")
-    model = load_arcface_model()
+    model_future = start_model_loader()
 
     print("[INFO] Preparing FAISS searcher...")
     try:
-        index, metadata = make_faiss_searcher()
-        print(f"[INFO] FAISS entries: {index.ntotal}")
+        recognizer = make_faiss_searcher()
+        site = f" (site shard {recognizer.site})" if recognizer.site is not None else ""
+        print(f"[INFO] FAISS entries: {recognizer.ntotal}{site}")
     except Exception as e:
         print(f"[ERROR] {e}")
         return
 
+    gate = MotionGate()
+    voter = TrackVoter()
+    names = {}  # identity key -> latest display name
+
     print("[INFO] Opening camera...")
-    cap = open_camera_with_fallback()
+    with STARTUP.phase("camera_connect"):
+        cap = open_camera_with_fallback()
     if cap is None:
         print("[ERROR] Could not open any camera. Check connections.")
         return
+    with STARTUP.phase("model_wait"):
+        model = model_future.result()
 
     print("[INFO] Starting recognition. Press 'q' to quit.")
     while True:
-        ret, frame = cap.read()
+        with METRICS.stage("capture"):
+            ret, frame = cap.read()
         if not ret:
             break
-
-        faces = model.get(frame)
+        METRICS.inc("frames")
+
+        # Skip detection while nobody is in front of the camera
+        with METRICS.stage("gate"):
+            active = gate.check(frame)
+        faces = get_faces(model, frame, METRICS) if active else []
+        METRICS.inc("faces", len(faces))
+        STARTUP.report()
+        tracks = voter.update([face.bbox for face in faces], [face.embedding for face in faces])
         if not faces:
             try:
                 cv2.imshow("ArcFace Recognition", frame)
@@ -77,17 +93,34 @@ def main():
                 break
             continue
 
-        for face in faces:
+        # Committed tracks are not searched again; the rest search their EMA embedding
+        pending = [t for t in tracks if voter.need_search(t)]
+        if pending:
+            with METRICS.stage("search"):
+                results = recognizer.recognize_batch(np.stack([t.ema for t in pending]))
+            for track, result in zip(pending, results):
+                score = result["confidence"]
+                METRICS.observe("match_score", score)
+                matched = result["status"] == "MATCH"
+                METRICS.inc("matched" if matched else "unknown")
+                key = identity_key(result) if matched else None
+                if matched:
+                    names[key] = result["name"]
+                if voter.vote(track, key, score) is not None:
+                    recognized_log.event("recognized", key=key, name=names[key],
+                                         employee_id=result["employee_id"],
+                                         score=round(track.committed_score, 3), track=track.id)
+
+        for face, track in zip(faces, tracks):
             x1, y1, x2, y2 = map(int, face.bbox)
-            name, score = search_faiss(index, metadata, face.embedding)
-            if score < MATCH_THRESHOLD:
-                name = "Unknown"
-
-            color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
+            if track.committed is not None:
+                label, color = f"{names[track.committed]} ({track.committed_score:.2f})", (0, 255, 0)
+            else:
+                leader, votes = voter.leading(track)
+                label = f"{names[leader]}? {votes}/{voter.min_votes}" if leader is not None else "Unknown"
+                color = (0, 200, 255) if leader is not None else (0, 0, 255)
             cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-            cv2.putText(frame, f"{name} ({score:.2f})", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-
-        print(f"Recognized: {name}, score={score:.2f}")
+            cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
 
         try:
             cv2.imshow("ArcFace Recognition", frame)
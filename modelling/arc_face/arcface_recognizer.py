@@ -1,14 +1,107 @@
+import os
+import threading
+
 import numpy as np
-from faiss_utils import init_faiss
+from compact_gallery import load_snapshot, save_snapshot
+from faiss_utils import init_faiss, reconstruct_embeddings, store_paths, store_site
+from metrics import METRICS, STARTUP
+from roster_sync import RosterFeed, note_inactive
+from shard_cache import ShardCache
+from site_config import FAST_START, SITE_ID, get_match_threshold
 
-MATCH_THRESHOLD = 0.50
+MATCH_THRESHOLD = get_match_threshold(0.50)
+# Candidates fetched from the snapshot when some employees were deactivated
+# after it was written, so one of theirs can be passed over for the next best
+SNAPSHOT_CANDIDATES = 8
 
 
 class ArcFaceRecognizer:
-    def __init__(self):
-        """Initialize the recognizer with FAISS index and metadata."""
-        self.index, self.metadata = init_faiss()
-    
+    def __init__(self, roster_feed=False, site_id=SITE_ID, threshold=MATCH_THRESHOLD, fast_start=FAST_START):
+        """
+        Initialize the recognizer with FAISS index and metadata.
+
+        Args:
+            roster_feed: If True, follow the backend change feed so renames,
+                deactivations and new enrollments apply without a restart.
+            site_id: Site this recognizer serves. With a sharded store its
+                shard is the hot set searched for every face; other shards
+                are only searched for faces scoring below threshold there.
+            threshold: Minimum similarity for a match.
+            fast_start: Serve searches from the mmap'd compact snapshot of
+                the gallery while the FAISS store loads in the background,
+                and refresh the snapshot when it is stale.
+        """
+        self.site = store_site(site_id)
+        self.threshold = threshold
+        self.fast_start = fast_start
+        self.index, self.metadata = None, None
+        self.cold = ShardCache(exclude=self.site) if self.site is not None else None
+        self.feed = RosterFeed().start() if roster_feed else None
+        self._held = []  # roster batches received while serving from the snapshot
+        self._ready = threading.Event()
+
+        with STARTUP.phase("gallery_snapshot"):
+            self.snapshot = load_snapshot(self.site) if fast_start else None
+        if self.snapshot is not None:
+            threading.Thread(target=self._load_store, name="gallery-load", daemon=True).start()
+        else:
+            self._load_store()
+
+    def _load_store(self):
+        try:
+            source_mtime = os.path.getmtime(store_paths(self.site)[0])
+        except OSError:
+            source_mtime = None
+        with STARTUP.phase("gallery_load"):
+            index, metadata = init_faiss(self.site)
+        # Searches switch from the snapshot to the full store here
+        self.metadata = metadata
+        self.index = index
+        had_snapshot, self.snapshot = self.snapshot is not None, None
+        self._ready.set()
+        if self.fast_start and not had_snapshot and source_mtime is not None:
+            threading.Thread(
+                target=self._write_snapshot, args=(source_mtime,), name="gallery-snapshot", daemon=True
+            ).start()
+
+    def _write_snapshot(self, source_mtime):
+        # Its own copy of the store: the frame loop owns the one in use
+        try:
+            index, metadata = init_faiss(self.site)
+            if os.path.getmtime(store_paths(self.site)[0]) == source_mtime:
+                save_snapshot(index, metadata, self.site, source_mtime=source_mtime)
+        except Exception as e:
+            print(f"[WARN] Could not write gallery snapshot: {e}")
+
+    @property
+    def ntotal(self):
+        snapshot = self.snapshot
+        return snapshot.ntotal if snapshot is not None else self.index.ntotal
+
+    def wait_ready(self, timeout=None):
+        """Block until the full FAISS store is loaded (immediate without fast start)."""
+        return self._ready.wait(timeout)
+
+    def sync_roster(self):
+        """Apply any roster changes received since the last call."""
+        if self.feed is None:
+            return
+        batches = self.feed.drain()
+        if self.snapshot is not None:
+            # The store is still loading: hold the batches for it, but note
+            # deactivations now so the snapshot stops matching those employees
+            for changes, _ in batches:
+                note_inactive(self.feed.inactive, changes)
+            self._held.extend(batches)
+            return
+        batches, self._held = self._held + batches, []
+        if batches:
+            self.index, self.metadata = self.feed.apply_pending(
+                self.index, self.metadata, site=self.site, batches=batches
+            )
+            if self.cold is not None:
+                self.cold.apply_pending(self.feed, batches)
+
     def recognize(self, embedding):
         """
         Recognize a face embedding using FAISS search.
@@ -20,25 +113,108 @@ class ArcFaceRecognizer:
             dict with keys:
                 - status: "MATCH" or "NO_MATCH"
                 - name: Matched person's name (if status is "MATCH")
+                - employee_id: Matched employee row id (if known)
+                - embedding_id: Matched employee_face_embedding UUID (if known)
                 - confidence: Similarity score
         """
+        self.sync_roster()
+
         # Reshape embedding for FAISS search
         vec = np.asarray(embedding, dtype="float32").reshape(1, -1)
-        
-        # Search for nearest neighbor
-        D, I = self.index.search(vec, k=1)
-        
+        return self._search(vec)[0]
+
+    def recognize_batch(self, embeddings):
+        """
+        Recognize several embeddings with a single FAISS search.
+
+        Args:
+            embeddings: Sequence of embeddings or an (N, 512) array
+
+        Returns:
+            list of result dicts, as returned by recognize()
+        """
+        self.sync_roster()
+        if len(embeddings) == 0:
+            return []
+        vecs = np.asarray(embeddings, dtype="float32").reshape(len(embeddings), -1)
+        return self._search(vecs)
+
+    def _search(self, vecs):
+        # Search for nearest neighbor in the hot set
+        snapshot = self.snapshot
+        if snapshot is not None:
+            inactive = self.feed.inactive if self.feed is not None else ()
+            k = min(SNAPSHOT_CANDIDATES, snapshot.ntotal) if inactive else 1
+            D, rows = snapshot.search(vecs, k=max(k, 1))
+            fids = np.where(rows >= 0, snapshot.ids[np.maximum(rows, 0)], -1)
+            if inactive:
+                # Same filter the cold shards get: skip embeddings deactivated
+                # since the snapshot was written, keep the best remaining one
+                fids[np.isin(fids, np.fromiter(inactive, dtype=np.int64, count=len(inactive)))] = -1
+            best = (fids != -1).argmax(axis=1)
+            pick = np.arange(len(fids))
+            scores, rows, fids = D[pick, best], rows[pick, best], fids[pick, best]
+            records = [snapshot.record(row) if fid != -1 else None for row, fid in zip(rows, fids)]
+        else:
+            D, I = self.index.search(vecs, k=1)
+            scores, fids = D[:, 0], I[:, 0]
+            records = [self.metadata.get(int(fid)) for fid in fids]
+
+        # Faces unknown here may belong to another site
+        misses = np.flatnonzero((fids == -1) | (scores < self.threshold))
+        if self.cold is not None and len(misses):
+            METRICS.inc("shard_fallback", len(misses))
+            inactive = self.feed.inactive if self.feed is not None else ()
+            with METRICS.stage("shard_fallback"):
+                cold_scores, cold_fids, cold_records = self.cold.search(vecs[misses], inactive, self.threshold)
+            for row, score, fid, rec in zip(misses, cold_scores, cold_fids, cold_records):
+                if fid != -1 and (fids[row] == -1 or score > scores[row]):
+                    scores[row], fids[row], records[row] = score, fid, rec
+                    if score >= self.threshold:
+                        METRICS.inc("shard_fallback_hit")
+        return [self._result(score, fid, rec) for score, fid, rec in zip(scores, fids, records)]
+
+    def _result(self, score, fid, rec):
         # Check if valid match found
-        if I[0][0] == -1 or D[0][0] < MATCH_THRESHOLD:
+        if fid == -1 or score < self.threshold:
             return {
                 "status": "NO_MATCH",
                 "name": None,
-                "confidence": D[0][0] if I[0][0] != -1 else 0.0
+                "employee_id": None,
+                "embedding_id": None,
+                "confidence": float(score) if fid != -1 else 0.0
             }
         
         # Return matched identity
         return {
             "status": "MATCH",
-            "name": self.metadata[I[0][0]],
-            "confidence": D[0][0]
+            "name": rec["name"],
+            "employee_id": rec["employee_id"],
+            "embedding_id": rec["embedding_id"],
+            "confidence": float(score)
         }
+
+    def vectors_for(self, employee_id):
+        """
+        Enrolled embeddings of one employee, reconstructed from the index
+        through its id map (for 1:1 verification). Looks in the other
+        shards when the employee is not enrolled at this site: those in
+        memory, then at most COLD_SHARD_LOADS from disk per call.
+
+        Args:
+            employee_id: employee row id
+
+        Returns:
+            (K, 512) float32 array, K = 0 if the employee has no enrollment
+        """
+        self.wait_ready()
+        self.sync_roster()
+        fids = [fid for fid, rec in self.metadata.items() if rec["employee_id"] == employee_id]
+        _, vecs = reconstruct_embeddings(self.index, fids)
+        if len(vecs) or self.cold is None:
+            return vecs
+        inactive = self.feed.inactive if self.feed is not None else set()
+        for index, fids in self.cold.find(lambda rec: rec["employee_id"] == employee_id, inactive):
+            _, cold_vecs = reconstruct_embeddings(index, [fid for fid in fids if fid not in inactive])
+            vecs = np.concatenate([vecs, cold_vecs])
+        return vecs
@@ -3,6 +3,28 @@ import csv
 import os
 from datetime import date, datetime
 
+from metrics import METRICS, log_event
+
+TAIL_BLOCK = 64 * 1024
+
+
+def _lines_from_end(path, block=TAIL_BLOCK):
+    """Yield the lines of a file last to first, reading it backwards in blocks."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        rest = b""
+        while pos > 0:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + rest).split(b"\n")
+            # The first piece may be the tail of a line that starts further back
+            rest = lines.pop(0)
+            for line in reversed(lines):
+                yield line.rstrip(b"\r").decode("utf-8")
+        yield rest.rstrip(b"\r").decode("utf-8")
+
 
 class AttendanceLogger:
     def __init__(self, path="attendance_arcface.csv"):
@@ -17,26 +39,32 @@ class AttendanceLogger:
                 writer = csv.writer(f)
                 writer.writerow(["name", "date", "time"])
         else:
-            with open(self.path, "r") as f:
-                reader = csv.reader(f)
-                next(reader, None)
-                for row in reader:
-                    if row and row[1] == self.today:
-                        self.marked.add(row[0])
+            # Rows are appended in time order, so today's marks are the tail
+            # of the file; stop at the first older row instead of reading
+            # months of history on every start
+            for line in _lines_from_end(self.path):
+                row = next(csv.reader([line]), None)
+                if not row:
+                    continue
+                if len(row) < 2 or row[1] != self.today:
+                    break
+                self.marked.add(row[0])
 
     def mark(self, name):
         if name in self.marked:
             return False
 
         now = datetime.now()
-        with open(self.path, "a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                name,
-                now.strftime("%Y-%m-%d"),
-                now.strftime("%H:%M:%S")
-            ])
+        with METRICS.stage("attendance"):
+            with open(self.path, "a", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow([
+                    name,
+                    now.strftime("%Y-%m-%d"),
+                    now.strftime("%H:%M:%S")
+                ])
 
         self.marked.add(name)
-        print(f"[ATTENDANCE] Marked {name}")
+        METRICS.inc("attendance_marked")
+        log_event("attendance_marked", name=name)
         return True
@@ -0,0 +1,345 @@
+"""
+calibrate_threshold.py
+Genuine/impostor evaluation of a labeled face set and threshold calibration.
+
+Every pair of embeddings is scored exactly once, block by block, and only
+fixed-bin score histograms are kept, so memory stays O(block² + bins) no
+matter how many embeddings there are (100k+ is ~5e9 pairs, a few minutes
+of matmul on CPU). FAR/FRR for any threshold fall out of the histograms.
+
+Sources (pick one):
+    --crops DIR        one sub-folder of face crops per identity
+    --prepared OUT     a split prepared by research-paper-1/dataset_pipeline.py
+    --npz FILE         an .npz with `embeddings` (N, D) and `labels` (N,)
+
+Usage:
+    python calibrate_threshold.py --crops ../data/cropped/test --target-far 1e-4 \
+        --out report.json --site gate-1 --write
+    python calibrate_threshold.py --prepared ../research-paper-1/prepared --split test
+    python calibrate_threshold.py --crops ../face_recognition/train_images \
+        --embedder dlib --metric l2
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from site_config import SITE_ID, save_threshold
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+# Score range and bin count per metric; 0.001 resolution is finer than any
+# threshold anyone will configure
+SCORE_RANGE = {"cosine": (-1.0, 1.0), "l2": (0.0, 2.0)}
+NUM_BINS = 2000
+
+# Thresholds currently hardcoded in the recognizers, always reported
+CANDIDATES = {
+    "cosine": (0.30, 0.35, 0.40, 0.45, 0.50, 0.55, 0.60, 0.65, 0.70),
+    "l2": (0.40, 0.45, 0.50, 0.55, 0.60, 0.65, 0.70),
+}
+FAR_TARGETS = (1e-2, 1e-3, 1e-4, 1e-5, 1e-6)
+
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+def list_crops(root):
+    """(path, identity) for every image under root/<identity>/."""
+    items = []
+    for identity in sorted(os.listdir(root)):
+        folder = os.path.join(root, identity)
+        if not os.path.isdir(folder):
+            continue
+        for fname in sorted(os.listdir(folder)):
+            if fname.lower().endswith(IMAGE_EXTS):
+                items.append((os.path.join(folder, fname), identity))
+    return items
+
+
+def arcface_embedder(batch_size=64):
+    """
+    ArcFace recognition head only: crops are already tight faces, so they
+    are resized to the model input instead of being re-detected.
+    """
+    from arcface_model import load_arcface_model
+
+    rec = load_arcface_model().models["recognition"]
+    size = tuple(rec.input_size)
+
+    def embed(images):
+        out = []
+        for i in range(0, len(images), batch_size):
+            batch = [cv2.resize(img, size) for img in images[i:i + batch_size]]
+            out.append(rec.get_feat(batch))
+        return np.concatenate(out).astype(np.float32)
+
+    return embed
+
+
+def dlib_embedder():
+    """face_recognition (dlib) 128-d encodings, treating the whole crop as the face."""
+    import face_recognition
+
+    def embed(images):
+        out = []
+        for img in images:
+            h, w = img.shape[:2]
+            rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            out.append(face_recognition.face_encodings(rgb, known_face_locations=[(0, w, h, 0)])[0])
+        return np.asarray(out, dtype=np.float32)
+
+    return embed
+
+
+EMBEDDERS = {"arcface": arcface_embedder, "dlib": dlib_embedder}
+
+
+def load_crops(root, embedder, chunk=512):
+    items = list_crops(root)
+    if not items:
+        raise SystemExit(f"[ERROR] No images found under {root}/<identity>/")
+    embed = EMBEDDERS[embedder]()
+    names = sorted({identity for _, identity in items})
+    label_of = {name: i for i, name in enumerate(names)}
+
+    embeddings, labels = [], []
+    for i in range(0, len(items), chunk):
+        imgs, ids = [], []
+        for path, identity in items[i:i + chunk]:
+            img = cv2.imread(path)
+            if img is None:
+                print(f"[WARN] Could not read {path}, skipping")
+                continue
+            imgs.append(img)
+            ids.append(label_of[identity])
+        if imgs:
+            embeddings.append(embed(imgs))
+            labels.extend(ids)
+        print(f"[INFO] Embedded {min(i + chunk, len(items))}/{len(items)} crops")
+    return np.concatenate(embeddings), np.asarray(labels, dtype=np.int64)
+
+
+def load_prepared(out, split, variant):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "research-paper-1"))
+    from dataset_pipeline import open_split
+    from augment import VARIANTS
+
+    v = [name for name, _ in VARIANTS].index(variant)
+    data = open_split(out, split, with_embeddings=True)
+    embeddings = np.concatenate([np.asarray(e[:, v]) for e in data["embeddings"]])
+    labels = np.concatenate([np.asarray(lab) for lab in data["labels"]])
+    return embeddings.astype(np.float32), labels
+
+
+def load_npz(path):
+    data = np.load(path)
+    return data["embeddings"].astype(np.float32), np.asarray(data["labels"])
+
+
+# ---------------------------------------------------------------------------
+# Pair scoring
+# ---------------------------------------------------------------------------
+def pair_histograms(embeddings, labels, metric="cosine", block=2048, bins=NUM_BINS):
+    """
+    Histogram the scores of all N*(N-1)/2 pairs, split into genuine (same
+    label) and impostor pairs.
+
+    metric: "cosine" (similarity of L2-normalized embeddings, ArcFace) or
+            "l2" (Euclidean distance, face_recognition / dlib)
+    returns: (genuine_counts, impostor_counts, edges)
+    """
+    lo, hi = SCORE_RANGE[metric]
+    scale = bins / (hi - lo)
+    emb = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if metric == "cosine":
+        emb = emb / np.linalg.norm(emb, axis=1, keepdims=True).clip(min=1e-12)
+    sq = np.einsum("ij,ij->i", emb, emb)
+
+    # Histogram slot per pair: bin for impostors, bins + bin for genuine
+    # pairs, 2 * bins for pairs that must not count (diagonal, lower triangle)
+    counts = np.zeros(2 * bins + 1, dtype=np.int64)
+    n = len(emb)
+    tri = np.triu(np.ones((block, block), dtype=bool), k=1)
+
+    for i in range(0, n, block):
+        a, la = emb[i:i + block], labels[i:i + block]
+        for j in range(i, n, block):
+            b, lb = emb[j:j + block], labels[j:j + block]
+            s = a @ b.T
+            if metric == "l2":
+                # |a - b|² = |a|² + |b|² - 2ab, in place on the score block
+                s *= -2
+                s += sq[i:i + block, None]
+                s += sq[None, j:j + block]
+                np.maximum(s, 0, out=s)
+                np.sqrt(s, out=s)
+            s -= lo
+            s *= scale
+            np.clip(s, 0, bins - 1, out=s)
+            slot = s.astype(np.int64)
+            slot += bins * (la[:, None] == lb[None, :])
+            if i == j:
+                slot[~tri[:len(a), :len(b)]] = 2 * bins
+            counts += np.bincount(slot.ravel(), minlength=2 * bins + 1)
+
+    edges = lo + np.arange(bins + 1) / scale
+    return counts[bins:2 * bins], counts[:bins], edges
+
+
+def error_rates(genuine, impostor, metric):
+    """
+    FAR and FRR at every bin edge.
+    cosine accepts score >= t, l2 accepts distance < t.
+    """
+    zero = np.zeros(1, dtype=np.int64)
+    if metric == "cosine":
+        gen_acc = np.concatenate([np.cumsum(genuine[::-1])[::-1], zero])
+        imp_acc = np.concatenate([np.cumsum(impostor[::-1])[::-1], zero])
+    else:
+        gen_acc = np.concatenate([zero, np.cumsum(genuine)])
+        imp_acc = np.concatenate([zero, np.cumsum(impostor)])
+    far = imp_acc / max(int(impostor.sum()), 1)
+    frr = 1.0 - gen_acc / max(int(genuine.sum()), 1)
+    return far, frr
+
+
+def recommend(edges, far, frr, target_far, metric):
+    """Lowest-FRR threshold whose FAR is at most target_far (strictest on ties)."""
+    ok = np.flatnonzero(far <= target_far)
+    if len(ok) == 0:
+        return None
+    best = ok[frr[ok] == frr[ok].min()]
+    k = best.max() if metric == "cosine" else best.min()
+    return {"threshold": round(float(edges[k]), 4), "far": float(far[k]), "frr": float(frr[k])}
+
+
+def at_threshold(edges, far, frr, t):
+    k = int(np.argmin(np.abs(edges - t)))
+    return {"threshold": t, "far": float(far[k]), "frr": float(frr[k])}
+
+
+def write_curves(path, edges, far, frr):
+    """ROC (TAR vs FAR) and DET (FRR vs FAR) share one table."""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["threshold", "far", "frr", "tar"])
+        for t, a, r in zip(edges, far, frr):
+            writer.writerow([f"{t:.4f}", f"{a:.8g}", f"{r:.8g}", f"{1 - r:.8g}"])
+
+
+def plot_curves(path, far, frr, recommended):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("[WARN] matplotlib not installed, skipping plot")
+        return
+    fig, (roc, det) = plt.subplots(1, 2, figsize=(11, 4.5))
+    floor = 1e-7
+    roc.semilogx(np.maximum(far, floor), 1 - frr)
+    roc.set(xlabel="FAR", ylabel="TAR", title="ROC")
+    det.loglog(np.maximum(far, floor), np.maximum(frr, floor))
+    det.set(xlabel="FAR", ylabel="FRR", title="DET")
+    if recommended:
+        roc.axvline(max(recommended["far"], floor), ls="--", c="gray")
+        det.axvline(max(recommended["far"], floor), ls="--", c="gray")
+    for ax in (roc, det):
+        ax.grid(True, which="both", alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    print(f"[INFO] Curves plotted to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--crops", help="Folder of <identity>/<image> face crops")
+    source.add_argument("--prepared", help="dataset_pipeline.py output directory")
+    source.add_argument("--npz", help=".npz with embeddings and labels")
+    parser.add_argument("--embedder", choices=sorted(EMBEDDERS), default="arcface", help="For --crops")
+    parser.add_argument("--split", default="test", help="For --prepared")
+    parser.add_argument("--variant", default="orig", help="For --prepared: augmentation variant to evaluate")
+    parser.add_argument("--metric", choices=sorted(SCORE_RANGE), default="cosine")
+    parser.add_argument("--block", type=int, default=2048, help="Rows per scoring block")
+    parser.add_argument("--target-far", type=float, default=1e-4)
+    parser.add_argument("--out", default="calibration.json", help="JSON report")
+    parser.add_argument("--curves", help="CSV of threshold/FAR/FRR/TAR (default: next to --out)")
+    parser.add_argument("--plot", help="PNG with ROC and DET curves (needs matplotlib)")
+    parser.add_argument("--site", default=SITE_ID, help="Site the recommendation is for")
+    parser.add_argument("--write", action="store_true", help="Store the recommendation in the recognizer config")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.crops:
+        embeddings, labels = load_crops(args.crops, args.embedder)
+        source = {"crops": args.crops, "embedder": args.embedder}
+    elif args.prepared:
+        embeddings, labels = load_prepared(args.prepared, args.split, args.variant)
+        source = {"prepared": args.prepared, "split": args.split, "variant": args.variant}
+    else:
+        embeddings, labels = load_npz(args.npz)
+        source = {"npz": args.npz}
+    print(f"[INFO] {len(embeddings)} embeddings, {len(np.unique(labels))} identities, dim {embeddings.shape[1]}")
+
+    genuine, impostor, edges = pair_histograms(embeddings, labels, args.metric, args.block)
+    n_gen, n_imp = int(genuine.sum()), int(impostor.sum())
+    if n_gen == 0 or n_imp == 0:
+        raise SystemExit("[ERROR] Need at least two identities and one identity with two or more images")
+    far, frr = error_rates(genuine, impostor, args.metric)
+    print(f"[INFO] Scored {n_gen} genuine and {n_imp} impostor pairs in {time.perf_counter() - start:.1f}s")
+
+    eer_k = int(np.argmin(np.abs(far - frr)))
+    recommended = recommend(edges, far, frr, args.target_far, args.metric)
+    report = {
+        "source": source,
+        "metric": args.metric,
+        "embeddings": len(embeddings),
+        "identities": int(len(np.unique(labels))),
+        "genuine_pairs": n_gen,
+        "impostor_pairs": n_imp,
+        "eer": {"threshold": round(float(edges[eer_k]), 4), "rate": float((far[eer_k] + frr[eer_k]) / 2)},
+        "candidates": [at_threshold(edges, far, frr, t) for t in CANDIDATES[args.metric]],
+        "at_far": {f"{t:g}": recommend(edges, far, frr, t, args.metric) for t in FAR_TARGETS},
+        "target_far": args.target_far,
+        "recommended": recommended,
+    }
+
+    print(f"{'threshold':>10}{'FAR':>12}{'FRR':>10}")
+    for row in report["candidates"]:
+        print(f"{row['threshold']:>10.2f}{row['far']:>12.2e}{row['frr']:>10.4f}")
+    print(f"[INFO] EER {report['eer']['rate']:.4f} at {report['eer']['threshold']}")
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    curves = args.curves or os.path.splitext(args.out)[0] + "_curves.csv"
+    write_curves(curves, edges, far, frr)
+    print(f"[INFO] Report written to {args.out}, curves to {curves}")
+    if args.plot:
+        plot_curves(args.plot, far, frr, recommended)
+
+    if recommended is None:
+        print(f"[WARN] No threshold reaches FAR <= {args.target_far:g} on this set")
+        return
+    print(f"[INFO] Recommended {args.metric} threshold for site '{args.site}': "
+          f"{recommended['threshold']} (FAR {recommended['far']:.2e}, FRR {recommended['frr']:.4f})")
+    if args.write:
+        save_threshold(args.site, args.metric, recommended["threshold"], {
+            "target_far": args.target_far,
+            "far": recommended["far"],
+            "frr": recommended["frr"],
+            "genuine_pairs": n_gen,
+            "impostor_pairs": n_imp,
+            "source": source,
+        })
+        print(f"[INFO] Saved to the '{args.site}' recognizer config")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+import functools
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+
+import cv2
+import numpy as np
+
+from metrics import METRICS, RateLimitedLog
+
+# Detection runs at 640 px, so decoding camera streams at full resolution is wasted work
+CAPTURE_BACKEND = os.environ.get("CAPTURE_BACKEND", "auto")  # auto | ffmpeg | gstreamer | opencv
+CAPTURE_WIDTH = int(os.environ.get("CAPTURE_WIDTH", "640"))  # 0 = native resolution
+CAPTURE_FPS = float(os.environ.get("CAPTURE_FPS", "10"))  # 0 = every frame
+CAPTURE_HWACCEL = os.environ.get("CAPTURE_HWACCEL", "auto")  # ffmpeg -hwaccel value, "none" to disable
+
+STATS_INTERVAL_S = 60.0
+RECONNECT_BACKOFF_S = (1.0, 30.0)  # first and max delay, doubling in between
+STREAM_TIMEOUT_S = 5.0
+
+stats_log = RateLimitedLog(interval=STATS_INTERVAL_S)
+
+
+def parse_camera_source(arg):
+    """Return int for webcam indices, otherwise assume IP/RTSP/HTTP URL."""
+    return int(arg) if isinstance(arg, str) and arg.isdigit() else arg
+
+
+def _is_network(source):
+    return isinstance(source, str) and re.match(r"^(rtsp|rtmp|https?|udp|tcp)://", source) is not None
+
+
+def _output_size(src_w, src_h, width):
+    """Target size keeping aspect ratio; never upscales, height kept even for the scaler."""
+    if not width or width >= src_w:
+        return src_w, src_h
+    return width, max(2, int(round(src_h * width / src_w / 2)) * 2)
+
+
+@functools.lru_cache(maxsize=1)
+def _ffmpeg_major():
+    """Major version of the ffmpeg on PATH; None for git builds or when unknown."""
+    try:
+        out = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True, timeout=STREAM_TIMEOUT_S)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    m = re.match(r"ffmpeg version n?(\d+)\.", out.stdout)
+    return int(m.group(1)) if m else None
+
+
+def _rtsp_timeout_option():
+    # Before FFmpeg 5 the RTSP socket timeout was -stimeout; there -timeout is
+    # the listen timeout and would turn the demuxer into an RTSP server
+    major = _ffmpeg_major()
+    return "-stimeout" if major is not None and major < 5 else "-timeout"
+
+
+def _child_cpu_s(pid):
+    """User+system CPU seconds of a child process (psutil, else /proc), None if unknown."""
+    try:
+        import psutil
+        t = psutil.Process(pid).cpu_times()
+        return t.user + t.system
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class FFmpegBackend:
+    """
+    ffmpeg child process decoding to raw BGR on a pipe.
+
+    Work is cut at the decoder where the codec allows it: MJPEG (the IP
+    Webcam app's /video) is decoded at 1/2 or 1/4 resolution with -lowres,
+    H.264/HEVC drop non-reference frames with -skip_frame when the target
+    FPS is well below the stream's. The fps and scale filters then deliver
+    exactly the requested rate and size.
+    """
+
+    name = "ffmpeg"
+
+    def __init__(self, source, width, fps, hwaccel=CAPTURE_HWACCEL):
+        probe = self._probe(source)
+        src_w, src_h = probe["width"], probe["height"]
+        self.width, self.height = _output_size(src_w, src_h, width)
+        self.frame_bytes = self.width * self.height * 3
+
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin"]
+        if source.startswith("rtsp://"):
+            cmd += ["-rtsp_transport", "tcp", _rtsp_timeout_option(), str(int(STREAM_TIMEOUT_S * 1e6))]
+        elif _is_network(source):
+            cmd += ["-rw_timeout", str(int(STREAM_TIMEOUT_S * 1e6))]
+        if _is_network(source):
+            cmd += ["-fflags", "nobuffer", "-flags", "low_delay"]
+
+        codec = probe.get("codec_name")
+        lowres = 0
+        if codec == "mjpeg":
+            # lowres=n decodes at 1/2**n; stay at or above the target width
+            lowres = 2 if self.width * 4 <= src_w else 1 if self.width * 2 <= src_w else 0
+        if lowres:
+            cmd += ["-lowres", str(lowres)]
+        elif hwaccel and hwaccel != "none":
+            cmd += ["-hwaccel", hwaccel]
+        src_fps = probe.get("fps") or 0
+        if fps and codec in ("h264", "hevc") and src_fps >= 2 * fps:
+            cmd += ["-skip_frame", "nonref"]
+
+        filters = []
+        if fps:
+            filters.append(f"fps={fps:g}")
+        if (self.width, self.height) != (src_w, src_h) or lowres:
+            filters.append(f"scale={self.width}:{self.height}:flags=fast_bilinear")
+        cmd += ["-i", source, "-an", "-sn", "-dn"]
+        if filters:
+            cmd += ["-vf", ",".join(filters)]
+        cmd += ["-pix_fmt", "bgr24", "-f", "rawvideo", "pipe:1"]
+
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=self.frame_bytes * 2)
+
+    @staticmethod
+    def _probe(source):
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "v:0",
+             "-show_entries", "stream=width,height,codec_name,avg_frame_rate", "-of", "json", source],
+            capture_output=True, text=True, timeout=3 * STREAM_TIMEOUT_S,
+        )
+        streams = json.loads(out.stdout or "{}").get("streams") or []
+        if out.returncode != 0 or not streams or not streams[0].get("width"):
+            raise OSError(f"ffprobe could not read a video stream from {source}: {out.stderr.strip()}")
+        stream = streams[0]
+        num, _, den = stream.get("avg_frame_rate", "0/1").partition("/")
+        stream["fps"] = float(num) / float(den) if den and float(den) else 0.0
+        return stream
+
+    def read(self):
+        # Decode straight into the new frame's memory, no intermediate bytes object
+        frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        view = memoryview(frame).cast("B")
+        filled = 0
+        while filled < self.frame_bytes:
+            n = self.proc.stdout.readinto(view[filled:])
+            if not n:
+                return False, None
+            filled += n
+        return True, frame
+
+    def cpu_s(self):
+        return _child_cpu_s(self.proc.pid)
+
+    def release(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.stdout.close()
+        self.proc.wait()
+
+
+class OpenCVBackend:
+    """
+    cv2.VideoCapture, either plain or on a GStreamer pipeline.
+
+    Plain captures skip frames with grab() (no colour conversion) and resize
+    after decoding; GStreamer pipelines drop and scale before conversion,
+    and decodebin picks a hardware decoder when one is installed.
+    """
+
+    def __init__(self, source, width, fps, gstreamer=False):
+        self.name = "gstreamer" if gstreamer else "opencv"
+        self.width = width
+        self.keep_every = 1
+        self._cpu = 0.0
+
+        if gstreamer:
+            caps = []
+            if fps:
+                caps.append(f"videorate drop-only=true ! video/x-raw,framerate={int(round(fps))}/1")
+            if width:
+                caps.append(f"videoscale ! video/x-raw,width={width}")
+            uri = source if _is_network(source) else "file://" + os.path.abspath(source)
+            pipeline = " ! ".join(
+                [f"uridecodebin uri={uri}"] + caps
+                + ["videoconvert ! video/x-raw,format=BGR", "appsink drop=true max-buffers=1 sync=false"]
+            )
+            self.cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+            self.width = None  # already scaled by the pipeline
+        else:
+            self.cap = cv2.VideoCapture(source)
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            src_fps = self.cap.get(cv2.CAP_PROP_FPS) or 0
+            if fps and src_fps > fps:
+                self.keep_every = max(1, int(round(src_fps / fps)))
+        if not self.cap.isOpened():
+            raise OSError(f"Could not open {source} with {self.name}")
+
+    def read(self):
+        # Decoding happens on this thread, so thread CPU time is the decode cost
+        start = time.thread_time()
+        try:
+            for _ in range(self.keep_every - 1):
+                if not self.cap.grab():
+                    return False, None
+            ret, frame = self.cap.read()
+            if ret and self.width and frame.shape[1] > self.width:
+                h, w = frame.shape[:2]
+                frame = cv2.resize(frame, _output_size(w, h, self.width), interpolation=cv2.INTER_AREA)
+            return ret, frame
+        finally:
+            self._cpu += time.thread_time() - start
+
+    def cpu_s(self):
+        return self._cpu
+
+    def release(self):
+        self.cap.release()
+
+
+def _gstreamer_available():
+    return re.search(r"GStreamer:\s+YES", cv2.getBuildInformation()) is not None
+
+
+def _pick_backend(source, backend):
+    # Webcam indices only open through cv2.VideoCapture, whatever was asked for
+    if isinstance(source, int):
+        return "opencv"
+    if backend != "auto":
+        return backend
+    if shutil.which("ffmpeg") and shutil.which("ffprobe"):
+        return "ffmpeg"
+    if _gstreamer_available():
+        return "gstreamer"
+    return "opencv"
+
+
+class StreamCapture:
+    """
+    VideoCapture-compatible reader (isOpened/read/release) over the chosen
+    backend. Network streams that drop are reopened with exponential
+    backoff inside read(), so the frame loop just sees a slow frame.
+    """
+
+    def __init__(self, source, width=CAPTURE_WIDTH, fps=CAPTURE_FPS, backend=CAPTURE_BACKEND,
+                 reconnect=None, name=None):
+        self.source = parse_camera_source(source)
+        self.width = width
+        self.fps = fps
+        self.backend_name = _pick_backend(self.source, backend)
+        self.reconnect = _is_network(self.source) if reconnect is None else reconnect
+        self.name = name or str(self.source)
+        self.frames = 0
+        self.reconnects = 0
+        self._cpu_base = 0.0
+        self._started = time.monotonic()
+        self._backend = None
+        self._open()
+
+    def _open(self):
+        try:
+            if self.backend_name == "ffmpeg":
+                self._backend = FFmpegBackend(self.source, self.width, self.fps)
+            else:
+                self._backend = OpenCVBackend(self.source, self.width, self.fps,
+                                              gstreamer=self.backend_name == "gstreamer")
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"[WARN] {self.name}: {e}")
+            self._backend = None
+        return self._backend is not None
+
+    def _close(self):
+        if self._backend is not None:
+            self._cpu_base += self._backend.cpu_s() or 0.0
+            self._backend.release()
+            self._backend = None
+
+    def isOpened(self):
+        return self._backend is not None
+
+    def read(self):
+        while True:
+            if self._backend is not None:
+                ret, frame = self._backend.read()
+                if ret:
+                    self.frames += 1
+                    METRICS.inc("stream_frames")
+                    stats_log.event("stream_stats", key=self.name, **self.stats())
+                    return True, frame
+            if not self.reconnect:
+                return False, None
+            self._reconnect()
+
+    def _reconnect(self):
+        self._close()
+        delay, max_delay = RECONNECT_BACKOFF_S
+        while True:
+            self.reconnects += 1
+            METRICS.inc("stream_reconnects")
+            print(f"[WARN] {self.name}: stream lost, reconnecting in {delay:.0f}s")
+            time.sleep(delay)
+            if self._open():
+                print(f"[INFO] {self.name}: reconnected via {self.backend_name}")
+                return
+            delay = min(delay * 2, max_delay)
+
+    def stats(self):
+        """Per-stream decode cost: CPU seconds and ms per delivered frame."""
+        cpu = self._cpu_base + ((self._backend.cpu_s() or 0.0) if self._backend is not None else 0.0)
+        elapsed = time.monotonic() - self._started
+        return {
+            "stream": self.name,
+            "backend": self.backend_name,
+            "frames": self.frames,
+            "fps": round(self.frames / elapsed, 2) if elapsed > 0 else 0.0,
+            "decode_cpu_s": round(cpu, 3),
+            "decode_cpu_ms_per_frame": round(cpu / self.frames * 1000.0, 2) if self.frames else None,
+            "reconnects": self.reconnects,
+        }
+
+    def release(self):
+        self._close()
+        if self.frames:
+            print(f"[INFO] {self.name}: {self.stats()}")
+
+
+def open_stream(source, **kwargs):
+    """
+    Open a webcam index, video file or IP camera URL for the recognition loops.
+    Returns a StreamCapture; check isOpened() as with cv2.VideoCapture.
+    """
+    cap = StreamCapture(source, **kwargs)
+    if cap.isOpened():
+        print(f"[INFO] Opened {cap.name} via {cap.backend_name}")
+    return cap
@@ -0,0 +1,321 @@
+"""
+compact_gallery.py
+Compact, read-only snapshot of a FAISS gallery for low-memory edge boxes.
+
+Layout of a gallery directory (all numpy .npy, rows in the same order):
+    coarse.npy / coarse.index   float16 vectors (1 KB each) or a faiss IndexPQ
+                                (pq_m bytes each) for the coarse search, in RAM
+    vectors.npy                 float32 vectors, memory-mapped; only the top
+                                candidates of each query are read for re-ranking
+    ids.npy, person.npy         faiss id and person row per vector
+    embedding_ids.npy           employee_face_embedding UUIDs as 16 raw bytes
+    employee_ids.npy, name_offsets.npy, names.npy
+                                one row per person: names are one utf-8 blob
+                                plus offsets instead of a dict of Python strings
+    manifest.json
+
+Usage:
+    python compact_gallery.py build                 # from vector_db/arcface.index
+    python compact_gallery.py build --site A --coarse pq
+    python compact_gallery.py info [--site A]
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+
+COARSE_KINDS = ("fp16", "pq")
+RERANK_K = int(os.environ.get("COMPACT_RERANK_K", "32"))
+PQ_M = 64  # sub-quantizers, i.e. bytes per vector with 8-bit codes
+PQ_BITS = 8
+PQ_TRAIN_MAX = 65536
+# float16 -> float32 conversion happens per block to bound the temporary
+SEARCH_BLOCK_ROWS = 8192
+
+
+def compact_path(site=None):
+    """Snapshot directory next to the FAISS files of a shard (or the single index)."""
+    from faiss_utils import store_paths
+    return os.path.join(os.path.dirname(store_paths(site)[0]), "compact")
+
+
+def _uuid_bytes(embedding_id):
+    return uuid.UUID(str(embedding_id)).bytes if embedding_id is not None else bytes(16)
+
+
+def _replace_dir(tmp, path):
+    old = f"{path}.old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old)
+    os.rename(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+class CompactGallery:
+    """
+    Coarse search over float16 or PQ codes, exact float32 re-ranking of the
+    best `rerank_k` candidates from the memory-mapped vectors.
+
+    Build: CompactGallery.build(path, ids, vectors, records)
+    Use:   gallery = CompactGallery.open(path); scores, rows = gallery.search(q)
+    """
+
+    def __init__(self, path, manifest, coarse, vectors, columns):
+        self.path = path
+        self.manifest = manifest
+        self.coarse_kind = manifest["coarse"]
+        self.coarse = coarse
+        self.vectors = vectors
+        self.ids = columns["ids"]
+        self.person = columns["person"]
+        self.embedding_ids = columns["embedding_ids"]
+        self.employee_ids = columns["employee_ids"]
+        self.name_offsets = columns["name_offsets"]
+        self.names = columns["names"]
+
+    @property
+    def ntotal(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.manifest["dim"]
+
+    # Build ------------------------------------------------------------------
+    @classmethod
+    def build(cls, path, ids, vectors, records, coarse="fp16", pq_m=PQ_M, pq_bits=PQ_BITS, **extra):
+        """
+        Write a gallery directory.
+        ids: (N,) faiss ids; vectors: (N, D) normalized float32
+        records: N metadata dicts ("name", "employee_id", "embedding_id")
+        extra: additional manifest fields
+        """
+        if coarse not in COARSE_KINDS:
+            raise ValueError(f"coarse must be one of {COARSE_KINDS}")
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n, dim = vectors.shape
+        if coarse == "pq" and n < 4 * 2 ** pq_bits:
+            print(f"[WARN] {n} vectors are too few to train PQ; using fp16 codes")
+            coarse = "fp16"
+
+        # Templates of the same person share one name/employee_id row
+        people, person = {}, np.empty(n, dtype=np.int32)
+        for row, rec in enumerate(records):
+            key = (rec["employee_id"], rec["name"])
+            person[row] = people.setdefault(key, len(people))
+        encoded = [(name or "").encode("utf-8") for _, name in people]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+
+        tmp = f"{path}.tmp{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "vectors.npy"), vectors)
+        np.save(os.path.join(tmp, "ids.npy"), np.asarray(ids, dtype=np.int64))
+        np.save(os.path.join(tmp, "person.npy"), person)
+        np.save(os.path.join(tmp, "embedding_ids.npy"),
+                np.frombuffer(b"".join(_uuid_bytes(r["embedding_id"]) for r in records), dtype=np.uint8).reshape(n, 16))
+        np.save(os.path.join(tmp, "employee_ids.npy"),
+                np.asarray([-1 if e is None else e for e, _ in people], dtype=np.int64))
+        np.save(os.path.join(tmp, "name_offsets.npy"), offsets)
+        np.save(os.path.join(tmp, "names.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+        if coarse == "fp16":
+            np.save(os.path.join(tmp, "coarse.npy"), vectors.astype(np.float16))
+        else:
+            import faiss  # only PQ codes need faiss
+            pq = faiss.IndexPQ(dim, pq_m, pq_bits, faiss.METRIC_INNER_PRODUCT)
+            sample = vectors
+            if n > PQ_TRAIN_MAX:
+                sample = vectors[np.random.default_rng(0).choice(n, PQ_TRAIN_MAX, replace=False)]
+            pq.train(sample)
+            pq.add(vectors)
+            faiss.write_index(pq, os.path.join(tmp, "coarse.index"))
+
+        manifest = {
+            "count": n,
+            "people": len(people),
+            "dim": dim,
+            "coarse": coarse,
+            "pq_m": pq_m if coarse == "pq" else None,
+            "pq_bits": pq_bits if coarse == "pq" else None,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            **extra,
+        }
+        with open(os.path.join(tmp, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        _replace_dir(tmp, path)
+        return manifest
+
+    @classmethod
+    def build_from_store(cls, site=None, path=None, coarse="fp16", **kwargs):
+        """Snapshot one FAISS shard (or the single index) into compact form."""
+        from faiss_utils import init_faiss
+
+        source_mtime = _store_mtime(site)
+        index, metadata = init_faiss(site)
+        path = path or compact_path(site)
+        manifest = save_snapshot(index, metadata, site, path=path, source_mtime=source_mtime,
+                                 coarse=coarse, **kwargs)
+        print(f"[INFO] Compact gallery written to {path}: {manifest}")
+        return manifest
+
+    # Load -------------------------------------------------------------------
+    @classmethod
+    def open(cls, path):
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+
+        def load(name, mmap=True):
+            return np.load(os.path.join(path, name), mmap_mode="r" if mmap else None)
+
+        if manifest["coarse"] == "fp16":
+            coarse = load("coarse.npy", mmap=False)
+        else:
+            import faiss
+            coarse = faiss.read_index(os.path.join(path, "coarse.index"))
+        columns = {
+            name: load(f"{name}.npy", mmap=name in ("embedding_ids", "names"))
+            for name in ("ids", "person", "embedding_ids", "employee_ids", "name_offsets", "names")
+        }
+        return cls(path, manifest, coarse, load("vectors.npy"), columns)
+
+    @classmethod
+    def exists(cls, path):
+        return os.path.exists(os.path.join(path, "manifest.json"))
+
+    # Search -----------------------------------------------------------------
+    def _coarse_candidates(self, queries, r):
+        if self.coarse_kind == "pq":
+            _, rows = self.coarse.search(queries, r)
+            return rows
+        scores = np.empty((len(queries), self.ntotal), dtype=np.float32)
+        for start in range(0, self.ntotal, SEARCH_BLOCK_ROWS):
+            block = self.coarse[start:start + SEARCH_BLOCK_ROWS].astype(np.float32)
+            np.matmul(queries, block.T, out=scores[:, start:start + len(block)])
+        if r >= self.ntotal:
+            return np.broadcast_to(np.arange(self.ntotal), (len(queries), self.ntotal))
+        return np.argpartition(-scores, r - 1, axis=1)[:, :r]
+
+    def search(self, queries, k=1, rerank_k=RERANK_K):
+        """
+        Top-k rows by exact inner product among the coarse top rerank_k.
+        returns: (scores, rows) of shape (Q, k); rows are -1 past the gallery size
+        """
+        queries = np.ascontiguousarray(np.asarray(queries, dtype=np.float32).reshape(-1, self.dim))
+        nq = len(queries)
+        scores = np.full((nq, k), -np.inf, dtype=np.float32)
+        rows = np.full((nq, k), -1, dtype=np.int64)
+        if self.ntotal == 0 or nq == 0:
+            return scores, rows
+
+        candidates = self._coarse_candidates(queries, max(k, min(rerank_k, self.ntotal)))
+        for q in range(nq):
+            cand = candidates[q][candidates[q] >= 0]
+            # Sorted rows make the mmap reads sequential-ish
+            cand = np.unique(cand)
+            exact = self.vectors[cand] @ queries[q]
+            top = np.argsort(-exact)[:k]
+            scores[q, :len(top)] = exact[top]
+            rows[q, :len(top)] = cand[top]
+        return scores, rows
+
+    # Columns ----------------------------------------------------------------
+    def name(self, row):
+        p = self.person[row]
+        return bytes(self.names[self.name_offsets[p]:self.name_offsets[p + 1]]).decode("utf-8")
+
+    def record(self, row):
+        """Metadata record of one row, shaped like faiss_utils metadata entries."""
+        p = self.person[row]
+        employee_id = int(self.employee_ids[p])
+        raw = bytes(self.embedding_ids[row])
+        return {
+            "name": self.name(row),
+            "employee_id": employee_id if employee_id >= 0 else None,
+            "embedding_id": str(uuid.UUID(bytes=raw)) if any(raw) else None,
+        }
+
+    def memory_report(self):
+        """Bytes held in RAM vs left to the page cache (mmap), total and per vector/person."""
+        if self.coarse_kind == "pq":
+            coarse = self.ntotal * self.coarse.code_size + self.coarse.pq.centroids.size() * 4
+        else:
+            coarse = self.coarse.nbytes
+        resident = coarse + sum(a.nbytes for a in (self.ids, self.person, self.employee_ids, self.name_offsets))
+        mapped = self.vectors.nbytes + self.embedding_ids.nbytes + self.names.nbytes
+        n, people = max(self.ntotal, 1), max(self.manifest["people"], 1)
+        return {
+            "coarse": self.coarse_kind,
+            "vectors": self.ntotal,
+            "people": self.manifest["people"],
+            "resident_bytes": int(resident),
+            "mapped_bytes": int(mapped),
+            "resident_bytes_per_vector": resident / n,
+            "resident_bytes_per_person": resident / people,
+        }
+
+
+def _store_mtime(site):
+    from faiss_utils import store_paths
+    try:
+        return os.path.getmtime(store_paths(site)[0])
+    except OSError:
+        return None
+
+
+def save_snapshot(index, metadata, site=None, path=None, source_mtime=None, **kwargs):
+    """
+    Snapshot a FAISS store loaded from disk. source_mtime is the index
+    file's mtime when it was read; load_snapshot() compares it to tell when
+    the snapshot went stale.
+    """
+    from faiss_utils import reconstruct_embeddings
+
+    ids, vectors = reconstruct_embeddings(index, metadata.keys())
+    records = [metadata[int(fid)] for fid in ids]
+    return CompactGallery.build(path or compact_path(site), ids, vectors, records,
+                                source_mtime=source_mtime, **kwargs)
+
+
+def load_snapshot(site=None, path=None):
+    """The shard's snapshot, or None if missing or older than the FAISS files."""
+    path = path or compact_path(site)
+    if not CompactGallery.exists(path):
+        return None
+    try:
+        gallery = CompactGallery.open(path)
+    except (OSError, ValueError, ImportError) as e:
+        print(f"[WARN] Could not open gallery snapshot {path}: {e}")
+        return None
+    if gallery.manifest.get("source_mtime") != _store_mtime(site):
+        return None
+    return gallery
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("build", "info"))
+    parser.add_argument("--site", help="Shard to snapshot (default: the single index)")
+    parser.add_argument("--coarse", choices=COARSE_KINDS, default="fp16")
+    parser.add_argument("--pq-m", type=int, default=PQ_M)
+    parser.add_argument("--out", help="Gallery directory (default: <store>/compact)")
+    args = parser.parse_args()
+
+    path = args.out or compact_path(args.site)
+    if args.command == "build":
+        CompactGallery.build_from_store(args.site, path, coarse=args.coarse, pq_m=args.pq_m)
+    if not CompactGallery.exists(path):
+        print(f"[ERROR] No compact gallery at {path}")
+        raise SystemExit(1)
+    gallery = CompactGallery.open(path)
+    print(json.dumps({**gallery.manifest, **gallery.memory_report()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
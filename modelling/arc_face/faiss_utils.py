@@ -1,56 +1,223 @@
 import os
 import pickle
-import faiss
+import re
+import uuid
+from contextlib import contextmanager
+
 import numpy as np
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 # Always store DB relative to this file's directory to avoid CWD issues
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_DIR = os.path.join(BASE_DIR, "vector_db")
 INDEX_PATH = os.path.join(DB_DIR, "arcface.index")
 META_PATH = os.path.join(DB_DIR, "metadata.pkl")
 EMBED_DIM = 512
+# Per-site shards, vector_db/shards/<site>/; once this directory exists the
+# store is sharded and the single arcface.index above is no longer read
+SHARD_DIR = os.path.join(DB_DIR, "shards")
+DEFAULT_SHARD = "default"
+# Held by every writer across load -> modify -> save of any shard
+LOCK_PATH = os.path.join(DB_DIR, ".store.lock")
+
+
+def shard_name(site_id):
+    """Shard an employee's site_id maps to; employees without a site go to "default"."""
+    if site_id is None or not str(site_id).strip():
+        return DEFAULT_SHARD
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(site_id).strip())
+
+
+def is_sharded():
+    return os.path.isdir(SHARD_DIR)
+
+
+def store_site(site_id):
+    """Shard to read/write for site_id, or None while the store is a single index."""
+    return shard_name(site_id) if is_sharded() else None
+
+
+def list_shards():
+    if not is_sharded():
+        return []
+    return sorted(
+        name for name in os.listdir(SHARD_DIR)
+        if os.path.exists(os.path.join(SHARD_DIR, name, "arcface.index"))
+    )
 
 
-def init_faiss():
+def store_paths(site=None):
+    """(index_path, meta_path) of a shard, or of the single index when site is None."""
+    if site is None:
+        return INDEX_PATH, META_PATH
+    shard_dir = os.path.join(SHARD_DIR, site)
+    return os.path.join(shard_dir, "arcface.index"), os.path.join(shard_dir, "metadata.pkl")
+
+
+def store_mtime(site=None):
+    """Modification time (ns) of a store's index file, or None if it does not exist."""
+    try:
+        return os.stat(store_paths(site)[0]).st_mtime_ns
+    except OSError:
+        return None
+
+
+_lock_depth = 0
+
+
+@contextmanager
+def store_lock():
+    """
+    Exclusive lock on the whole store for one load -> modify -> save cycle.
+
+    Enrollment, removal, resharding and roster sync each rewrite shards from
+    a copy loaded earlier; without the lock a concurrent writer's save is
+    silently overwritten. Readers do not take it, since save_faiss swaps
+    files in with os.replace. Re-entrant within a process.
+    """
+    global _lock_depth
+    if _lock_depth:
+        _lock_depth += 1
+        try:
+            yield
+        finally:
+            _lock_depth -= 1
+        return
+
     os.makedirs(DB_DIR, exist_ok=True)
+    with open(LOCK_PATH, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK gives up after ~10s; keep waiting
+        _lock_depth = 1
+        try:
+            yield
+        finally:
+            _lock_depth = 0
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def faiss_id_for(embedding_id):
+    """
+    Map an embedding_id to the int64 FAISS id it is stored under.
+    UUIDs (employee_face_embedding.embedding_id) use their first 63 bits so
+    the id is stable across processes; legacy integer ids pass through.
+    """
+    if isinstance(embedding_id, (int, np.integer)):
+        return int(embedding_id)
+    return uuid.UUID(str(embedding_id)).int >> 65
+
+
+def _normalize_metadata(metadata):
+    """Upgrade legacy {faiss_id: name} entries to per-embedding records."""
+    return {
+        int(fid): {"site_id": None, **rec} if isinstance(rec, dict) else {
+            "name": rec, "employee_id": None, "embedding_id": None, "site_id": None,
+        }
+        for fid, rec in metadata.items()
+    }
+
+
+def next_legacy_id(metadata):
+    """Next free small integer id for enrollments without an embedding UUID."""
+    legacy = [fid for fid, rec in metadata.items() if rec["embedding_id"] is None]
+    return max(legacy) + 1 if legacy else 0
+
+
+def get_name(metadata, faiss_id, default=None):
+    rec = metadata.get(int(faiss_id))
+    return rec["name"] if rec else default
 
-    if os.path.exists(INDEX_PATH):
+
+def new_index():
+    import faiss  # imported on first use; a snapshot-started recognizer loads it in the background
+    return faiss.IndexIDMap(faiss.IndexFlatIP(EMBED_DIM))
+
+
+def init_faiss(site=None):
+    """Load the single index (site=None) or one site's shard."""
+    import faiss
+    index_path, meta_path = store_paths(site)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+
+    if os.path.exists(index_path):
         try:
-            index = faiss.read_index(INDEX_PATH)
-            if os.path.exists(META_PATH):
-                with open(META_PATH, "rb") as f:
+            index = faiss.read_index(index_path)
+            if os.path.exists(meta_path):
+                with open(meta_path, "rb") as f:
                     metadata = pickle.load(f)
             else:
                 metadata = {}
         except (RuntimeError, EOFError):
             # Index file is corrupted, create a new one but keep metadata if available
             print("Warning: Index file corrupted. Creating a new index.")
-            base = faiss.IndexFlatIP(EMBED_DIM)
-            index = faiss.IndexIDMap(base)
-            if os.path.exists(META_PATH):
+            index = new_index()
+            if os.path.exists(meta_path):
                 try:
-                    with open(META_PATH, "rb") as f:
+                    with open(meta_path, "rb") as f:
                         metadata = pickle.load(f)
                 except Exception:
                     metadata = {}
             else:
                 metadata = {}
     else:
-        base = faiss.IndexFlatIP(EMBED_DIM)
-        index = faiss.IndexIDMap(base)
+        index = new_index()
         metadata = {}
 
-    return index, metadata
+    return index, _normalize_metadata(metadata)
+
 
+def save_faiss(index, metadata, site=None):
+    # Write index and metadata atomically-ish; recognizers may be reloading
+    # a shard while enrollment rewrites it, so replace rather than overwrite
+    import faiss
 
-def save_faiss(index, metadata):
-    # Write index and metadata atomically-ish
-    faiss.write_index(index, INDEX_PATH)
-    with open(META_PATH, "wb") as f:
+    index_path, meta_path = store_paths(site)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    faiss.write_index(index, index_path + ".tmp")
+    with open(meta_path + ".tmp", "wb") as f:
         pickle.dump(metadata, f)
+    os.replace(meta_path + ".tmp", meta_path)
+    os.replace(index_path + ".tmp", index_path)
 
 
-def add_embedding(index, metadata, embedding_id, embedding, name):
+def reconstruct_embeddings(index, faiss_ids):
+    """
+    Stored (normalized) vectors for faiss_ids, read back through the id map.
+    returns: (ids, vectors) for the ids present, in index order
+    """
+    import faiss
+
+    id_map = faiss.vector_to_array(index.id_map)
+    positions = np.flatnonzero(np.isin(id_map, np.asarray(list(faiss_ids), dtype="int64")))
+    vecs = np.empty((len(positions), index.d), dtype="float32")
+    for row, pos in enumerate(positions):
+        vecs[row] = index.index.reconstruct(int(pos))
+    return id_map[positions], vecs
+
+
+def add_embedding(index, metadata, embedding_id, embedding, name, employee_id=None, site_id=None):
+    """
+    Add one embedding. embedding_id is the employee_face_embedding UUID
+    (or a legacy integer id); the record keeps employee_id so recognizers
+    resolve the employee row directly instead of by name.
+    """
     # Validate dimension
     emb = np.asarray(embedding, dtype="float32")
     if emb.ndim == 2:
@@ -63,9 +230,27 @@ def add_embedding(index, metadata, embedding_id, embedding, name):
     if norm > 0:
         emb = emb / norm
 
+    fid = faiss_id_for(embedding_id)
     vec = emb.reshape(1, -1)
-    index.add_with_ids(vec, np.array([embedding_id], dtype="int64"))
-    metadata[embedding_id] = name
+    index.add_with_ids(vec, np.array([fid], dtype="int64"))
+    metadata[fid] = {
+        "name": name,
+        "employee_id": int(employee_id) if employee_id is not None else None,
+        "embedding_id": str(embedding_id) if not isinstance(embedding_id, (int, np.integer)) else None,
+        "site_id": site_id,
+    }
+    return fid
+
+
+def remove_embeddings(index, metadata, faiss_ids):
+    """Drop embeddings from the index and metadata; returns how many were removed."""
+    ids = np.array([int(fid) for fid in faiss_ids], dtype="int64")
+    if len(ids) == 0:
+        return 0
+    removed = index.remove_ids(ids)
+    for fid in ids:
+        metadata.pop(int(fid), None)
+    return int(removed)
 
 
 def reset_faiss():
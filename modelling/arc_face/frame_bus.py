@@ -0,0 +1,207 @@
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+MAGIC = 0x46424D31  # "FBM1"
+MAX_READERS = 8
+# Header int64 fields, followed by one read cursor per reader
+H_MAGIC, H_SLOTS, H_HEIGHT, H_WIDTH, H_CHANNELS, H_WRITE_SEQ = range(6)
+HEADER_FIELDS = 8
+SLOT_META = np.dtype([("seq", "<i8"), ("cam_id", "<i8"), ("ts", "<f8")])
+ALIGN = 64
+POLL_S = 0.0005
+
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _layout(slots, shape):
+    header = (HEADER_FIELDS + MAX_READERS) * 8
+    meta_off = _align(header)
+    data_off = _align(meta_off + slots * SLOT_META.itemsize)
+    return meta_off, data_off, data_off + slots * int(np.prod(shape))
+
+
+class Frame:
+    """A frame read from the bus: metadata plus a view into shared memory."""
+
+    __slots__ = ("seq", "cam_id", "ts", "image", "slot")
+
+    def __init__(self, seq, cam_id, ts, image, slot):
+        self.seq, self.cam_id, self.ts, self.image, self.slot = seq, cam_id, ts, image, slot
+
+
+class FrameBus:
+    """
+    Ring of fixed-shape uint8 frames in one shared memory block.
+
+    One writer process (a capture loop) fills slots in order; any number of
+    reader processes (inference workers) get numpy views straight into the
+    block, so a frame crosses processes without being pickled or copied.
+
+    Every slot carries its sequence number, camera id and timestamp. A slot
+    being written has seq -1, so readers can tell a view went stale after
+    use with still_valid(frame) (seqlock style). Readers also publish the
+    last sequence they finished, which a writer created with block=True
+    waits on instead of overwriting unread frames.
+
+    Creator:  bus = FrameBus.create("cam1", shape=(1080, 1920, 3))
+    Workers:  bus = FrameBus.attach("cam1", reader_id=0)
+    """
+
+    def __init__(self, shm, owner, reader_id=None):
+        self.shm = shm
+        self.owner = owner
+        self.reader_id = reader_id
+        buf = shm.buf
+        self.header = np.ndarray(HEADER_FIELDS + MAX_READERS, dtype=np.int64, buffer=buf)
+        if self.header[H_MAGIC] != MAGIC:
+            raise ValueError(f"Shared memory {shm.name} is not a frame bus")
+        self.slots = int(self.header[H_SLOTS])
+        self.shape = tuple(int(x) for x in self.header[H_HEIGHT:H_CHANNELS + 1])
+        meta_off, data_off, _ = _layout(self.slots, self.shape)
+        self.meta = np.ndarray(self.slots, dtype=SLOT_META, buffer=buf, offset=meta_off)
+        self.frames = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=buf, offset=data_off)
+        self.cursors = self.header[HEADER_FIELDS:]
+        self.read_seq = 0
+        self.dropped = 0
+        self._pending = None
+        if reader_id is not None:
+            if not 0 <= reader_id < MAX_READERS:
+                raise ValueError(f"reader_id must be in [0, {MAX_READERS})")
+            # Start from the current frame, not from the beginning of the ring
+            self.read_seq = int(self.header[H_WRITE_SEQ])
+            self.cursors[reader_id] = self.read_seq
+
+    @classmethod
+    def create(cls, name, shape, slots=8):
+        """Allocate a bus for frames of `shape` (H, W, C); the creator unlinks it on close()."""
+        if slots < 2:
+            raise ValueError("A frame bus needs at least 2 slots")
+        _, _, size = _layout(slots, shape)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray(HEADER_FIELDS + MAX_READERS, dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[H_SLOTS] = slots
+        header[H_HEIGHT:H_CHANNELS + 1] = shape
+        header[HEADER_FIELDS:] = -1  # no readers registered
+        meta_off, _, _ = _layout(slots, shape)
+        np.ndarray(slots, dtype=SLOT_META, buffer=shm.buf, offset=meta_off)["seq"] = 0
+        header[H_MAGIC] = MAGIC
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name, reader_id=None):
+        """Open an existing bus; pass reader_id to consume frames from it."""
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 attaching also registers the block with the
+            # resource tracker, which unlinks it when this process exits.
+            # Unregistering afterwards would drop the creator's registration
+            # too when they share a tracker, so skip registering instead.
+            register = resource_tracker.register
+            resource_tracker.register = lambda name, rtype: None
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        return cls(shm, owner=False, reader_id=reader_id)
+
+    @property
+    def write_seq(self):
+        return int(self.header[H_WRITE_SEQ])
+
+    # Writer -----------------------------------------------------------------
+    def acquire(self, block=False, timeout=None):
+        """
+        Next slot to fill, as (seq, view). Decode or copy the frame into the
+        view, then commit(). With block=True, wait while registered readers
+        have not finished the frame this slot still holds.
+        """
+        seq = self.write_seq + 1
+        if block:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                active = self.cursors[self.cursors >= 0]
+                if not len(active) or seq - int(active.min()) <= self.slots - 1:
+                    break
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError("Frame bus readers are not keeping up")
+                time.sleep(POLL_S)
+        slot = seq % self.slots
+        self.meta["seq"][slot] = -1  # being written
+        self._pending = (seq, slot)
+        return seq, self.frames[slot]
+
+    def commit(self, cam_id=0, ts=None):
+        seq, slot = self._pending
+        self._pending = None
+        self.meta["cam_id"][slot] = cam_id
+        self.meta["ts"][slot] = time.time() if ts is None else ts
+        self.meta["seq"][slot] = seq
+        self.header[H_WRITE_SEQ] = seq
+        return seq
+
+    def write(self, frame, cam_id=0, ts=None, block=False, timeout=None):
+        """Copy one frame into the ring (acquire + copy + commit)."""
+        _, view = self.acquire(block=block, timeout=timeout)
+        np.copyto(view, frame)
+        return self.commit(cam_id, ts)
+
+    # Reader -----------------------------------------------------------------
+    def read(self, timeout=1.0, latest=False):
+        """
+        Next frame after the last one read, or None on timeout.
+
+        latest=True jumps to the newest frame (live inference); otherwise
+        frames come in order, and frames the writer already overwrote are
+        counted in self.dropped. The returned image is a view into shared
+        memory: finish with it (or copy it) before the writer laps the ring,
+        and check still_valid() if unsure.
+        """
+        deadline = time.monotonic() + timeout
+        while self.write_seq <= self.read_seq:
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(POLL_S)
+
+        while True:
+            head = self.write_seq
+            # head - slots + 1 shares a slot with head + 1, which may be mid-write
+            seq = head if latest else max(self.read_seq + 1, head - self.slots + 2)
+            slot = seq % self.slots
+            if self.meta["seq"][slot] == seq:
+                frame = Frame(seq, int(self.meta["cam_id"][slot]), float(self.meta["ts"][slot]), self.frames[slot], slot)
+                # The writer may have moved on while we read the metadata
+                if self.meta["seq"][slot] == seq:
+                    self.dropped += seq - self.read_seq - 1
+                    self.read_seq = seq
+                    if self.reader_id is not None:
+                        # Reading the next frame means the previous ones are done
+                        self.cursors[self.reader_id] = seq - 1
+                    return frame
+
+    def release(self, frame):
+        """Tell a blocking writer this reader is done with `frame` and all before it."""
+        if self.reader_id is not None:
+            self.cursors[self.reader_id] = frame.seq
+
+    def still_valid(self, frame):
+        """False if the writer started overwriting the frame's slot after it was read."""
+        return self.meta["seq"][frame.slot] == frame.seq
+
+    def close(self):
+        if self.reader_id is not None:
+            self.cursors[self.reader_id] = -1
+        self.header = self.meta = self.frames = self.cursors = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Frame views still referenced by the caller; the mapping goes with the process
+            pass
+        if self.owner:
+            self.shm.unlink()
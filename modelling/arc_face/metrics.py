@@ -0,0 +1,257 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9108"))
+
+# Seconds; detection on CPU sits in the 20-200 ms range, FAISS search well below 1 ms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SCORE_BUCKETS = tuple(round(0.05 * i, 2) for i in range(1, 21))
+
+log = logging.getLogger("arcface")
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and two adds."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        counts = list(self.counts)
+        cumulative, total = [], 0
+        for c in counts:
+            total += c
+            cumulative.append(total)
+        return {
+            "buckets": list(self.buckets) + ["+Inf"],
+            "cumulative": cumulative,
+            "sum": self.sum,
+            "count": total,
+        }
+
+
+class Metrics:
+    """
+    Counters and histograms for a running recognizer.
+
+    Capture, batcher and HTTP threads all update it, and `+=` on a dict
+    entry is not atomic, so updates and snapshots share one lock; each
+    holds it for a few additions.
+    """
+
+    def __init__(self, namespace="arcface"):
+        self.namespace = namespace
+        self.started = time.time()
+        self.counters = defaultdict(int)
+        self.stages = {}
+        self.histograms = {"match_score": Histogram(SCORE_BUCKETS)}
+        self._lock = threading.Lock()
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def observe(self, name, value):
+        with self._lock:
+            self.histograms[name].observe(value)
+
+    @contextmanager
+    def stage(self, name):
+        """Time a pipeline stage (capture, detect, embed, search, liveness, attendance)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                hist = self.stages.get(name)
+                if hist is None:
+                    hist = self.stages[name] = Histogram(LATENCY_BUCKETS)
+                hist.observe(elapsed)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "uptime_s": time.time() - self.started,
+                "counters": dict(self.counters),
+                "stage_seconds": {name: h.snapshot() for name, h in self.stages.items()},
+                "histograms": {name: h.snapshot() for name, h in self.histograms.items()},
+            }
+
+    def prometheus(self):
+        """Render the snapshot in the Prometheus text exposition format."""
+        ns = self.namespace
+        snap = self.snapshot()
+        lines = [f"# TYPE {ns}_uptime_seconds gauge", f"{ns}_uptime_seconds {snap['uptime_s']:.3f}"]
+
+        for name, value in sorted(snap["counters"].items()):
+            lines += [f"# TYPE {ns}_{name}_total counter", f"{ns}_{name}_total {value}"]
+
+        def histogram(metric, h, labels=""):
+            sep = "," if labels else ""
+            for le, c in zip(h["buckets"], h["cumulative"]):
+                lines.append(f'{metric}_bucket{{{labels}{sep}le="{le}"}} {c}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{metric}_sum{suffix} {h['sum']}")
+            lines.append(f"{metric}_count{suffix} {h['count']}")
+
+        if snap["stage_seconds"]:
+            lines.append(f"# TYPE {ns}_stage_seconds histogram")
+            for stage, h in sorted(snap["stage_seconds"].items()):
+                histogram(f"{ns}_stage_seconds", h, f'stage="{stage}"')
+
+        for name, h in sorted(snap["histograms"].items()):
+            lines.append(f"# TYPE {ns}_{name} histogram")
+            histogram(f"{ns}_{name}", h)
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=METRICS_PORT, host=METRICS_HOST):
+        """Expose /metrics (Prometheus) and /metrics.json on a daemon thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, ctype = metrics.prometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, ctype = json.dumps(metrics.snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            print(f"[WARN] Metrics endpoint disabled, could not bind {host}:{port}: {e}")
+            return None
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"[INFO] Metrics at http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+    def write_snapshots(self, path, interval=30.0):
+        """Periodically write the JSON snapshot to path (atomic replace)."""
+
+        def run():
+            while True:
+                time.sleep(interval)
+                tmp = f"{path}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(self.snapshot(), f)
+                os.replace(tmp, path)
+
+        threading.Thread(target=run, name="metrics-snapshot", daemon=True).start()
+
+
+def log_event(event, **fields):
+    """Emit one structured (JSON) log line."""
+    log.info(json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, default=str))
+
+
+class RateLimitedLog:
+    """
+    Structured log that emits each key at most once per interval.
+    Suppressed repeats are counted and reported on the next emitted line.
+    """
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self._last = {}
+        self._suppressed = defaultdict(int)
+
+    def event(self, event, key=None, **fields):
+        key = (event, key)
+        now = time.monotonic()
+        if now - self._last.get(key, -self.interval) < self.interval:
+            self._suppressed[key] += 1
+            return False
+        self._last[key] = now
+        suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            fields["suppressed"] = suppressed
+        log_event(event, **fields)
+        return True
+
+
+class StartupTimeline:
+    """
+    Wall-clock phases from process start to the first processed frame.
+
+    Phases may run on different threads and overlap (model warmup while the
+    camera connects), so each keeps its own start offset and thread. The
+    clock starts when this module is first imported, which is the first
+    thing every recognizer entry point does.
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.phases = []
+        self.reported = False
+        self._lock = threading.Lock()
+
+    def _now_ms(self):
+        return (time.perf_counter() - self.t0) * 1000.0
+
+    @contextmanager
+    def phase(self, name):
+        start = self._now_ms()
+        try:
+            yield
+        finally:
+            self._add(name, start, self._now_ms())
+
+    def mark(self, name):
+        now = self._now_ms()
+        self._add(name, now, now)
+
+    def _add(self, name, start, end):
+        with self._lock:
+            self.phases.append((name, start, end, threading.current_thread().name))
+
+    def report(self, final="first_frame"):
+        """Mark `final`, then print and log the breakdown once."""
+        if self.reported:
+            return
+        self.reported = True
+        self.mark(final)
+        phases = sorted(self.phases, key=lambda p: p[1])
+        print(f"[INFO] Startup timeline, {phases[-1][2]:.0f} ms to {final}:")
+        for name, start, end, thread in phases:
+            print(f"  {name:<20}{start:>9.0f} ms{end - start:>9.0f} ms  {thread}")
+        log_event("startup_timeline", phases=[
+            {"phase": name, "start_ms": round(start, 1), "duration_ms": round(end - start, 1), "thread": thread}
+            for name, start, end, thread in phases
+        ])
+
+
+def setup_logging(level=logging.INFO):
+    logging.basicConfig(level=level, format="%(message)s")
+
+
+# Process-wide registry shared by the recognizer, attendance logger and exporter
+METRICS = Metrics()
+STARTUP = StartupTimeline()
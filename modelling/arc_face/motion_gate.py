@@ -0,0 +1,98 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+from metrics import METRICS
+
+# MOTION_GATE=0 runs detection on every frame, as before
+MOTION_GATE = os.environ.get("MOTION_GATE", "1") != "0"
+# Seconds between forced detections while idle; 0 disables the keepalive
+MOTION_KEEPALIVE_S = float(os.environ.get("MOTION_KEEPALIVE_S", "10"))
+
+
+class MotionGate:
+    """
+    Cheap activity check in front of face detection.
+
+    Each frame is shrunk to `width` px grayscale and compared against a
+    running-average background (cv2.accumulateWeighted). Detection runs
+    while the changed fraction exceeds `min_area`, for `hold_s` after the
+    last motion (someone standing still at the gate), and once every
+    `keepalive_s` while idle. A change over `scene_change` of the frame
+    (lights switched, camera bumped) resets the background.
+
+    Costs about 0.4 ms per 640x480 frame. On a 10-minute scripted gate clip
+    (someone in view 22% of the time, with sensor noise, lighting drift and
+    a lights-off dip) bench_pipeline.py --motion-gate measured 70% of frames
+    skipped and CPU down from 17.3 to 9.1 ms/frame, with the same faces
+    detected as without the gate; the detector there was a Haar-cascade
+    stand-in, so the saving with SCRFD, a heavier detector, should be larger.
+    """
+
+    def __init__(self, width=160, pixel_threshold=18, min_area=0.003, hold_s=2.0,
+                 keepalive_s=MOTION_KEEPALIVE_S, alpha=0.05, scene_change=0.6,
+                 enabled=MOTION_GATE, metrics=METRICS):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.hold_s = hold_s
+        self.keepalive_s = keepalive_s
+        self.alpha = alpha
+        self.scene_change = scene_change
+        self.enabled = enabled
+        self.metrics = metrics
+        self.counts = {"gate_active": 0, "gate_skipped": 0, "gate_keepalive": 0, "gate_scene_change": 0}
+        self.activity = 0.0
+        self._background = None
+        self._small = None
+        self._last_motion = -float("inf")
+        self._last_run = -float("inf")
+
+    def _count(self, name):
+        self.counts[name] += 1
+        if self.metrics is not None:
+            self.metrics.inc(name)
+
+    def _prepare(self, frame):
+        h, w = frame.shape[:2]
+        size = (self.width, max(1, round(h * self.width / w)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def check(self, frame, now=None):
+        """True if the frame should go through detection."""
+        if not self.enabled:
+            return True
+        now = time.monotonic() if now is None else now
+        gray = self._prepare(frame)
+
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray.astype(np.float32)
+            self._small = np.empty_like(gray)
+            self._last_motion = now
+        else:
+            cv2.convertScaleAbs(self._background, dst=self._small)
+            diff = cv2.absdiff(gray, self._small)
+            changed = cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1])
+            self.activity = changed / diff.size
+            if self.activity >= self.scene_change:
+                self._background[:] = gray
+                self._count("gate_scene_change")
+            else:
+                cv2.accumulateWeighted(gray, self._background, self.alpha)
+            if self.activity >= self.min_area:
+                self._last_motion = now
+
+        if now - self._last_motion <= self.hold_s:
+            self._count("gate_active")
+        elif self.keepalive_s and now - self._last_run >= self.keepalive_s:
+            self._count("gate_keepalive")
+        else:
+            self._count("gate_skipped")
+            return False
+        self._last_run = now
+        return True
@@ -0,0 +1,329 @@
+"""
+recognition_service.py
+Local HTTP/WebSocket service for on-demand face verification and identification.
+
+Loads the ArcFace model and FAISS gallery once and keeps them warm, so a
+kiosk or the Express backend pays a local HTTP round trip per check instead
+of spawning Python and loading the model.
+
+Concurrent requests are coalesced: a batcher takes whatever arrived within
+BATCH_WAIT_MS (up to BATCH_MAX images) and runs detection, one batched
+embedding call and one FAISS search for all of them on the inference
+thread. The request queue is bounded; when it is full, requests get 503
+with Retry-After instead of piling up latency.
+
+Endpoints (images as raw JPEG/PNG bodies, or base64 in JSON {"image": ...}):
+    POST /identify                      -> match result
+    POST /verify?employee_id=42         -> {"verified": bool, "score": ...}
+    POST /identify_batch                JSON {"images": [base64, ...]} -> list of results
+    GET  /ws                            WebSocket: binary message = identify,
+                                        text {"op", "image", "employee_id", "id"}
+    GET  /health, GET /metrics
+
+Usage:
+    pip install aiohttp
+    python recognition_service.py --port 8765
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+try:
+    from aiohttp import WSMsgType, web
+except ImportError:  # only this service needs aiohttp
+    raise SystemExit("[ERROR] recognition_service.py needs aiohttp: pip install aiohttp")
+
+from arcface_model import get_face_embeddings, start_model_loader
+from arcface_recognizer import MATCH_THRESHOLD, ArcFaceRecognizer
+from metrics import METRICS, STARTUP, log_event, setup_logging
+
+SERVICE_HOST = os.environ.get("RECOGNITION_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.environ.get("RECOGNITION_PORT", "8765"))
+BATCH_MAX = int(os.environ.get("RECOGNITION_BATCH_MAX", "16"))
+BATCH_WAIT_MS = float(os.environ.get("RECOGNITION_BATCH_WAIT_MS", "5"))
+QUEUE_MAX = int(os.environ.get("RECOGNITION_QUEUE_MAX", "64"))
+MAX_IMAGE_BYTES = 8 * 1024 * 1024
+
+
+class Overloaded(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+def decode_image(data):
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise BadRequest("Could not decode image")
+    return img
+
+
+def decode_base64(value):
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, TypeError, ValueError):
+        raise BadRequest("image must be base64")
+
+
+class RecognitionService:
+    """Bounded request queue, a batcher task and a single inference thread."""
+
+    def __init__(self, batch_max=BATCH_MAX, batch_wait_ms=BATCH_WAIT_MS, queue_max=QUEUE_MAX):
+        self.batch_max = batch_max
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.queue_max = queue_max
+        # ONNX Runtime parallelises each call itself; one thread keeps the
+        # model and the FAISS index single-threaded from Python's side
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="arcface-infer")
+        self.queue = None
+        self.model = None
+        self.recognizer = None
+        self._batcher = None
+
+    async def start(self, app):
+        loop = asyncio.get_running_loop()
+        print("[INFO] Loading ArcFace model and FAISS gallery...")
+        self.model, self.recognizer = await loop.run_in_executor(self.executor, self._load)
+        print(f"[INFO] Ready: {self.recognizer.ntotal} enrolled embeddings")
+        STARTUP.report("ready")
+        self.queue = asyncio.Queue(maxsize=self.queue_max)
+        self._batcher = asyncio.create_task(self._run_batches())
+
+    async def stop(self, app):
+        if self._batcher is not None:
+            self._batcher.cancel()
+        self.executor.shutdown(wait=False)
+
+    @staticmethod
+    def _load():
+        # Model import, session creation and warmup overlap with the gallery load
+        model = start_model_loader()
+        recognizer = ArcFaceRecognizer(roster_feed=True)
+        with STARTUP.phase("model_wait"):
+            return model.result(), recognizer
+
+    def free_slots(self):
+        return self.queue_max - self.queue.qsize()
+
+    async def submit(self, op, data, employee_id=None):
+        """Queue one image; raises Overloaded when the queue is full."""
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((op, data, employee_id, fut))
+        except asyncio.QueueFull:
+            METRICS.inc("service_rejected")
+            raise Overloaded()
+        return await fut
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_max:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Clients that went away do not cost inference
+            batch = [item for item in batch if not item[3].done()]
+            if not batch:
+                continue
+            METRICS.inc("service_batches")
+            METRICS.inc("service_requests", len(batch))
+            try:
+                with METRICS.stage("service_batch"):
+                    results = await loop.run_in_executor(self.executor, self._infer, batch)
+            except Exception as e:
+                log_event("service_error", error=repr(e), batch=len(batch))
+                for *_, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (*_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+    def _infer(self, batch):
+        """Inference thread: decode, detect, embed and search a whole batch."""
+        images, results = [], [None] * len(batch)
+        for i, (op, data, employee_id, _) in enumerate(batch):
+            try:
+                images.append(decode_image(data))
+            except BadRequest as e:
+                images.append(None)
+                results[i] = {"status": "BAD_IMAGE", "error": str(e)}
+
+        faces = get_face_embeddings(self.model, images, METRICS)
+        for i, (emb, _) in enumerate(faces):
+            if emb is None and results[i] is None:
+                results[i] = {"status": "NO_FACE"}
+
+        identify = [i for i, (op, *_) in enumerate(batch) if op == "identify" and results[i] is None]
+        with METRICS.stage("search"):
+            matches = self.recognizer.recognize_batch([faces[i][0] for i in identify])
+        for i, match in zip(identify, matches):
+            results[i] = match
+
+        for i, (op, _, employee_id, _) in enumerate(batch):
+            if op != "verify" or results[i] is not None:
+                continue
+            enrolled = self.recognizer.vectors_for(employee_id)
+            if not len(enrolled):
+                results[i] = {"status": "NOT_ENROLLED", "employee_id": employee_id}
+                continue
+            score = float((enrolled @ faces[i][0]).max())
+            results[i] = {
+                "status": "VERIFIED" if score >= MATCH_THRESHOLD else "REJECTED",
+                "verified": score >= MATCH_THRESHOLD,
+                "employee_id": employee_id,
+                "score": score,
+                "threshold": MATCH_THRESHOLD,
+            }
+
+        for i, (emb, bbox) in enumerate(faces):
+            if bbox is not None:
+                results[i]["bbox"] = [round(float(v), 1) for v in bbox]
+        return results
+
+
+def _employee_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise BadRequest("employee_id must be an integer")
+
+
+def _json_object(body):
+    if not isinstance(body, dict):
+        raise BadRequest("Expected a JSON object")
+    return body
+
+
+async def _read_image(request):
+    if request.content_type == "application/json":
+        body = _json_object(await request.json())
+        return decode_base64(body.get("image")), body
+    data = await request.read()
+    if not data:
+        raise BadRequest("Empty body; send the image bytes or JSON {\"image\": base64}")
+    return data, {}
+
+
+def create_app(service=None):
+    service = service or RecognitionService()
+
+    @web.middleware
+    async def errors(request, handler):
+        try:
+            return await handler(request)
+        except Overloaded:
+            return web.json_response({"message": "Recognition queue full, retry shortly"},
+                                     status=503, headers={"Retry-After": "1"})
+        except (BadRequest, json.JSONDecodeError) as e:
+            return web.json_response({"message": str(e)}, status=400)
+
+    async def identify(request):
+        data, _ = await _read_image(request)
+        return web.json_response(await service.submit("identify", data))
+
+    async def verify(request):
+        data, body = await _read_image(request)
+        employee_id = _employee_id(request.query.get("employee_id", body.get("employee_id")))
+        return web.json_response(await service.submit("verify", data, employee_id))
+
+    async def identify_batch(request):
+        images = _json_object(await request.json()).get("images")
+        if not isinstance(images, list) or not images:
+            raise BadRequest("Expected JSON {\"images\": [base64, ...]}")
+        if len(images) > service.queue_max:
+            raise BadRequest(f"At most {service.queue_max} images per request")
+        # All or nothing: do not start half a batch we cannot queue
+        if len(images) > service.free_slots():
+            raise Overloaded()
+        data = [decode_base64(img) for img in images]
+        results = await asyncio.gather(*(service.submit("identify", d) for d in data))
+        return web.json_response({"results": results})
+
+    async def websocket(request):
+        ws = web.WebSocketResponse(max_msg_size=MAX_IMAGE_BYTES)
+        await ws.prepare(request)
+        async for msg in ws:
+            reply = {}
+            try:
+                if msg.type == WSMsgType.BINARY:
+                    reply = await service.submit("identify", msg.data)
+                elif msg.type == WSMsgType.TEXT:
+                    body = _json_object(json.loads(msg.data))
+                    reply = {"id": body.get("id")}
+                    op = body.get("op", "identify")
+                    if op not in ("identify", "verify"):
+                        raise BadRequest(f"Unknown op {op!r}")
+                    employee_id = _employee_id(body.get("employee_id")) if op == "verify" else None
+                    reply.update(await service.submit(op, decode_base64(body.get("image")), employee_id))
+                else:
+                    break
+            except Overloaded:
+                reply.update({"status": "OVERLOADED", "retry_after_s": 1})
+            except (BadRequest, json.JSONDecodeError) as e:
+                reply.update({"status": "BAD_REQUEST", "error": str(e)})
+            except Exception as e:
+                # A failed batch answers this message; the connection stays open
+                log_event("service_ws_error", error=repr(e))
+                reply.update({"status": "ERROR", "error": "Recognition failed"})
+            await ws.send_json(reply)
+        return ws
+
+    async def health(request):
+        ready = service.recognizer is not None
+        return web.json_response({
+            "ready": ready,
+            "enrolled": service.recognizer.ntotal if ready else 0,
+            "site": service.recognizer.site if ready else None,
+            "queued": service.queue.qsize() if service.queue is not None else 0,
+            "threshold": MATCH_THRESHOLD,
+        })
+
+    async def metrics(request):
+        return web.Response(text=METRICS.prometheus(), content_type="text/plain")
+
+    app = web.Application(middlewares=[errors], client_max_size=MAX_IMAGE_BYTES)
+    app.router.add_post("/identify", identify)
+    app.router.add_post("/verify", verify)
+    app.router.add_post("/identify_batch", identify_batch)
+    app.router.add_get("/ws", websocket)
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics)
+    app.on_startup.append(service.start)
+    app.on_cleanup.append(service.stop)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    args = parser.parse_args()
+
+    setup_logging()
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
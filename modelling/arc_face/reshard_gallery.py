@@ -0,0 +1,142 @@
+"""
+reshard_gallery.py
+Split the FAISS gallery into per-site shards, or rebalance existing shards.
+
+Each embedding goes to the shard of its employee's site_id, taken from the
+backend change feed (employee.site_id); employees without a site go to the
+"default" shard. The first run migrates the single vector_db/arcface.index
+into vector_db/shards/<site>/ and leaves the old file in place as a backup;
+from then on the store is sharded and enrollment writes into the shards.
+Later runs move embeddings of employees whose site changed and prune
+embeddings the roster no longer has, like `python roster_sync.py`.
+
+Usage:
+    python reshard_gallery.py              # site assignment from the backend
+    python reshard_gallery.py --offline    # keep each embedding's recorded site_id
+    python reshard_gallery.py --dry-run    # print the plan, write nothing
+"""
+import argparse
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from faiss_utils import (
+    faiss_id_for, init_faiss, is_sharded, list_shards, new_index,
+    reconstruct_embeddings, save_faiss, shard_name, store_lock,
+)
+
+
+def load_gallery():
+    """
+    Every stored embedding, from the shards or from the single index.
+    returns: {faiss_id: (vector, record, source shard or None)}
+    """
+    gallery = {}
+    for source in list_shards() if is_sharded() else [None]:
+        index, metadata = init_faiss(source)
+        fids, vecs = reconstruct_embeddings(index, metadata.keys())
+        for fid, vec in zip(fids, vecs):
+            gallery[int(fid)] = (vec, metadata[int(fid)], source)
+    return gallery
+
+
+def apply_roster(gallery, changes):
+    """Update records from a full roster; returns how many embeddings were pruned."""
+    latest = {faiss_id_for(c["embedding_id"]): c for c in changes}
+    pruned = 0
+    for fid in list(gallery):
+        vec, rec, source = gallery[fid]
+        change = latest.get(fid)
+        if change is None:
+            # Unlinked legacy enrollments have no row to compare against
+            if rec["embedding_id"] is not None:
+                del gallery[fid]
+                pruned += 1
+            continue
+        if not change["is_active"]:
+            del gallery[fid]
+            pruned += 1
+            continue
+        rec.update(name=change["name"], employee_id=change["employee_id"], site_id=change.get("site_id"))
+    return pruned
+
+
+def reshard(changes=None, dry_run=False):
+    """
+    Rewrite the shards so every embedding sits in its employee's site shard.
+    changes: full roster from roster_sync.fetch_changes(None), or None to
+             keep the site_id already recorded with each embedding
+    returns: stats dict
+    """
+    # Enrollments wait until the rewritten shards are in place, so none is lost
+    with store_lock():
+        return _reshard(changes, dry_run)
+
+
+def _reshard(changes, dry_run):
+    started = time.perf_counter()
+    migrating = not is_sharded()
+    before = list_shards()
+    gallery = load_gallery()
+    pruned = apply_roster(gallery, changes) if changes is not None else 0
+
+    shards = defaultdict(list)
+    moved = 0
+    for fid, (vec, rec, source) in gallery.items():
+        target = shard_name(rec["site_id"])
+        shards[target].append(fid)
+        moved += source is not None and source != target
+
+    # Shards that lost all their members are written empty, so running
+    # recognizers drop them on their next reload
+    for site in before:
+        shards.setdefault(site, [])
+    if not shards:
+        shards[shard_name(None)] = []
+
+    sizes = Counter({site: len(fids) for site, fids in shards.items()})
+    stats = {
+        "embeddings": len(gallery),
+        "shards": len(shards),
+        "moved": moved,
+        "pruned": pruned,
+        "migrated": migrating,
+    }
+    for site, count in sorted(sizes.items()):
+        print(f"[INFO] Shard {site}: {count} embeddings")
+
+    if dry_run:
+        print(f"[INFO] Dry run, nothing written: {stats}")
+        return stats
+
+    for site, fids in shards.items():
+        index = new_index()
+        if fids:
+            index.add_with_ids(
+                np.stack([gallery[fid][0] for fid in fids]), np.asarray(fids, dtype="int64")
+            )
+        save_faiss(index, {fid: gallery[fid][1] for fid in fids}, site)
+
+    if migrating:
+        print("[INFO] Store is now sharded; vector_db/arcface.index is kept as a backup and no longer read")
+    print(f"[INFO] Resharded in {time.perf_counter() - started:.2f}s: {stats}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--offline", action="store_true",
+                        help="Do not call the backend; use the site_id stored with each embedding")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    changes = None
+    if not args.offline:
+        from roster_sync import fetch_changes
+        changes, _ = fetch_changes(None)
+    reshard(changes, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
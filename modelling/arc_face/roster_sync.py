@@ -0,0 +1,190 @@
+import json
+import os
+import queue
+import threading
+import time
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+
+from faiss_utils import faiss_id_for, init_faiss, remove_embeddings, shard_name, store_mtime
+
+ROSTER_API_URL = os.environ.get(
+    "ROSTER_API_URL", "http://localhost:3000/api/embeddings/changes"
+)
+POLL_INTERVAL_S = 30.0
+# Re-read a little history on every poll so rows committed with an older
+# updated_at than the last cursor are not missed; applying a change twice is harmless.
+CURSOR_OVERLAP = timedelta(seconds=5)
+
+
+def fetch_changes(since=None, url=ROSTER_API_URL, timeout=10):
+    """
+    Fetch roster changes from the backend change feed.
+    since: datetime or None (None returns the full roster)
+    returns: (changes, cursor)
+    """
+    if since is not None:
+        url = f"{url}?{urllib.parse.urlencode({'since': since.isoformat(sep=' ')})}"
+    with urllib.request.urlopen(url, timeout=timeout) as resp:
+        body = json.load(resp)
+    cursor = body.get("cursor")
+    return body["changes"], datetime.fromisoformat(cursor) if cursor else since
+
+
+def note_inactive(inactive, changes):
+    """Record in `inactive` the embeddings these changes deactivate (or reactivate)."""
+    for change in changes:
+        fid = faiss_id_for(change["embedding_id"])
+        if change["is_active"]:
+            inactive.discard(fid)
+        else:
+            inactive.add(fid)
+
+
+def apply_changes(index, metadata, changes, full=False, inactive=None, site=None, reloaded=None):
+    """
+    Apply change feed rows to an in-memory index + metadata.
+
+    Renames update metadata in place, deactivated or deleted embeddings are
+    removed from the index, and embeddings the feed knows about but the
+    index does not (enrolled by another process) trigger a reload from disk.
+    With full=True the changes are the whole roster, so linked embeddings
+    missing from it are pruned as well. Pass the same `inactive` set on every
+    call so embeddings removed earlier stay removed when the index is reloaded.
+    For a shard, pass its `site`: only unknown embeddings of that site's
+    employees trigger a reload, and it reloads that shard. Pass the same
+    `reloaded` dict on every call too: it remembers the store file version
+    each reload read, so an embedding this box never gets (enrolled on
+    another box, or into a shard file not synced here) does not re-read an
+    unchanged store on every poll of the overlapping cursor.
+
+    returns: (index, metadata, stats) -- index/metadata are new objects after a reload
+    """
+    stats = {"renamed": 0, "removed": 0, "reloaded": False}
+    inactive = set() if inactive is None else inactive
+    note_inactive(inactive, changes)
+
+    missing = any(
+        c["is_active"] and faiss_id_for(c["embedding_id"]) not in metadata
+        and (site is None or shard_name(c.get("site_id")) == site)
+        for c in changes
+    )
+    mtime = store_mtime(site) if missing and reloaded is not None else None
+    if missing and (reloaded is None or reloaded.get(site, -1) != mtime):
+        if reloaded is not None:
+            # Read before loading: a write racing the load just means one more reload
+            reloaded[site] = mtime
+        index, fresh = init_faiss(site)
+        # Names already applied in memory are newer than what is on disk
+        for fid, rec in fresh.items():
+            if fid in metadata:
+                rec.update(name=metadata[fid]["name"], employee_id=metadata[fid]["employee_id"])
+        metadata = fresh
+        stats["reloaded"] = True
+
+    to_remove = [fid for fid in inactive if fid in metadata]
+    active = set()
+    for change in changes:
+        fid = faiss_id_for(change["embedding_id"])
+        rec = metadata.get(fid)
+        if rec is None or not change["is_active"]:
+            continue
+
+        active.add(fid)
+        rec["site_id"] = change.get("site_id")
+        if rec["name"] != change["name"] or rec["employee_id"] != change["employee_id"]:
+            rec["name"] = change["name"]
+            rec["employee_id"] = change["employee_id"]
+            stats["renamed"] += 1
+
+    if full:
+        to_remove += [
+            fid for fid, rec in metadata.items()
+            if rec["embedding_id"] is not None and fid not in active
+        ]
+
+    stats["removed"] = remove_embeddings(index, metadata, set(to_remove))
+    return index, metadata, stats
+
+
+class RosterFeed:
+    """
+    Polls the backend change feed on a daemon thread.
+
+    The recognizer loop calls drain() between frames and applies the result
+    with apply_changes(), so the index is only ever touched by one thread.
+    """
+
+    def __init__(self, url=ROSTER_API_URL, interval=POLL_INTERVAL_S):
+        self.url = url
+        self.interval = interval
+        self.cursor = None
+        self.inactive = set()
+        self.reloaded = {}
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="roster-feed", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            since = self.cursor - CURSOR_OVERLAP if self.cursor else None
+            try:
+                changes, cursor = fetch_changes(since, self.url)
+                if changes or since is None:
+                    self._queue.put((changes, since is None))
+                self.cursor = cursor
+            except Exception as e:
+                print(f"[WARN] Roster sync failed: {e}")
+            self._stop.wait(self.interval)
+
+    def drain(self):
+        """Return pending (changes, full) batches without blocking."""
+        batches = []
+        while True:
+            try:
+                batches.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batches
+
+    def apply_pending(self, index, metadata, site=None, batches=None):
+        """
+        Apply everything drained so far (or the given batches); returns (index, metadata).
+        """
+        for changes, full in self.drain() if batches is None else batches:
+            index, metadata, stats = apply_changes(
+                index, metadata, changes, full=full, inactive=self.inactive, site=site,
+                reloaded=self.reloaded,
+            )
+            if stats["renamed"] or stats["removed"] or stats["reloaded"]:
+                print(
+                    f"[INFO] Roster sync: {stats['renamed']} renamed, "
+                    f"{stats['removed']} removed, reloaded={stats['reloaded']}"
+                )
+        return index, metadata
+
+
+if __name__ == "__main__":
+    # One-shot sync of the on-disk store against the backend roster
+    from faiss_utils import is_sharded, save_faiss, store_lock
+
+    changes, _ = fetch_changes(None)
+    with store_lock():
+        if is_sharded():
+            # Also moves embeddings of employees whose site changed
+            from reshard_gallery import reshard
+            reshard(changes)
+            raise SystemExit(0)
+
+        index, metadata = init_faiss()
+        started = time.perf_counter()
+        index, metadata, stats = apply_changes(index, metadata, changes, full=True)
+        save_faiss(index, metadata)
+    print(f"[INFO] Applied {len(changes)} roster rows in {time.perf_counter() - started:.3f}s: {stats}")
@@ -0,0 +1,158 @@
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from faiss_utils import init_faiss, list_shards, remove_embeddings, store_mtime
+from metrics import METRICS
+
+# Other sites' shards kept in memory for the fallback search; the rest are
+# read from disk when needed, so memory stays bounded as sites are added
+COLD_SHARDS_MAX = int(os.environ.get("COLD_SHARDS_MAX", "4"))
+# Shards one fallback search may read from disk, and how often such reads
+# may happen at all; the other shards wait for later frames
+COLD_SHARD_LOADS = int(os.environ.get("COLD_SHARD_LOADS", "1"))
+COLD_PROBE_INTERVAL_S = float(os.environ.get("COLD_PROBE_INTERVAL_S", "0.5"))
+
+
+class ShardCache:
+    """
+    LRU of the gallery shards a recognizer does not own.
+
+    The recognizer searches its own site's shard first and only comes here
+    for faces that scored below threshold there (a visitor from another
+    site). Shards are reloaded when their file changes on disk, so
+    enrollments made by other processes show up without a restart.
+
+    With more sites than fit in memory a search must not walk every shard
+    (in a fixed order that is the worst case for an LRU, and every miss
+    would read every shard from disk). Instead the loaded shards are
+    searched first, and only faces still unmatched read at most
+    `max_loads` more shards, taken round-robin from the ones on disk, at
+    most once per `probe_interval` seconds (so a stranger who matches no
+    site costs a couple of shard reads a second, not one per frame). A
+    shard that matched stays most recently used; one that was read and did
+    not is evicted first, so the resident set drifts towards the sites
+    whose visitors actually show up here.
+    """
+
+    def __init__(self, exclude, max_loaded=COLD_SHARDS_MAX, max_loads=COLD_SHARD_LOADS,
+                 probe_interval=COLD_PROBE_INTERVAL_S, metrics=METRICS):
+        self.exclude = exclude
+        self.max_loaded = max(1, max_loaded)
+        self.max_loads = max(1, max_loads)
+        self.probe_interval = probe_interval
+        self.metrics = metrics
+        self.loaded = OrderedDict()  # site -> [index, metadata, mtime]
+        self._last_probe = None
+        self._next_probe_at = 0.0
+
+    def sites(self):
+        return [site for site in list_shards() if site != self.exclude]
+
+    def get(self, site, inactive=()):
+        """(index, metadata) of one shard, loading or refreshing it as needed."""
+        mtime = store_mtime(site)
+        entry = self.loaded.get(site)
+        if entry is None or entry[2] != mtime:
+            index, metadata = init_faiss(site)
+            # Embeddings the roster feed removed since the file was written
+            remove_embeddings(index, metadata, {fid for fid in inactive if fid in metadata})
+            entry = self.loaded[site] = [index, metadata, mtime]
+            self.metrics.inc("shard_loads")
+            while len(self.loaded) > self.max_loaded:
+                self.loaded.popitem(last=False)
+        self.loaded.move_to_end(site)
+        return entry[0], entry[1]
+
+    def _probe_order(self, sites):
+        """Shards not in memory, starting after the last one probed."""
+        cold = [site for site in sites if site not in self.loaded]
+        if self._last_probe is None:
+            return cold
+        start = sum(1 for site in cold if site <= self._last_probe)
+        return cold[start:] + cold[:start]
+
+    def search(self, vecs, inactive=(), threshold=None):
+        """
+        Best match of each row of vecs over the other shards: every shard in
+        memory, then (if a probe is due) up to max_loads shards from disk for
+        rows still below threshold (all rows when threshold is None).
+        returns: (scores, faiss_ids, records) with -1 / None where nothing was found
+        """
+        n = len(vecs)
+        scores = np.full(n, -np.inf, dtype="float32")
+        fids = np.full(n, -1, dtype="int64")
+        records = [None] * n
+
+        def search_shard(site, rows):
+            index, metadata = self.get(site, inactive)
+            if index.ntotal == 0:
+                return False
+            D, I = index.search(vecs[rows], k=1)
+            better = (I[:, 0] != -1) & (D[:, 0] > scores[rows])
+            for i in np.flatnonzero(better):
+                row = rows[i]
+                scores[row], fids[row] = D[i, 0], I[i, 0]
+                records[row] = metadata[int(I[i, 0])]
+            return threshold is not None and bool((D[better, 0] >= threshold).any())
+
+        def unmatched():
+            return np.arange(n) if threshold is None else np.flatnonzero(scores < threshold)
+
+        sites = self.sites()
+        hits = [site for site in list(self.loaded) if site in sites and search_shard(site, np.arange(n))]
+        for site in hits:
+            self.loaded.move_to_end(site)
+
+        now = time.monotonic()
+        if now < self._next_probe_at or not len(unmatched()):
+            return scores, fids, records
+        self._next_probe_at = now + self.probe_interval
+        for site in self._probe_order(sites)[:self.max_loads]:
+            rows = unmatched()
+            if not len(rows):
+                break
+            self._last_probe = site
+            self.metrics.inc("shard_probes")
+            if not search_shard(site, rows):
+                self.loaded.move_to_end(site, last=False)
+        return scores, fids, records
+
+    def apply_pending(self, feed, batches):
+        """Apply drained roster batches to the shards currently in memory."""
+        for site, entry in self.loaded.items():
+            entry[0], entry[1] = feed.apply_pending(entry[0], entry[1], site=site, batches=batches)
+
+    def find(self, predicate, inactive=()):
+        """
+        (index, faiss_ids) of the shards with records matching predicate(rec).
+
+        Like search: the shards in memory are checked first, and only when
+        none matches are up to max_loads shards read from disk, round-robin,
+        so a lookup for someone enrolled nowhere cannot flush the resident
+        set. A miss beyond the budget is found by a later call.
+        """
+        sites = self.sites()
+        hits = []
+        for site in [site for site in self.loaded if site in sites]:
+            index, metadata = self.get(site, inactive)
+            fids = [fid for fid, rec in metadata.items() if predicate(rec)]
+            if fids:
+                hits.append((site, index, fids))
+        if hits:
+            for site, index, fids in hits:
+                self.loaded.move_to_end(site)
+                yield index, fids
+            return
+
+        for site in self._probe_order(sites)[:self.max_loads]:
+            self._last_probe = site
+            self.metrics.inc("shard_probes")
+            index, metadata = self.get(site, inactive)
+            fids = [fid for fid, rec in metadata.items() if predicate(rec)]
+            if fids:
+                yield index, fids
+                return
+            self.loaded.move_to_end(site, last=False)
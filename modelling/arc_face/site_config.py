@@ -0,0 +1,46 @@
+import json
+import os
+import time
+
+# Which gate/site this recognizer serves; selects its calibrated threshold
+SITE_ID = os.environ.get("SITE_ID", "default")
+# FAST_START=0 turns off the ORT graph cache and the gallery snapshot and
+# loads everything from scratch before the first frame
+FAST_START = os.environ.get("FAST_START", "1") != "0"
+# Same directory as faiss_utils.DB_DIR, without pulling in faiss for offline tools
+THRESHOLDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vector_db", "thresholds.json")
+
+
+def load_thresholds(path=THRESHOLDS_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def get_match_threshold(default, metric="cosine", site=SITE_ID, path=THRESHOLDS_PATH):
+    """
+    Calibrated threshold for this site (written by calibrate_threshold.py),
+    falling back to the "default" site and then to the caller's constant.
+    """
+    thresholds = load_thresholds(path)
+    for key in (site, "default"):
+        value = thresholds.get(key, {}).get(metric)
+        if value is not None:
+            return float(value)
+    return default
+
+
+def save_threshold(site, metric, value, details=None, path=THRESHOLDS_PATH):
+    thresholds = load_thresholds(path)
+    entry = thresholds.setdefault(site, {})
+    entry[metric] = float(value)
+    entry[f"{metric}_calibration"] = {
+        "calibrated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **(details or {}),
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(thresholds, f, indent=2)
+    os.replace(tmp, path)
@@ -1,18 +1,15 @@
-import cv2
+from capture import open_stream, parse_camera_source  # noqa: F401 (re-exported)
 
 CAMERA_SOURCE = "http://192.168.1.5:8080/video"
 
 
-def parse_camera_source(arg: str):
-    """Return int for webcam indices, otherwise assume IP/RTSP/HTTP URL."""
-    return int(arg) if arg.isdigit() else arg
-
 def openCam():
     print("[INFO] Starting webcam...")
     camera_source = parse_camera_source(CAMERA_SOURCE)
-    cap = cv2.VideoCapture(camera_source)
+    # Decoded at detection resolution and target FPS, reconnecting on drops
+    cap = open_stream(camera_source)
 
     if not cap.isOpened():
         print("[ERROR] Could not open webcam")
         return
-    return cap
\ No newline at end of file
+    return cap
@@ -0,0 +1,150 @@
+"""
+bench_compact_gallery.py
+Memory per identity and recall of arc_face/compact_gallery.py vs the float32 FAISS store.
+
+Builds a synthetic gallery of --people identities with --templates
+embeddings each (templates and queries are noisy copies of a per-person
+centre, spread like ArcFace same-person scores), then compares:
+    float32  flat float32 vectors + a metadata dict, as faiss_utils stores them
+    fp16     float16 coarse search + float32 mmap re-ranking
+    pq       product-quantized coarse search + re-ranking (needs faiss)
+Recall@1 is agreement with the exact float32 top-1 row; identity accuracy
+is whether the top row belongs to the query's person.
+
+Usage:
+    python bench_compact_gallery.py --people 100000 --templates 3 --out compact.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "arc_face"))
+from compact_gallery import CompactGallery  # noqa: E402
+
+DIM = 512
+
+
+def _normalize(v):
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def synthetic_people(people, templates, queries, noise, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = _normalize(rng.standard_normal((people, DIM), dtype=np.float32))
+    owner = np.repeat(np.arange(people), templates)
+    gallery = np.empty((len(owner), DIM), dtype=np.float32)
+    for start in range(0, len(owner), 65536):
+        rows = owner[start:start + 65536]
+        gallery[start:start + len(rows)] = _normalize(
+            centres[rows] + noise * rng.standard_normal((len(rows), DIM), dtype=np.float32)
+        )
+    truth = rng.integers(0, people, queries)
+    q = _normalize(centres[truth] + noise * rng.standard_normal((queries, DIM), dtype=np.float32))
+    return gallery, owner, q, truth
+
+
+def exact_top1(gallery, queries):
+    best = np.full(len(queries), -np.inf, dtype=np.float32)
+    rows = np.zeros(len(queries), dtype=np.int64)
+    for start in range(0, len(gallery), 65536):
+        scores = queries @ gallery[start:start + 65536].T
+        idx = scores.argmax(axis=1)
+        val = scores[np.arange(len(queries)), idx]
+        better = val > best
+        best[better], rows[better] = val[better], idx[better] + start
+    return rows
+
+
+def metadata_dict_bytes(owner):
+    """Python heap taken by faiss_utils-style metadata records for these vectors."""
+    tracemalloc.start()
+    metadata = {
+        int(fid): {"name": f"Employee {p:07d}", "employee_id": int(p),
+                   "embedding_id": str(uuid.UUID(int=fid + 1)), "site_id": None}
+        for fid, p in enumerate(owner)
+    }
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del metadata
+    return size
+
+
+def run_variant(name, gallery, rerank_k, queries, truth_rows, truth_people, owner):
+    start = time.perf_counter()
+    _, rows = gallery.search(queries, k=1, rerank_k=rerank_k)
+    elapsed = time.perf_counter() - start
+    top = rows[:, 0]
+    row = {
+        "variant": name,
+        "rerank_k": rerank_k,
+        "recall_at_1": float(np.mean(top == truth_rows)),
+        "identity_accuracy": float(np.mean(owner[top] == truth_people)),
+        "ms_per_query": elapsed * 1000.0 / len(queries),
+        **gallery.memory_report(),
+    }
+    print(f"{name:<8}{rerank_k:>8}{row['recall_at_1']:>10.4f}{row['identity_accuracy']:>10.4f}"
+          f"{row['ms_per_query']:>10.2f}{row['resident_bytes_per_person']:>14.0f}")
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--people", type=int, default=20000)
+    parser.add_argument("--templates", type=int, default=3, help="Embeddings per person")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.045,
+                        help="Per-dimension noise; 0.045 gives same-person cosine around 0.5")
+    parser.add_argument("--rerank", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--pq-m", type=int, default=64)
+    parser.add_argument("--out", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    print(f"[INFO] {args.people} people x {args.templates} templates, {args.queries} queries")
+    vectors, owner, queries, truth_people = synthetic_people(args.people, args.templates, args.queries, args.noise)
+    truth_rows = exact_top1(vectors, queries)
+    records = [{"name": f"Employee {p:07d}", "employee_id": int(p), "embedding_id": str(uuid.UUID(int=i + 1))}
+               for i, p in enumerate(owner)]
+
+    baseline = {
+        "variant": "float32",
+        "resident_bytes": int(vectors.nbytes + metadata_dict_bytes(owner)),
+    }
+    baseline["resident_bytes_per_person"] = baseline["resident_bytes"] / args.people
+    print(f"{'':<8}{'rerank':>8}{'recall@1':>10}{'id acc':>10}{'ms/query':>10}{'bytes/person':>14}")
+    print(f"{'float32':<8}{'-':>8}{1.0:>10.4f}{float(np.mean(owner[truth_rows] == truth_people)):>10.4f}"
+          f"{'':>10}{baseline['resident_bytes_per_person']:>14.0f}")
+
+    kinds = ["fp16"]
+    if importlib.util.find_spec("faiss") is not None:
+        kinds.append("pq")
+    else:
+        print("[WARN] faiss not installed; skipping the pq variant (CompactGallery builds PQ codes with faiss)")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in kinds:
+            path = os.path.join(tmp, kind)
+            CompactGallery.build(path, np.arange(len(vectors)), vectors, records, coarse=kind, pq_m=args.pq_m)
+            gallery = CompactGallery.open(path)
+            for rerank_k in args.rerank:
+                rows.append(run_variant(kind, gallery, rerank_k, queries, truth_rows, truth_people, owner))
+            del gallery
+
+    if args.out:
+        report = {"people": args.people, "templates": args.templates, "queries": args.queries,
+                  "noise": args.noise, "baseline": baseline, "variants": rows}
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+bench_frame_bus.py
+Capture -> inference process hand-off: arc_face/frame_bus.py vs multiprocessing.Queue.
+
+A writer process pushes --frames frames of --shape (default 1080p BGR) and
+a reader process consumes them in order, touching every frame the way a
+detector would (--work). Both transports apply backpressure (bounded queue,
+blocking bus writer), so no frame is dropped and the rates are comparable.
+Reports frames/s, MB/s and write-to-read latency p50/p99.
+
+Usage:
+    python bench_frame_bus.py --frames 600 --shape 1080 1920 3 --out frame_bus.json
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "arc_face"))
+from frame_bus import FrameBus  # noqa: E402
+
+SLOTS = 8
+
+
+def _frames(shape, k=4):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(k)]
+
+
+def _work(image, work):
+    if work == "sample":
+        # Reads a sparse grid, like a detector's strided resize would touch
+        return int(image[::16, ::16].sum())
+    if work == "full":
+        return int(image.mean())
+    return 0
+
+
+def queue_writer(q, n, shape):
+    frames = _frames(shape)
+    for i in range(n):
+        q.put((i, time.time(), frames[i % len(frames)]))
+    q.put(None)
+
+
+def queue_reader(q, work, result):
+    latencies = []
+    start = None
+    while True:
+        item = q.get()
+        if item is None:
+            break
+        if start is None:
+            start = time.perf_counter()
+        _, ts, frame = item
+        _work(frame, work)
+        latencies.append(time.time() - ts)
+    result.put((time.perf_counter() - start, latencies))
+
+
+def bus_writer(name, n, shape, ready):
+    frames = _frames(shape)
+    bus = FrameBus.attach(name)
+    ready.wait()
+    for i in range(n):
+        _, view = bus.acquire(block=True, timeout=30)
+        np.copyto(view, frames[i % len(frames)])  # stands in for the decoder filling the slot
+        bus.commit(cam_id=1, ts=time.time())
+    bus.close()
+
+
+def bus_reader(name, n, work, ready, result):
+    bus = FrameBus.attach(name, reader_id=0)
+    ready.set()
+    latencies = []
+    start = None
+    for _ in range(n):
+        frame = bus.read(timeout=30)
+        if frame is None:
+            break
+        if start is None:
+            start = time.perf_counter()
+        _work(frame.image, work)
+        latencies.append(time.time() - frame.ts)
+        bus.release(frame)
+    dropped = bus.dropped
+    del frame
+    bus.close()
+    result.put((time.perf_counter() - start, latencies, dropped))
+
+
+def _report(name, n, frame_mb, elapsed, latencies):
+    lat = np.asarray(latencies) * 1000.0
+    # The first frame starts the clock, so n - 1 frames were delivered in `elapsed`
+    fps = (len(lat) - 1) / elapsed if elapsed > 0 else 0.0
+    row = {
+        "frames": len(lat),
+        "fps": fps,
+        "mb_per_s": fps * frame_mb,
+        "latency_p50_ms": float(np.percentile(lat, 50)),
+        "latency_p99_ms": float(np.percentile(lat, 99)),
+    }
+    print(f"{name:<8}{fps:>10.0f}{row['mb_per_s']:>12.0f}{row['latency_p50_ms']:>12.2f}{row['latency_p99_ms']:>12.2f}")
+    return row
+
+
+def run_queue(ctx, n, shape, work):
+    q = ctx.Queue(maxsize=SLOTS)
+    result = ctx.Queue()
+    reader = ctx.Process(target=queue_reader, args=(q, work, result))
+    writer = ctx.Process(target=queue_writer, args=(q, n, shape))
+    reader.start()
+    writer.start()
+    elapsed, latencies = result.get()
+    writer.join()
+    reader.join()
+    return elapsed, latencies
+
+
+def run_bus(ctx, n, shape, work):
+    name = f"fbbench_{os.getpid()}"
+    bus = FrameBus.create(name, shape, slots=SLOTS)
+    ready, result = ctx.Event(), ctx.Queue()
+    try:
+        reader = ctx.Process(target=bus_reader, args=(name, n, work, ready, result))
+        writer = ctx.Process(target=bus_writer, args=(name, n, shape, ready))
+        reader.start()
+        writer.start()
+        elapsed, latencies, dropped = result.get()
+        writer.join()
+        reader.join()
+    finally:
+        bus.close()
+    if dropped:
+        print(f"[WARN] frame bus reader dropped {dropped} frames")
+    return elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--shape", type=int, nargs=3, default=(1080, 1920, 3), metavar=("H", "W", "C"))
+    parser.add_argument("--work", choices=("none", "sample", "full"), default="sample",
+                        help="What the reader does with each frame")
+    parser.add_argument("--out", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    shape = tuple(args.shape)
+    frame_mb = int(np.prod(shape)) / 1e6
+    # spawn everywhere, so Linux numbers match the Windows deployment
+    ctx = mp.get_context("spawn")
+
+    print(f"[INFO] {args.frames} frames of {shape} ({frame_mb:.1f} MB), reader work: {args.work}")
+    print(f"{'':<8}{'frames/s':>10}{'MB/s':>12}{'p50 ms':>12}{'p99 ms':>12}")
+    results = {
+        "queue": _report("queue", args.frames, frame_mb, *run_queue(ctx, args.frames, shape, args.work)),
+        "bus": _report("bus", args.frames, frame_mb, *run_bus(ctx, args.frames, shape, args.work)),
+    }
+    speedup = results["bus"]["fps"] / results["queue"]["fps"] if results["queue"]["fps"] else 0.0
+    print(f"[INFO] Frame bus throughput: {speedup:.1f}x multiprocessing.Queue")
+
+    if args.out:
+        report = {"frames": args.frames, "shape": shape, "work": args.work, "speedup": speedup, **results}
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+bench_pipeline.py
+Headless, offline benchmark of the end-to-end recognition pipelines.
+
+Replays a recorded video file or a folder of images through either the
+ArcFace pipeline (arc_face/) or the dlib pipeline (face-attendance-exp/)
+against a synthetic gallery of configurable size, and writes a JSON report
+with per-stage latency, FPS, p50/p99 frame latency (decode through match)
+and peak RSS. Each pipeline runs the same code as its live loop: the ArcFace
+one searches a synthetic FAISS store through ArcFaceRecognizer behind the
+TrackVoter, as arcface_recognize.py does. Stages a pipeline does not have
+are listed under "absent_stages" instead of silently missing (the ArcFace
+loops run no liveness check).
+
+Usage:
+    python bench_pipeline.py --source gate.mp4 --pipeline arcface --gallery-size 10000 --out run.json
+    python bench_pipeline.py --source frames/ --pipeline dlib --compare baseline.json --out run.json
+
+CPU saved by the motion gate on recorded footage (cpu_ms_per_frame row):
+    python bench_pipeline.py --source night_shift.mp4 --out ungated.json
+    python bench_pipeline.py --source night_shift.mp4 --motion-gate --compare ungated.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+MODELLING_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PIPELINE_DIRS = {
+    "arcface": os.path.join(MODELLING_DIR, "arc_face"),
+    "dlib": os.path.join(MODELLING_DIR, "face-attendance-exp"),
+}
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+# Stages whose change is compared by --compare, in report order
+STAGES = ("decode", "gate", "detect", "embed", "track", "search", "liveness", "log")
+
+
+class StageTimer:
+    """Collects raw per-stage and per-frame durations in milliseconds."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.frames = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[name].append((time.perf_counter() - start) * 1000.0)
+
+    def reset(self):
+        self.samples.clear()
+        self.frames.clear()
+
+
+def _summary(values):
+    arr = np.asarray(values, dtype=np.float64)
+    return {
+        "count": int(arr.size),
+        "total_ms": float(arr.sum()),
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "max_ms": float(arr.max()),
+    }
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return rss / (1024 * 1024) if platform.system() == "Darwin" else rss / 1024
+
+
+def iter_frames(source, timer, loop=False):
+    """Yield BGR frames from a video file or image folder, timing decode."""
+    if os.path.isdir(source):
+        paths = sorted(p for p in glob.glob(os.path.join(source, "*")) if p.lower().endswith(IMAGE_EXTS))
+        if not paths:
+            raise RuntimeError(f"No images found in {source}")
+        while True:
+            for path in paths:
+                with timer.stage("decode"):
+                    frame = cv2.imread(path)
+                if frame is not None:
+                    yield frame
+                else:
+                    timer.samples["decode"].pop()
+            if not loop:
+                return
+
+    while True:
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            raise RuntimeError(f"Could not open {source}")
+        try:
+            while True:
+                with timer.stage("decode"):
+                    ret, frame = cap.read()
+                if not ret:
+                    timer.samples["decode"].pop()
+                    break
+                yield frame
+        finally:
+            cap.release()
+        if not loop:
+            return
+
+
+def synthetic_gallery(size, dim, seed=0, scale=1.0):
+    """Random unit vectors standing in for enrolled identities."""
+    rng = np.random.default_rng(seed)
+    vecs = rng.standard_normal((size, dim), dtype=np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs * scale
+
+
+def synthetic_store(size, dim, db_dir):
+    """
+    Write a single-index faiss_utils store of `size` synthetic identities
+    under db_dir and point faiss_utils at it, so the real vector_db is
+    never touched.
+    """
+    import faiss_utils
+
+    faiss_utils.DB_DIR = db_dir
+    faiss_utils.INDEX_PATH = os.path.join(db_dir, "arcface.index")
+    faiss_utils.META_PATH = os.path.join(db_dir, "metadata.pkl")
+    faiss_utils.SHARD_DIR = os.path.join(db_dir, "shards")
+
+    index = faiss_utils.new_index()
+    ids = np.arange(size, dtype=np.int64)
+    if size:
+        index.add_with_ids(synthetic_gallery(size, dim), ids)
+    metadata = {
+        int(i): {"name": f"id_{i}", "employee_id": int(i), "embedding_id": None, "site_id": None}
+        for i in ids
+    }
+    faiss_utils.save_faiss(index, metadata)
+
+
+class ArcFacePipeline:
+    """
+    arc_face/ pipeline as arcface_recognize.py runs it: get_faces (detection
+    and embedding timed separately), TrackVoter, ArcFaceRecognizer search of
+    the tracks that need one, attendance on committed tracks.
+    """
+
+    dim = 512
+    absent_stages = {"liveness": "the arc_face loops run no liveness check (arc_face/liveness.py is unused)"}
+
+    def __init__(self, gallery_size, threshold, log_path):
+        from arcface_model import get_faces, load_arcface_model
+        from arcface_recognizer import ArcFaceRecognizer
+        from attendance import AttendanceLogger
+        from track_voting import TrackVoter
+
+        synthetic_store(gallery_size, self.dim, os.path.join(os.path.dirname(log_path), "vector_db"))
+        self.get_faces = get_faces
+        self.model = load_arcface_model()
+        self.recognizer = ArcFaceRecognizer(site_id=None, threshold=threshold, fast_start=False)
+        self.voter = TrackVoter()
+        self.attendance = AttendanceLogger(path=log_path)
+
+    def process(self, frame, timer, now):
+        faces = self.get_faces(self.model, frame, timer)
+
+        with timer.stage("track"):
+            tracks = self.voter.update([f.bbox for f in faces], [f.embedding for f in faces], now=now)
+            pending = [t for t in tracks if self.voter.need_search(t)]
+        if not pending:
+            return len(faces)
+
+        with timer.stage("search"):
+            results = self.recognizer.recognize_batch(np.stack([t.ema for t in pending]))
+
+        with timer.stage("log"):
+            for track, result in zip(pending, results):
+                key = result["employee_id"] if result["status"] == "MATCH" else None
+                if self.voter.vote(track, key, result["confidence"]) is not None:
+                    self.attendance.mark(result["name"])
+        return len(faces)
+
+
+class DlibPipeline:
+    """face-attendance-exp/ pipeline on a 0.25-scale frame, as in main.py."""
+
+    dim = 128
+    absent_stages = {}
+
+    def __init__(self, gallery_size, threshold, log_path):
+        import face_recognition
+        from attendance import AttendanceLogger
+        from liveness import BlinkLiveness
+
+        self.fr = face_recognition
+        # dlib encodings are roughly unit-ish vectors with ~0.6 distance between people
+        self.gallery = synthetic_gallery(max(gallery_size, 1), self.dim, scale=0.5).astype(np.float64)
+        self.names = [f"id_{i}" for i in range(len(self.gallery))]
+        self.threshold = threshold
+        self.liveness = BlinkLiveness(self.names)
+        self.attendance = AttendanceLogger(path=log_path)
+
+    def process(self, frame, timer, now):
+        with timer.stage("detect"):
+            small = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
+            rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+            locations = self.fr.face_locations(rgb_small)
+
+        if not locations:
+            return 0
+
+        with timer.stage("embed"):
+            encodings = self.fr.face_encodings(rgb_small, locations)
+
+        with timer.stage("search"):
+            dists = np.linalg.norm(self.gallery[None, :, :] - np.asarray(encodings)[:, None, :], axis=2)
+            best = dists.argmin(axis=1)
+            names = [
+                self.names[b] if dists[i, b] <= self.threshold else "Unknown"
+                for i, b in enumerate(best)
+            ]
+
+        with timer.stage("liveness"):
+            landmarks = self.fr.face_landmarks(rgb_small, locations)
+            for name, lm in zip(names, landmarks):
+                if name != "Unknown":
+                    self.liveness.update(name, lm)
+
+        with timer.stage("log"):
+            for name in names:
+                if name != "Unknown" and self.liveness.has_blinked(name):
+                    self.attendance.mark_if_live_and_not_marked(name)
+        return len(locations)
+
+
+PIPELINES = {"arcface": ArcFacePipeline, "dlib": DlibPipeline}
+DEFAULT_THRESHOLDS = {"arcface": 0.50, "dlib": 0.5}
+
+
+def run(args):
+    sys.path.insert(0, PIPELINE_DIRS[args.pipeline])
+    threshold = args.threshold if args.threshold is not None else DEFAULT_THRESHOLDS[args.pipeline]
+
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        pipeline = PIPELINES[args.pipeline](args.gallery_size, threshold, os.path.join(tmp, "attendance.csv"))
+        load_s = time.perf_counter() - started
+
+        gate = None
+        if args.motion_gate:
+            # Appended so the dlib pipeline's own attendance/liveness modules win
+            sys.path.append(PIPELINE_DIRS["arcface"])
+            from motion_gate import MotionGate
+            gate = MotionGate(enabled=True, metrics=None)
+
+        frames = faces = 0
+        wall_start = None
+        cpu_start = None
+        source = iter_frames(args.source, timer, loop=args.loop)
+        while True:
+            if frames == args.warmup and wall_start is None:
+                # Drop warmup samples so session/JIT setup does not skew
+                # percentiles; reset before decoding so the first measured
+                # frame keeps its decode sample
+                timer.reset()
+                if gate is not None:
+                    gate.counts = dict.fromkeys(gate.counts, 0)
+                wall_start = time.perf_counter()
+                cpu_start = time.process_time()
+
+            # Frame latency runs from decode to the last match of the frame
+            frame_start = time.perf_counter()
+            frame = next(source, None)
+            if frame is None:
+                break
+            # Recording time, not wall time, drives the gate's hold/keepalive
+            # windows and the track voter's ageing
+            now = frames / args.source_fps
+            active = True
+            if gate is not None:
+                with timer.stage("gate"):
+                    active = gate.check(frame, now=now)
+            n = pipeline.process(frame, timer, now) if active else 0
+            timer.frames.append((time.perf_counter() - frame_start) * 1000.0)
+
+            frames += 1
+            if wall_start is not None:
+                faces += n
+            if args.max_frames and frames >= args.max_frames + args.warmup:
+                break
+
+        if wall_start is None or not timer.frames:
+            raise RuntimeError(f"Source produced only {frames} frames; need more than --warmup={args.warmup}")
+        wall_s = time.perf_counter() - wall_start
+        cpu_s = time.process_time() - cpu_start
+
+    measured = len(timer.frames)
+    return {
+        "meta": {
+            "pipeline": args.pipeline,
+            "source": args.source,
+            "gallery_size": args.gallery_size,
+            "threshold": threshold,
+            "motion_gate": args.motion_gate,
+            "warmup_frames": args.warmup,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "frames": measured,
+        "faces": faces,
+        "model_load_s": load_s,
+        "wall_s": wall_s,
+        "cpu_s": cpu_s,
+        "cpu_ms_per_frame": cpu_s / measured * 1000.0,
+        "fps": measured / wall_s if wall_s > 0 else 0.0,
+        "frame_latency": _summary(timer.frames),
+        "stages": {name: _summary(timer.samples[name]) for name in STAGES if timer.samples.get(name)},
+        "absent_stages": pipeline.absent_stages,
+        "peak_rss_mb": peak_rss_mb(),
+        "motion_gate": None if gate is None else {
+            **gate.counts,
+            "skip_ratio": gate.counts["gate_skipped"] / measured,
+        },
+    }
+
+
+def compare(report, baseline, tolerance_pct):
+    """Print per-metric change vs a baseline report; return regressed metric names."""
+    rows = [("fps", baseline["fps"], report["fps"], True)]
+    rows += [
+        (f"frame.{k}", baseline["frame_latency"][k], report["frame_latency"][k], False)
+        for k in ("p50_ms", "p99_ms")
+    ]
+    for name in STAGES:
+        if name in report["stages"] and name in baseline["stages"]:
+            rows += [
+                (f"{name}.{k}", baseline["stages"][name][k], report["stages"][name][k], False)
+                for k in ("p50_ms", "p99_ms")
+            ]
+    if "cpu_ms_per_frame" in baseline:
+        rows.append(("cpu_ms_per_frame", baseline["cpu_ms_per_frame"], report["cpu_ms_per_frame"], False))
+    rows.append(("peak_rss_mb", baseline["peak_rss_mb"], report["peak_rss_mb"], False))
+
+    regressions = []
+    print(f"{'metric':<20}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, old, new, higher_is_better in rows:
+        change = (new - old) / old * 100.0 if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > tolerance_pct:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<20}{old:>12.2f}{new:>12.2f}{change:>+9.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", required=True, help="Video file or folder of images")
+    parser.add_argument("--pipeline", choices=sorted(PIPELINES), default="arcface")
+    parser.add_argument("--gallery-size", type=int, default=1000, help="Synthetic enrolled identities")
+    parser.add_argument("--threshold", type=float, default=None, help="Match threshold (pipeline default if omitted)")
+    parser.add_argument("--warmup", type=int, default=5, help="Frames excluded from the statistics")
+    parser.add_argument("--max-frames", type=int, default=0, help="Stop after this many measured frames (0 = whole source)")
+    parser.add_argument("--loop", action="store_true", help="Replay the source until --max-frames")
+    parser.add_argument("--motion-gate", action="store_true", help="Put arc_face/motion_gate.py in front of detection")
+    parser.add_argument("--source-fps", type=float, default=25.0,
+                        help="Frame rate of the recording (motion gate and track voter clock)")
+    parser.add_argument("--out", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="Allowed regression in percent for --compare")
+    args = parser.parse_args()
+    if args.loop and not args.max_frames:
+        parser.error("--loop needs --max-frames")
+
+    report = run(args)
+
+    print(f"[INFO] {report['frames']} frames, {report['fps']:.2f} FPS, "
+          f"p50 {report['frame_latency']['p50_ms']:.1f} ms, p99 {report['frame_latency']['p99_ms']:.1f} ms, "
+          f"peak RSS {report['peak_rss_mb']:.0f} MB")
+    for name, s in report["stages"].items():
+        print(f"  {name:<9} p50 {s['p50_ms']:8.2f} ms  p99 {s['p99_ms']:8.2f} ms  n={s['count']}")
+    for name, reason in report["absent_stages"].items():
+        print(f"  {name:<9} not timed: {reason}")
+    print(f"[INFO] CPU {report['cpu_ms_per_frame']:.1f} ms/frame")
+    if report["motion_gate"]:
+        g = report["motion_gate"]
+        print(f"[INFO] Motion gate skipped {g['gate_skipped']} of {report['frames']} frames "
+              f"({g['skip_ratio']:.0%}), keepalives {g['gate_keepalive']}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Report written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
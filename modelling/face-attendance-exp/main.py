@@ -11,19 +11,31 @@ Workflow:
 6. Display face bounding boxes (color-coded by liveness status).
 7. Mark attendance only for recognized + live faces (blink detected).
 """
+import os
+import sys
+
 import cv2
 import face_recognition
-import numpy as np
 
 from enrollment import load_encodings
 from liveness import BlinkLiveness
 from attendance import AttendanceLogger
+from matcher import FaceMatcher
+
+# Appended, not inserted: arc_face has its own liveness.py and attendance.py
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "arc_face"))
+from site_config import get_match_threshold
 
 
 # Set this to your phone's IP Webcam stream URL (or an int index for a USB cam).
 # Example: "http://192.168.1.6:8080/video" for the IP Webcam app default video feed.
 CAMERA_SOURCE = "http://192.168.1.3:8080/video"
 
+# Max face distance for a match: the site's value stored by
+# arc_face/calibrate_threshold.py --embedder dlib --metric l2 --write
+# (0.5 if uncalibrated); the MATCH_TOLERANCE env var overrides it.
+MATCH_TOLERANCE = float(os.environ.get("MATCH_TOLERANCE") or get_match_threshold(0.5, metric="l2"))
+
 
 def parse_camera_source(arg: str):
     """Return int for webcam indices, otherwise assume IP/RTSP/HTTP URL."""
@@ -37,6 +49,9 @@ def main():
     print("[INFO] Loading known face encodings...")
     known_encodings, known_names = load_encodings()
     print(f"[INFO] Loaded {len(known_encodings)} known faces: {known_names}")
+    matcher = FaceMatcher.from_encodings(
+        known_encodings, known_names, metric="l2", tolerance=MATCH_TOLERANCE
+    )
 
     # 2. Initialize liveness tracker + attendance logger
     liveness = BlinkLiveness(known_names, ear_thresh=0.21)
@@ -66,26 +81,11 @@ def main():
         face_encodings = face_recognition.face_encodings(rgb_small, face_locations)
         landmarks_list = face_recognition.face_landmarks(rgb_small, face_locations)
 
-        face_names = []
-
-        for i, face_encoding in enumerate(face_encodings):
-            # Compare against known faces
-            matches = face_recognition.compare_faces(
-                known_encodings, face_encoding, tolerance=0.5
-            )
-            face_distances = face_recognition.face_distance(
-                known_encodings, face_encoding
-            )
-
-            name = "Unknown"
-            if len(face_distances) > 0:
-                best_idx = np.argmin(face_distances)
-                if matches[best_idx]:
-                    name = known_names[best_idx]
-
-            face_names.append(name)
+        # One distance pass for every face in the frame; tolerance applied to it
+        face_names, _, _ = matcher.match(face_encodings)
 
-            # Update liveness state for recognized faces
+        # Update liveness state for recognized faces
+        for i, name in enumerate(face_names):
             if name != "Unknown" and i < len(landmarks_list):
                 liveness.update(name, landmarks_list[i])
 
@@ -0,0 +1,183 @@
+"""
+matcher.py
+Batched nearest-neighbour matching of face encodings against the known roster.
+
+One distance computation per frame covers every detected face; the
+tolerance check reuses those distances instead of recomputing them the way
+compare_faces + face_distance do. Works for 128-d dlib encodings (l2) and
+512-d ArcFace embeddings (cosine).
+"""
+import numpy as np
+
+# Above this many known faces, use a FAISS flat index if faiss is installed
+FAISS_MIN_ROSTER = 5000
+
+
+class FaceMatcher:
+    """
+    Known encodings held in one preallocated (capacity, dim) matrix.
+
+    metric "l2": Euclidean distance, match if distance <= tolerance (dlib).
+    metric "cosine": similarity of normalized vectors, match if
+    similarity >= tolerance (ArcFace).
+    """
+
+    def __init__(self, dim: int = 128, metric: str = "l2", tolerance: float = 0.6,
+                 capacity: int = 1024, dtype=np.float64, use_faiss=None):
+        """
+        Initialize an empty matcher.
+
+        Args:
+            dim: Encoding size (128 for dlib, 512 for ArcFace).
+            metric: "l2" or "cosine".
+            tolerance: Max distance (l2) or min similarity (cosine) for a match.
+            capacity: Rows to preallocate; grows by doubling.
+            dtype: float64 matches face_recognition exactly, float32 halves memory.
+            use_faiss: True/False to force, None to decide by roster size.
+        """
+        if metric not in ("l2", "cosine"):
+            raise ValueError(f"Unknown metric {metric!r}, expected 'l2' or 'cosine'")
+        self.dim = dim
+        self.metric = metric
+        self.tolerance = tolerance
+        self.dtype = dtype
+        self.use_faiss = use_faiss
+        self.names = []
+        self._matrix = np.empty((capacity, dim), dtype=dtype)
+        self._sq_norms = np.empty(capacity, dtype=dtype)
+        self._index = None
+
+    @classmethod
+    def from_encodings(cls, encodings, names, **kwargs):
+        """
+        Build a matcher from lists of known encodings and names.
+
+        Args:
+            encodings: Sequence of (dim,) vectors or an (N, dim) array.
+            names: Name for each encoding.
+            **kwargs: Passed to FaceMatcher().
+
+        Returns:
+            FaceMatcher with every encoding added.
+        """
+        encodings = np.asarray(encodings)
+        dim = encodings.shape[1] if encodings.ndim == 2 else kwargs.pop("dim", 128)
+        kwargs.setdefault("capacity", max(len(encodings), 1))
+        matcher = cls(dim=dim, **kwargs)
+        matcher.add(encodings, names)
+        return matcher
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def encodings(self):
+        """View of the filled rows of the matrix."""
+        return self._matrix[:len(self.names)]
+
+    def add(self, encodings, names):
+        """
+        Append known encodings.
+
+        Args:
+            encodings: (N, dim) array (or a single (dim,) vector).
+            names: N names (or a single name).
+        """
+        encodings = np.asarray(encodings, dtype=self.dtype).reshape(-1, self.dim)
+        if isinstance(names, str):
+            names = [names]
+        if len(names) != len(encodings):
+            raise ValueError(f"{len(encodings)} encodings but {len(names)} names")
+
+        n, k = len(self.names), len(encodings)
+        if n + k > len(self._matrix):
+            capacity = max(n + k, 2 * len(self._matrix))
+            matrix = np.empty((capacity, self.dim), dtype=self.dtype)
+            matrix[:n] = self._matrix[:n]
+            sq_norms = np.empty(capacity, dtype=self.dtype)
+            sq_norms[:n] = self._sq_norms[:n]
+            self._matrix, self._sq_norms = matrix, sq_norms
+
+        rows = self._matrix[n:n + k]
+        rows[:] = encodings
+        if self.metric == "cosine":
+            rows /= np.linalg.norm(rows, axis=1, keepdims=True).clip(min=1e-12)
+        self._sq_norms[n:n + k] = np.einsum("ij,ij->i", rows, rows)
+        self.names.extend(names)
+        self._index = None
+
+    def _faiss_index(self):
+        use = self.use_faiss
+        if use is None:
+            use = len(self.names) >= FAISS_MIN_ROSTER
+        if not use:
+            return None
+        if self._index is None:
+            try:
+                import faiss
+            except ImportError:
+                self.use_faiss = False
+                return None
+            index = faiss.IndexFlatL2(self.dim) if self.metric == "l2" else faiss.IndexFlatIP(self.dim)
+            index.add(np.ascontiguousarray(self.encodings, dtype=np.float32))
+            self._index = index
+        return self._index
+
+    def _prepare(self, queries):
+        queries = np.asarray(queries, dtype=self.dtype).reshape(-1, self.dim)
+        if self.metric == "cosine":
+            queries = queries / np.linalg.norm(queries, axis=1, keepdims=True).clip(min=1e-12)
+        return queries
+
+    def distances(self, queries):
+        """
+        Score every query against every known encoding in one pass.
+
+        Args:
+            queries: (M, dim) array of encodings from the current frame.
+
+        Returns:
+            (M, N) array: l2 distances, or cosine similarities.
+        """
+        queries = self._prepare(queries)
+        known = self.encodings
+        if self.metric == "cosine":
+            return queries @ known.T
+        # |q - k|² = |q|² + |k|² - 2 q·k
+        d = queries @ known.T
+        d *= -2
+        d += np.einsum("ij,ij->i", queries, queries)[:, None]
+        d += self._sq_norms[:len(known)]
+        np.maximum(d, 0, out=d)
+        return np.sqrt(d, out=d)
+
+    def match(self, queries, unknown: str = "Unknown"):
+        """
+        Best known face for each query, with the tolerance applied.
+
+        Args:
+            queries: (M, dim) array or list of encodings from the current frame.
+            unknown: Name returned for queries outside the tolerance.
+
+        Returns:
+            Tuple of (names, scores, indices); index is -1 for unknown faces.
+        """
+        m = len(queries)
+        if m == 0 or not self.names:
+            return [unknown] * m, np.full(m, np.nan), np.full(m, -1)
+
+        index = self._faiss_index()
+        if index is not None:
+            scores, best = index.search(np.ascontiguousarray(self._prepare(queries), dtype=np.float32), 1)
+            scores, best = scores[:, 0].astype(self.dtype), best[:, 0]
+            if self.metric == "l2":
+                scores = np.sqrt(np.maximum(scores, 0))
+        else:
+            d = self.distances(queries)
+            best = d.argmin(axis=1) if self.metric == "l2" else d.argmax(axis=1)
+            scores = d[np.arange(m), best]
+
+        ok = scores <= self.tolerance if self.metric == "l2" else scores >= self.tolerance
+        best = np.where(ok, best, -1)
+        names = [self.names[i] if i >= 0 else unknown for i in best]
+        return names, scores, best
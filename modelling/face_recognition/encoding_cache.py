@@ -0,0 +1,128 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(BASE_DIR, 'encodings_cache.npz')
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+ENCODING_DIM = 128
+
+# Below this many changed photos a process pool costs more than it saves
+PARALLEL_MIN = 4
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def encode_image(path):
+    """
+    Worker: HOG detection + 128-d encoding of the first face in the photo.
+    Returns (sha1, encoding) with encoding None when no face is found.
+    """
+    import face_recognition
+
+    digest = file_hash(path)
+    img = cv2.imread(path)
+    if img is None:
+        return digest, None
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    encodings = face_recognition.face_encodings(img)
+    return digest, (encodings[0] if encodings else None)
+
+
+def load_cache(cache_path=CACHE_PATH):
+    """{file name: (mtime_ns, size, sha1, encoding or None)} from the .npz cache."""
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        data = np.load(cache_path)
+        return {
+            str(name): (int(mtime), int(size), str(digest), enc if found else None)
+            for name, mtime, size, digest, enc, found in zip(
+                data['files'], data['mtimes'], data['sizes'], data['hashes'],
+                data['encodings'], data['has_face'])
+        }
+    except (OSError, KeyError, ValueError) as e:
+        print(f'[WARN] Ignoring unreadable encoding cache {cache_path}: {e}')
+        return {}
+
+
+def save_cache(entries, cache_path=CACHE_PATH):
+    names = sorted(entries)
+    encodings = np.zeros((len(names), ENCODING_DIM), dtype=np.float64)
+    for i, name in enumerate(names):
+        if entries[name][3] is not None:
+            encodings[i] = entries[name][3]
+    tmp = cache_path + '.tmp.npz'
+    np.savez(
+        tmp,
+        files=np.array(names, dtype=str),
+        mtimes=np.array([entries[n][0] for n in names], dtype=np.int64),
+        sizes=np.array([entries[n][1] for n in names], dtype=np.int64),
+        hashes=np.array([entries[n][2] for n in names], dtype=str),
+        encodings=encodings,
+        has_face=np.array([entries[n][3] is not None for n in names], dtype=bool),
+    )
+    os.replace(tmp, cache_path)
+
+
+def load_known_encodings(path, cache_path=CACHE_PATH, workers=None):
+    """
+    Encodings and class names for every photo in `path`.
+
+    Photos whose mtime and size match the cache are not even read; changed
+    ones are hashed, and only content not seen before is encoded (across
+    processes). Photos without a face are reported and skipped.
+    returns: (encodings list, class names list)
+    """
+    cached = load_cache(cache_path)
+    by_hash = {entry[2]: entry[3] for entry in cached.values()}
+
+    entries, stale, touched = {}, [], False
+    for name in sorted(os.listdir(path)):
+        if not name.lower().endswith(IMAGE_EXTS):
+            continue
+        st = os.stat(os.path.join(path, name))
+        entry = cached.get(name)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            entries[name] = entry
+            continue
+        # Touched or copied files keep their encoding if the content is unchanged
+        digest = file_hash(os.path.join(path, name))
+        if digest in by_hash:
+            entries[name] = (st.st_mtime_ns, st.st_size, digest, by_hash[digest])
+            touched = True
+        else:
+            stale.append((name, st))
+
+    if stale:
+        print(f'[INFO] Encoding {len(stale)} new or changed photo(s)...')
+        paths = [os.path.join(path, name) for name, _ in stale]
+        if len(stale) >= PARALLEL_MIN:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(encode_image, paths))
+        else:
+            results = [encode_image(p) for p in paths]
+        for (name, st), (digest, encoding) in zip(stale, results):
+            entries[name] = (st.st_mtime_ns, st.st_size, digest, encoding)
+
+    if stale or touched or set(entries) != set(cached):
+        save_cache(entries, cache_path)
+
+    encodeList, classNames = [], []
+    for name, entry in sorted(entries.items()):
+        if entry[3] is None:
+            print(f'[WARN] No face found in {name}, skipping')
+            continue
+        encodeList.append(entry[3])
+        classNames.append(os.path.splitext(name)[0])
+    print(f'[INFO] {len(encodeList)} known faces ({len(entries) - len(stale)} from cache)')
+    return encodeList, classNames
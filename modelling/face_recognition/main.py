@@ -1,32 +1,22 @@
 import cv2
-import numpy as np
 import face_recognition
 import os
+import sys
 from datetime import datetime
 
-# from PIL import ImageGrab
-
-path = 'D:\labour-attendance\face_recognition\train_images'
-images = []
-classNames = []
-myList = os.listdir(path)
-print(myList)
-for cl in myList:
-    curImg = cv2.imread(f'{path}/{cl}')
-    images.append(curImg)
-    classNames.append(os.path.splitext(cl)[0])
-print(classNames)
-
+from encoding_cache import BASE_DIR, load_known_encodings
 
-def findEncodings(images):
-    encodeList = []
+sys.path.append(os.path.join(os.path.dirname(BASE_DIR), 'arc_face'))
+sys.path.append(os.path.join(os.path.dirname(BASE_DIR), 'face-attendance-exp'))
+from site_config import get_match_threshold
+from matcher import FaceMatcher
 
+# from PIL import ImageGrab
 
-    for img in images:
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        encode = face_recognition.face_encodings(img)[0]
-        encodeList.append(encode)
-    return encodeList
+path = os.path.join(BASE_DIR, 'train_images')
+# Site threshold from calibrate_threshold.py --embedder dlib --metric l2 --write,
+# else face_recognition.compare_faces' 0.6; MATCH_TOLERANCE overrides both
+TOLERANCE = float(os.environ.get('MATCH_TOLERANCE') or get_match_threshold(0.6, metric='l2'))
 
 
 def markAttendance(name):
@@ -49,35 +39,39 @@ def markAttendance(name):
 #     capScr = cv2.cvtColor(capScr, cv2.COLOR_RGB2BGR)
 #     return capScr
 
-encodeListKnown = findEncodings(images)
-print('Encoding Complete')
-
-cap = cv2.VideoCapture(0)
-
-while True:
-    success, img = cap.read()
-# img = captureScreen()
-    imgS = cv2.resize(img, (0, 0), None, 0.25, 0.25)
-    imgS = cv2.cvtColor(imgS, cv2.COLOR_BGR2RGB)
-
-    facesCurFrame = face_recognition.face_locations(imgS)
-    encodesCurFrame = face_recognition.face_encodings(imgS, facesCurFrame)
-
-    for encodeFace, faceLoc in zip(encodesCurFrame, facesCurFrame):
-        matches = face_recognition.compare_faces(encodeListKnown, encodeFace)
-        faceDis = face_recognition.face_distance(encodeListKnown, encodeFace)
-# print(faceDis)
-        matchIndex = np.argmin(faceDis)
-
-        if matches[matchIndex]:
-            name = classNames[matchIndex].upper()
-# print(name)
-            y1, x2, y2, x1 = faceLoc
-            y1, x2, y2, x1 = y1 * 4, x2 * 4, y2 * 4, x1 * 4
-            cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            cv2.rectangle(img, (x1, y2 - 35), (x2, y2), (0, 255, 0), cv2.FILLED)
-            cv2.putText(img, name, (x1 + 6, y2 - 6), cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2)
-            markAttendance(name)
-
-    cv2.imshow('Webcam', img)
-    cv2.waitKey(1)
\ No newline at end of file
+
+if __name__ == '__main__':
+    # Cached encodings load instantly; only new/changed photos are encoded
+    # (in worker processes, hence the __main__ guard)
+    encodeListKnown, classNames = load_known_encodings(path)
+    print(classNames)
+    print('Encoding Complete')
+    matcher = FaceMatcher.from_encodings(encodeListKnown, classNames, metric='l2', tolerance=TOLERANCE)
+
+    cap = cv2.VideoCapture(0)
+
+    while True:
+        success, img = cap.read()
+        # img = captureScreen()
+        imgS = cv2.resize(img, (0, 0), None, 0.25, 0.25)
+        imgS = cv2.cvtColor(imgS, cv2.COLOR_BGR2RGB)
+
+        facesCurFrame = face_recognition.face_locations(imgS)
+        encodesCurFrame = face_recognition.face_encodings(imgS, facesCurFrame)
+
+        # One distance pass for every face in the frame; -1 means no match within TOLERANCE
+        _, _, matchIndexes = matcher.match(encodesCurFrame)
+
+        for faceLoc, matchIndex in zip(facesCurFrame, matchIndexes):
+            if matchIndex >= 0:
+                name = classNames[matchIndex].upper()
+                # print(name)
+                y1, x2, y2, x1 = faceLoc
+                y1, x2, y2, x1 = y1 * 4, x2 * 4, y2 * 4, x1 * 4
+                cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                cv2.rectangle(img, (x1, y2 - 35), (x2, y2), (0, 255, 0), cv2.FILLED)
+                cv2.putText(img, name, (x1 + 6, y2 - 6), cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2)
+                markAttendance(name)
+
+        cv2.imshow('Webcam', img)
+        cv2.waitKey(1)
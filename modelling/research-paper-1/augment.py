@@ -0,0 +1,111 @@
+"""
+augment.py
+Batched blur / noise augmentations for the robustness experiments.
+
+All kernels take an (N, H, W, 3) uint8 batch and write into `out`, which
+may be the input itself (in place) or any preallocated uint8 array of the
+same shape. Randomness comes from a numpy Generator passed per batch, so a
+batch seeded with the same value always produces the same degraded images.
+"""
+import cv2
+import numpy as np
+
+# Degradations used for the robustness test sets, in output order
+VARIANTS = (
+    ("orig", None),
+    ("blur3", 3), ("blur5", 5), ("blur7", 7),
+    ("gn10", 10), ("gn20", 20), ("gn30", 30),
+    ("sp1", 0.01), ("sp2", 0.02),
+)
+
+
+def _check(batch, out):
+    if batch.dtype != np.uint8 or batch.ndim != 4:
+        raise ValueError(f"expected an (N, H, W, C) uint8 batch, got {batch.dtype} {batch.shape}")
+    if out is None:
+        return np.empty_like(batch)
+    if out.shape != batch.shape or out.dtype != np.uint8:
+        raise ValueError(f"out must be uint8 {batch.shape}, got {out.dtype} {out.shape}")
+    return out
+
+
+def gaussian_blur_batch(batch, ksize=5, out=None):
+    """Gaussian blur every image; ksize must be odd (3, 5, 7, ...)."""
+    out = _check(batch, out)
+    for i in range(len(batch)):
+        cv2.GaussianBlur(batch[i], (ksize, ksize), 0, dst=out[i])
+    return out
+
+
+def gaussian_noise_batch(batch, rng, var=20, mean=0, out=None, scratch=None):
+    """
+    Add N(mean, var) noise to every pixel, clipped to [0, 255].
+    scratch: optional float32 buffer of the batch shape, reused across calls.
+    """
+    out = _check(batch, out)
+    if len(batch) == 0:
+        return out
+    if scratch is None:
+        scratch = np.empty(batch.shape, dtype=np.float32)
+    # cv2.randn fills the whole batch in one call and is several times faster
+    # than numpy's normal sampler; seeding it from rng keeps batches reproducible.
+    cv2.setRNGSeed(int(rng.integers(2 ** 31)))
+    cv2.randn(scratch.reshape(len(batch) * batch.shape[1], -1), mean, var ** 0.5)
+    np.add(scratch, batch, out=scratch)
+    np.clip(scratch, 0, 255, out=scratch)
+    np.copyto(out, scratch, casting="unsafe")
+    return out
+
+
+def salt_pepper_batch(batch, rng, amount=0.01, out=None):
+    """Set `amount` of each image's pixels to white (half) and black (half)."""
+    out = _check(batch, out)
+    if out is not batch:
+        np.copyto(out, batch)
+    n, h, w = batch.shape[:3]
+    num = int(amount * h * w / 2)
+    if num == 0:
+        return out
+    img_idx = np.repeat(np.arange(n), num)
+    for value in (255, 0):
+        rows = rng.integers(0, h, n * num)
+        cols = rng.integers(0, w, n * num)
+        out[img_idx, rows, cols] = value
+    return out
+
+
+class BatchAugmenter:
+    """
+    Produces every VARIANT of a batch into one (N, V, H, W, 3) array.
+    Scratch buffers are allocated once for the largest batch seen.
+    """
+
+    def __init__(self, variants=VARIANTS):
+        self.variants = variants
+        self._scratch = None
+
+    def _scratch_for(self, shape):
+        if self._scratch is None or self._scratch.size < np.prod(shape):
+            self._scratch = np.empty(shape, dtype=np.float32)
+        return self._scratch.reshape(-1)[:np.prod(shape)].reshape(shape)
+
+    def __call__(self, batch, seed, out=None):
+        if out is None:
+            out = np.empty((len(batch), len(self.variants)) + batch.shape[1:], dtype=np.uint8)
+        rng = np.random.default_rng(seed)
+        scratch = self._scratch_for(batch.shape)
+
+        # out[:, v] is a strided view; each image in it is still contiguous for OpenCV
+        for v, (name, param) in enumerate(self.variants):
+            view = out[:, v]
+            if name == "orig":
+                np.copyto(view, batch)
+            elif name.startswith("blur"):
+                gaussian_blur_batch(batch, ksize=param, out=view)
+            elif name.startswith("gn"):
+                gaussian_noise_batch(batch, rng, var=param, out=view, scratch=scratch)
+            elif name.startswith("sp"):
+                salt_pepper_batch(batch, rng, amount=param, out=view)
+            else:
+                raise ValueError(f"Unknown augmentation {name}")
+        return out
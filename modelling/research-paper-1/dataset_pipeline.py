@@ -0,0 +1,322 @@
+"""
+dataset_pipeline.py
+Streaming, parallel version of the dataset preparation in dataset.ipynb.
+
+Faces are cropped from the COCO annotations of each split, optionally aligned
+with dlib's 68-point landmarks, resized to a fixed square, augmented with the
+blur / Gaussian noise / salt-and-pepper variants used in the notebook, and
+written as sharded .npy arrays instead of thousands of JPEG files:
+
+    <out>/<split>/crops_00000.npy   uint8  (N, V, S, S, 3)  RGB, V = len(VARIANTS)
+    <out>/<split>/labels_00000.npy  int64  (N,)            COCO category_id
+    <out>/<split>/ann_ids_00000.npy int64  (N,)            COCO annotation id
+    <out>/<split>/emb_00000.npy     float32 (N, V, D)      only with --embed
+    <out>/manifest.json                                    completed shards
+
+Every array opens with np.load(path, mmap_mode="r"). Shards are written
+atomically and recorded in the manifest, so re-running the same command
+skips finished shards and continues after an interruption.
+
+Usage:
+    python dataset_pipeline.py --root /content/Attendance-System-Using-Face--2 --out /content/prepared \\
+        --shape-model /content/models/shape_predictor_68_face_landmarks.dat --embed facenet
+"""
+import argparse
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from augment import VARIANTS, BatchAugmenter
+
+SPLITS = ("train", "valid", "test")
+MANIFEST = "manifest.json"
+
+
+# ---------------------------------------------------------------- alignment
+
+_detector = None
+_shape_predictor = None
+
+
+def _init_worker(shape_model_path):
+    """Load dlib models once per worker process."""
+    global _detector, _shape_predictor
+    if shape_model_path:
+        import dlib
+
+        _detector = dlib.get_frontal_face_detector()
+        _shape_predictor = dlib.shape_predictor(shape_model_path)
+
+
+def align_face_dlib(img_bgr, desired_size=160, desired_left_eye=(0.35, 0.35)):
+    """
+    Align a face crop on its eye centers (same transform as the notebook).
+    Returns the aligned BGR face or None if dlib finds no face.
+    """
+    img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
+    dets = _detector(img_rgb, 1)
+    if len(dets) == 0:
+        return None
+
+    rect = max(dets, key=lambda r: r.width() * r.height())
+    shape = _shape_predictor(img_rgb, rect)
+    landmarks = np.array([[p.x, p.y] for p in shape.parts()], dtype=np.float32)
+
+    left_eye_center = landmarks[36:42].mean(axis=0)
+    right_eye_center = landmarks[42:48].mean(axis=0)
+
+    dY = right_eye_center[1] - left_eye_center[1]
+    dX = right_eye_center[0] - left_eye_center[0]
+    angle = np.degrees(np.arctan2(dY, dX))
+
+    dist = np.sqrt((dX ** 2) + (dY ** 2))
+    desired_dist = (1.0 - 2 * desired_left_eye[0]) * desired_size
+    scale = desired_dist / dist
+
+    eyes_center = ((left_eye_center[0] + right_eye_center[0]) / 2,
+                   (left_eye_center[1] + right_eye_center[1]) / 2)
+    M = cv2.getRotationMatrix2D(eyes_center, angle, scale)
+    M[0, 2] += desired_size * 0.5 - eyes_center[0]
+    M[1, 2] += desired_size * desired_left_eye[1] - eyes_center[1]
+
+    return cv2.warpAffine(img_bgr, M, (desired_size, desired_size), flags=cv2.INTER_CUBIC)
+
+
+# ------------------------------------------------------------------- shards
+
+def plan_shards(root, split, shard_size):
+    """
+    Read the split's COCO file and group annotations into shards.
+    Annotations stay sorted by image so each worker decodes an image once.
+    """
+    ann_path = Path(root) / split / "_annotations.coco.json"
+    if not ann_path.exists():
+        print(f"[{split}] No COCO annotation file found at {ann_path}, skipping.")
+        return []
+
+    with open(ann_path, "r") as f:
+        coco = json.load(f)
+
+    files = {img["id"]: img["file_name"] for img in coco["images"]}
+    tasks = sorted(
+        (
+            (str(Path(root) / split / files[ann["image_id"]]), ann["bbox"], ann["category_id"], ann["id"])
+            for ann in coco["annotations"]
+        ),
+        key=lambda t: t[0],
+    )
+    print(f"[{split}] Found {len(files)} images, {len(tasks)} face instances")
+    return [tasks[i:i + shard_size] for i in range(0, len(tasks), shard_size)]
+
+
+def _atomic_save(path, arr):
+    tmp = path.with_name(path.stem + ".tmp.npy")
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+
+def process_shard(tasks, out_dir, shard, crop_size, seed):
+    """Crop -> (align) -> resize one shard, augment it as a batch and write its arrays."""
+    faces = np.empty((len(tasks), crop_size, crop_size, 3), dtype=np.uint8)
+    labels = np.empty(len(tasks), dtype=np.int64)
+    ann_ids = np.empty(len(tasks), dtype=np.int64)
+
+    n = 0
+    last_path, img = None, None
+    for img_path, bbox, category_id, ann_id in tasks:
+        if img_path != last_path:
+            img, last_path = cv2.imread(img_path), img_path
+        if img is None:
+            continue
+
+        # COCO bbox = [x, y, width, height], clipped to the image
+        x, y, w, h = (int(v) for v in bbox)
+        x2, y2 = min(x + w, img.shape[1]), min(y + h, img.shape[0])
+        x, y = max(x, 0), max(y, 0)
+        if x2 <= x or y2 <= y:
+            continue
+
+        face = img[y:y2, x:x2]
+        if _detector is not None:
+            face = align_face_dlib(face, desired_size=crop_size)
+            if face is None:
+                continue
+        else:
+            face = cv2.resize(face, (crop_size, crop_size), interpolation=cv2.INTER_AREA)
+
+        cv2.cvtColor(face, cv2.COLOR_BGR2RGB, dst=faces[n])
+        labels[n] = category_id
+        ann_ids[n] = ann_id
+        n += 1
+
+    crops = BatchAugmenter()(faces[:n], seed)
+
+    out_dir = Path(out_dir)
+    _atomic_save(out_dir / f"labels_{shard:05d}.npy", labels[:n])
+    _atomic_save(out_dir / f"ann_ids_{shard:05d}.npy", ann_ids[:n])
+    # Crops last: a shard counts as written once its crops file exists
+    _atomic_save(out_dir / f"crops_{shard:05d}.npy", crops)
+    return shard, n, len(tasks) - n
+
+
+class Manifest:
+    """Completed-shard bookkeeping that makes a run resumable."""
+
+    def __init__(self, out_dir, config):
+        self.path = Path(out_dir) / MANIFEST
+        if self.path.exists():
+            with open(self.path) as f:
+                self.data = json.load(f)
+            if self.data["config"] != config:
+                raise ValueError(
+                    f"{self.path} was written with {self.data['config']}; "
+                    f"use a new --out for {config}"
+                )
+        else:
+            self.data = {"config": config, "splits": {}}
+
+    def shards(self, split):
+        return self.data["splits"].setdefault(split, {})
+
+    def save(self):
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def prepare_split(root, out, split, manifest, workers=None, shard_size=1024,
+                  crop_size=160, shape_model=None, seed=0):
+    """Run the crop/align/augment stages of one split on a process pool."""
+    out_dir = Path(out) / split
+    out_dir.mkdir(parents=True, exist_ok=True)
+    done = manifest.shards(split)
+
+    pending = [
+        (shard, tasks) for shard, tasks in enumerate(plan_shards(root, split, shard_size))
+        if str(shard) not in done or not (out_dir / f"crops_{shard:05d}.npy").exists()
+    ]
+    if not pending:
+        print(f"[{split}] All shards already prepared.")
+        return
+
+    print(f"[{split}] Preparing {len(pending)} shards with {workers or os.cpu_count()} workers")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shape_model,)) as pool:
+        # Bounded in-flight window keeps memory flat regardless of split size
+        window = 2 * (workers or os.cpu_count())
+        queue = iter(pending)
+        running = set()
+        while True:
+            for shard, tasks in queue:
+                running.add(pool.submit(process_shard, tasks, out_dir, shard, crop_size, seed + shard))
+                if len(running) >= window:
+                    break
+            if not running:
+                break
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                shard, kept, skipped = fut.result()
+                done[str(shard)] = {"faces": kept, "skipped": skipped, "embedded": False}
+                manifest.save()
+                print(f"[{split}] shard {shard:05d}: {kept} faces, {skipped} skipped")
+
+
+def facenet_embedder(device=None, batch_size=256):
+    """FaceNet (InceptionResnetV1/vggface2) embedder for uint8 RGB batches."""
+    import torch
+    from facenet_pytorch.models.inception_resnet_v1 import InceptionResnetV1
+
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    model = InceptionResnetV1(pretrained="vggface2", classify=False).eval().to(device)
+
+    def embed(images):
+        out = []
+        with torch.no_grad():
+            for i in range(0, len(images), batch_size):
+                batch = torch.from_numpy(np.ascontiguousarray(images[i:i + batch_size]))
+                batch = batch.to(device).permute(0, 3, 1, 2).float().div_(255.0).sub_(0.5).div_(0.5)
+                out.append(model(batch).cpu().numpy())
+        return np.concatenate(out) if out else np.empty((0, 512), np.float32)
+
+    return embed
+
+
+EMBEDDERS = {"facenet": facenet_embedder}
+
+
+def embed_split(out, split, manifest, embed):
+    """Embedding stage: one emb_*.npy per prepared shard, streamed from the mmap'd crops."""
+    out_dir = Path(out) / split
+    done = manifest.shards(split)
+    for shard, info in sorted(done.items(), key=lambda kv: int(kv[0])):
+        emb_path = out_dir / f"emb_{int(shard):05d}.npy"
+        if info["embedded"] and emb_path.exists():
+            continue
+        crops = np.load(out_dir / f"crops_{int(shard):05d}.npy", mmap_mode="r")
+        n, v = crops.shape[:2]
+        flat = crops.reshape((n * v,) + crops.shape[2:])
+        emb = embed(flat).astype(np.float32)
+        _atomic_save(emb_path, emb.reshape(n, v, -1))
+        info["embedded"] = True
+        manifest.save()
+        print(f"[{split}] shard {int(shard):05d}: embedded {n * v} crops")
+
+
+def open_split(out, split, with_embeddings=False):
+    """
+    Memory-map every shard of a prepared split.
+    Returns dict of lists: crops, labels, ann_ids (and embeddings).
+    """
+    out_dir = Path(out) / split
+    with open(Path(out) / MANIFEST) as f:
+        shards = sorted(int(s) for s in json.load(f)["splits"].get(split, {}))
+    keys = ["crops", "labels", "ann_ids"] + (["emb"] if with_embeddings else [])
+    data = {
+        key: [np.load(out_dir / f"{key}_{s:05d}.npy", mmap_mode="r") for s in shards]
+        for key in keys
+    }
+    if with_embeddings:
+        data["embeddings"] = data.pop("emb")
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", required=True, help="Roboflow COCO export (contains train/valid/test)")
+    parser.add_argument("--out", required=True, help="Output directory for shards + manifest")
+    parser.add_argument("--splits", nargs="+", default=list(SPLITS))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--shard-size", type=int, default=1024, help="Faces per shard")
+    parser.add_argument("--crop-size", type=int, default=160)
+    parser.add_argument("--shape-model", help="dlib 68-point shape predictor; enables alignment")
+    parser.add_argument("--embed", choices=sorted(EMBEDDERS), help="Also compute embeddings")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    Path(args.out).mkdir(parents=True, exist_ok=True)
+    config = {
+        "shard_size": args.shard_size,
+        "crop_size": args.crop_size,
+        "aligned": bool(args.shape_model),
+        "variants": [name for name, _ in VARIANTS],
+        "seed": args.seed,
+    }
+    manifest = Manifest(args.out, config)
+
+    for split in args.splits:
+        prepare_split(args.root, args.out, split, manifest, workers=args.workers,
+                      shard_size=args.shard_size, crop_size=args.crop_size,
+                      shape_model=args.shape_model, seed=args.seed)
+
+    if args.embed:
+        embed = EMBEDDERS[args.embed]()
+        for split in args.splits:
+            embed_split(args.out, split, manifest, embed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import numpy as np
+
+from augment import VARIANTS, BatchAugmenter
+
+
+def _batch(n, size=32, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (n, size, size, 3), dtype=np.uint8)
+
+
+def test_empty_shard():
+    # process_shard passes faces[:0] when no image in a shard could be read or aligned
+    crops = BatchAugmenter()(_batch(4)[:0], seed=7)
+    assert crops.shape == (0, len(VARIANTS), 32, 32, 3)
+    assert crops.dtype == np.uint8
+
+
+def test_same_seed_same_output():
+    batch = _batch(3)
+    first = BatchAugmenter()(batch, seed=11)
+    second = BatchAugmenter()(batch, seed=11)
+    np.testing.assert_array_equal(first, second)
+    np.testing.assert_array_equal(first[:, 0], batch)
+    assert not np.array_equal(first, BatchAugmenter()(batch, seed=12))